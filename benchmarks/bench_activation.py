@@ -0,0 +1,90 @@
+"""
+Measure how long an ApplicationActivate event takes with a large widget
+tree, comparing the old always-reload stylesheet filter with
+StyleSheetReloader, both when nothing has changed and when a rule for a
+single widget has changed.
+"""
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+from PyQt5 import QtCore, QtWidgets
+
+from libsyntyche.app import StyleSheetReloader
+
+from .common import measure, offscreen_app, report
+
+CSS = '''
+QLabel { color: #333; padding: 2px; }
+QPushButton { background: #eee; border: 1px solid #aaa; }
+QLineEdit { font-family: monospace; }
+#title { color: COLOR; }
+'''
+
+
+class LegacyFilter(QtCore.QObject):
+    """The filter run_app used before: reapply the file on every activation."""
+    def __init__(self, css_path: Path) -> None:
+        super().__init__()
+        self.css_path = css_path
+
+    def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.ApplicationActivate:
+            QtWidgets.QApplication.instance().setStyleSheet(self.css_path.read_text())
+        return False
+
+
+def make_window(rows: int) -> QtWidgets.QWidget:
+    window = QtWidgets.QWidget()
+    layout = QtWidgets.QGridLayout(window)
+    title = QtWidgets.QLabel('Title')
+    title.setObjectName('title')
+    layout.addWidget(title, rows, 0)
+    for row in range(rows):
+        layout.addWidget(QtWidgets.QLabel(f'Row {row}'), row, 0)
+        layout.addWidget(QtWidgets.QLineEdit(), row, 1)
+        layout.addWidget(QtWidgets.QPushButton('Go'), row, 2)
+    window.show()
+    return window
+
+
+def activate(app: QtWidgets.QApplication) -> None:
+    app.sendEvent(app, QtCore.QEvent(QtCore.QEvent.ApplicationActivate))
+    app.processEvents()
+
+
+def main() -> None:
+    app = offscreen_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        css_path = Path(tmp) / 'qt.css'
+        colors = itertools.cycle(['red', 'blue'])
+        mtimes = itertools.count(1)
+
+        def change_title() -> None:
+            css_path.write_text(CSS.replace('COLOR', next(colors)))
+            os.utime(css_path, ns=(next(mtimes),) * 2)
+
+        change_title()
+        for rows in [100, 1000]:
+            window = make_window(rows)
+            label = f'{rows * 3} widgets'
+            legacy = LegacyFilter(css_path)
+            app.installEventFilter(legacy)
+            report(f'always reload, {label}', measure(lambda: activate(app), repeat=10))
+            report(f'always reload, #title changed, {label}',
+                   measure(lambda: activate(app), change_title, repeat=10))
+            app.removeEventFilter(legacy)
+            reloader = StyleSheetReloader(app, css_path)
+            reloader.reload(force=True)
+            app.installEventFilter(reloader)
+            report(f'reload on change, {label}', measure(lambda: activate(app), repeat=10))
+            report(f'reload on change, #title changed, {label}',
+                   measure(lambda: activate(app), change_title, repeat=10))
+            app.removeEventFilter(reloader)
+            window.deleteLater()
+            app.setStyleSheet('')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare building a big form-like layout in a visible scroll area with the
+plain layout builders and with bulk_build, up to 10k rows.
+
+The time includes processing the events the build causes, since that's
+where the plain builders spend most of their time.
+"""
+import time
+from typing import Callable, List, Union
+
+from PyQt5 import QtWidgets
+
+from libsyntyche.widgets import HBoxLayout, Stretch, VBoxLayout, bulk_build, repeat_rows
+
+from .common import offscreen_app, report
+
+
+def make_row(n: int) -> List[Union[QtWidgets.QLayout, QtWidgets.QWidget, Stretch]]:
+    return [QtWidgets.QLabel(f'Row {n}'), QtWidgets.QLineEdit(), QtWidgets.QPushButton('Go')]
+
+
+def plain(window: QtWidgets.QScrollArea, rows: int) -> None:
+    VBoxLayout(window.widget(), [HBoxLayout(make_row(n)) for n in range(rows)])
+
+
+def bulk(window: QtWidgets.QScrollArea, rows: int) -> None:
+    with bulk_build(window) as container:
+        VBoxLayout(container, repeat_rows(rows, make_row))
+
+
+def measure_build(build: Callable[[QtWidgets.QScrollArea, int], None], rows: int) -> float:
+    app = offscreen_app()
+    window = QtWidgets.QScrollArea()
+    window.setWidgetResizable(True)
+    window.setWidget(QtWidgets.QWidget())
+    window.resize(800, 600)
+    window.show()
+    app.processEvents()
+    start = time.perf_counter()
+    build(window, rows)
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    window.deleteLater()
+    app.processEvents()
+    return elapsed
+
+
+def main() -> None:
+    for rows in [500, 1000, 10_000]:
+        if rows <= 1000:
+            # The plain builders get very slow with lots of widgets
+            report(f'plain, {rows} rows', [measure_build(plain, rows)])
+        report(f'bulk_build, {rows} rows', [measure_build(bulk, rows)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold start times: importing each libsyntyche module and starting a small
+app up to its first paint, each in a fresh interpreter.
+
+Run with --save FILE to store the results and --compare FILE to fail if
+anything has become more than 20% (and 5 ms) slower than a saved run.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from .common import compare_to_baseline, report, save_results
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = ['libsyntyche', 'libsyntyche.cli', 'libsyntyche.search', 'libsyntyche.widgets',
+           'libsyntyche.terminal', 'libsyntyche.texteditor', 'libsyntyche.app']
+
+FIRST_PAINT_APP = '''
+import libsyntyche
+from libsyntyche.app import run_app, RootWindow
+from libsyntyche.terminal import Terminal
+from PyQt5 import QtCore, QtWidgets
+
+class Window(RootWindow):
+    def __init__(self):
+        super().__init__('cold start')
+        self.layout().addWidget(QtWidgets.QPlainTextEdit())
+        self.layout().addWidget(Terminal(self))
+        self.show()
+        QtCore.QTimer.singleShot(0, QtWidgets.QApplication.quit)
+
+run_app(None, Window)
+'''
+
+
+def run_python(code: str, env: Dict[str, str]) -> subprocess.CompletedProcess:  # type: ignore
+    return subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+
+
+def time_python(code: str, env: Dict[str, str], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(code, env)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def first_paint(env: Dict[str, str], repeat: int) -> List[float]:
+    """Time from importing libsyntyche to the first paint, as reported by the profiler."""
+    timings = []
+    for _ in range(repeat):
+        stderr = run_python(FIRST_PAINT_APP, {**env, 'LIBSYNTYCHE_PROFILE_STARTUP': '1'}).stderr
+        line = next(line for line in stderr.splitlines() if line.endswith('first paint'))
+        timings.append(float(line.split()[0]) / 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--save', type=Path)
+    parser.add_argument('--compare', type=Path)
+    args = parser.parse_args()
+    env = {**os.environ, 'QT_QPA_PLATFORM': 'offscreen', 'PYTHONPATH': str(ROOT)}
+    # Make sure every module is byte-compiled before timing anything
+    run_python('; '.join(f'import {module}' for module in MODULES), env)
+    results: Dict[str, float] = {}
+    interpreter = statistics.median(time_python('pass', env, args.repeat))
+    for module in MODULES:
+        timings = [t - interpreter for t in time_python(f'import {module}', env, args.repeat)]
+        report(f'import {module}', timings)
+        results[f'import {module}'] = statistics.median(timings)
+    timings = first_paint(env, args.repeat)
+    report('first paint', timings)
+    results['first paint'] = statistics.median(timings)
+    save_results(args.save, results)
+    if args.compare and compare_to_baseline(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
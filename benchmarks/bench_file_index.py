@@ -0,0 +1,109 @@
+"""
+FileIndex: building the index of a real tree, refreshing it when nothing
+or one directory has changed, and finding paths by fragment in an index
+of a million files.
+
+Run with --save FILE to store the results and --compare FILE to fail if
+anything has become more than 20% (and 5 ms) slower than a saved run.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from libsyntyche.fileindex import FileIndex, _Directory
+
+from .common import (compare_to_baseline, measure, report, report_latency, save_results,
+                     summarize)
+
+
+def make_tree(root: Path, files: int) -> None:
+    for n in range(files):
+        directory = root / f'dir{n % 50}' / f'sub{n % 400}'
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f'file{n}.txt').write_text('')
+
+
+def bench_disk(files: int) -> Dict[str, List[float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, files)
+        indexes: List[FileIndex] = []
+        results[f'build, {files} files'] = measure(
+            lambda: indexes[-1].refresh(), lambda: indexes.append(FileIndex(tmp)))
+        index = indexes[-1]
+        results['refresh, nothing changed'] = measure(index.refresh)
+
+        def change() -> None:
+            (root / 'dir0' / 'sub0' / f'new{time.perf_counter_ns()}.txt').write_text('')
+        results['refresh, one directory changed'] = measure(index.refresh, change)
+    return results
+
+
+def synthetic_index(files: int) -> FileIndex:
+    """An index of files spread over 10k directories, without touching the disk."""
+    rng = random.Random(1)
+    words = [''.join(rng.choice('abcdefghijklmnop') for _ in range(rng.randint(3, 10)))
+             for _ in range(5000)]
+    dirs = [f'{rng.choice(words)}/{rng.choice(words)}/{n}' for n in range(10_000)]
+    index = FileIndex('/nonexistent')
+    names: Dict[str, List[str]] = {d: [] for d in dirs}
+    for n in range(files):
+        names[dirs[n % len(dirs)]].append(f'{rng.choice(words)}_{n}.{rng.choice(["py", "md"])}')
+    index._dirs = {d: _Directory(0, '\n'.join(sorted(ns)), ()) for d, ns in names.items()}
+    index._build_paths()
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiply the sizes of the tests by this')
+    parser.add_argument('--save', type=Path)
+    parser.add_argument('--compare', type=Path)
+    args = parser.parse_args()
+    results: Dict[str, object] = {}
+    for name, timings in bench_disk(20_000 * args.scale).items():
+        report(name, timings)
+        results[name] = min(timings)
+    print()
+    files = 1_000_000 * args.scale
+    start = time.perf_counter()
+    index = synthetic_index(files)
+    print(f'(built a synthetic index of {len(index)} files in '
+          f'{time.perf_counter() - start:.1f} s)')
+    fragments = [f'_{n}.' for n in random.Random(2).sample(range(files), 200)]
+    for name, fragment_list in [('find a rare fragment', fragments),
+                                ('find a common fragment', ['abc'] * 200),
+                                ('find a missing fragment', ['zzzz'] * 200),
+                                ('find with upper case', ['_1234.PY'] * 200)]:
+        timings = []
+        for fragment in fragment_list:
+            # Start from scratch rather than narrowing down the last search
+            index._last_search = None
+            start = time.perf_counter()
+            index.find(fragment)
+            timings.append(time.perf_counter() - start)
+        results[f'{name}, {files} files'] = summarize(timings)
+    # Typing the name of a file one character at a time
+    timings = []
+    for fragment in fragments[:20]:
+        for n in range(1, len(fragment) + 1):
+            start = time.perf_counter()
+            index.find(fragment[:n])
+            timings.append(time.perf_counter() - start)
+    results[f'find while typing, {files} files'] = summarize(timings)
+    for name, summary in results.items():
+        if isinstance(summary, dict):
+            report_latency(name, summary)
+    save_results(args.save, results)
+    if args.compare and compare_to_baseline(results, args.compare):  # type: ignore
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Latency of interacting with Terminal and Searcher: typing, tab completion,
+history, printing lots of messages, toggling a large log, message tray
+bursts and searching, counting and replacing in a large document.
+
+Every operation is timed on its own and reported as latency percentiles
+and throughput. Run with --json to print the results as JSON, --save FILE
+to store them and --compare FILE to fail if any median has become more
+than 20% slower than a saved run.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtTest import QTest
+
+from libsyntyche.cli import AutocompletionPattern, Command
+from libsyntyche.terminal import MessageTray, MessageType, Terminal
+from libsyntyche.texteditor import Searcher
+
+from .common import compare_to_baseline, offscreen_app, report_latency, save_results, summarize
+
+# Medians of single operations are small, so the allowed noise is too
+SLOWER_MARGIN = 0.0002
+
+
+def time_each(count: int, func: Callable[[int], None]) -> List[float]:
+    timings = []
+    for n in range(count):
+        start = time.perf_counter()
+        func(n)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def make_words(count: int) -> List[str]:
+    rng = random.Random(1)
+    return sorted({''.join(rng.choice('abcdefghijklmnop') for _ in range(rng.randint(3, 10)))
+                   for _ in range(count)})
+
+
+def make_document(lines: int) -> str:
+    rng = random.Random(2)
+    words = make_words(2000) + ['foo'] * 20
+    return '\n'.join(' '.join(rng.choice(words) for _ in range(12)) for _ in range(lines))
+
+
+def bench_terminal(app: QtWidgets.QApplication, scale: int) -> Dict[str, List[float]]:
+    window = QtWidgets.QWidget()
+    layout = QtWidgets.QVBoxLayout(window)
+    terminal = Terminal(window)
+    layout.addWidget(terminal)
+    words = make_words(20_000)
+    terminal.add_command(Command('words', '', lambda arg: None, short_name='w'))
+    terminal.add_autocompletion_pattern(AutocompletionPattern(
+        'words', lambda name, text: [w for w in words if w.startswith(text)],
+        prefix=r'w\s*'))
+    window.show()
+    terminal.input_field.setFocus()
+    app.processEvents()
+    input_field = terminal.input_field
+    results = {}
+
+    text = 'w the quick brown fox jumps over the lazy dog ' * 10
+
+    def type_key(n: int) -> None:
+        QTest.keyClick(input_field, text[n % len(text)])
+        app.processEvents()
+    results['terminal: type a character'] = time_each(len(text), type_key)
+
+    prefixes = [w[:2] for w in random.Random(3).sample(words, 200 * scale)]
+
+    def complete(n: int) -> None:
+        input_field.setText(f'w {prefixes[n]}')
+        terminal.cli.stop_autocompleting()
+        QTest.keyClick(input_field, QtCore.Qt.Key_Tab)
+        app.processEvents()
+    results['terminal: tab completion, 20k words'] = time_each(len(prefixes), complete)
+
+    terminal.cli.history = [''] + [f'w entry {n}' for n in range(5000)]
+    input_field.setText('')
+    terminal.cli.reset_history_travel()
+
+    def older(n: int) -> None:
+        QTest.keyClick(input_field, QtCore.Qt.Key_Up)
+        app.processEvents()
+    results['terminal: older history, 5k entries'] = time_each(1000, older)
+
+    def print_or_error(n: int) -> None:
+        if n % 10:
+            terminal.print_(f'message {n}')
+        else:
+            terminal.error(f'error {n}')
+    results['terminal: print_/error'] = time_each(10_000 * scale, print_or_error)
+    app.processEvents()
+
+    def toggle_log(n: int) -> None:
+        terminal.cli.run_command('l', quiet=True)
+        app.processEvents()
+    results[f'terminal: toggle log, {terminal.log_history.count()} rows'] = \
+        time_each(20, toggle_log)
+
+    tray = MessageTray(window)
+    tray.resize(400, 600)
+    tray.show()
+
+    def burst(n: int) -> None:
+        for i in range(100):
+            tray.add_message(datetime.now(), MessageType.PRINT, f'message {i}')
+        app.processEvents()
+    results['message tray: burst of 100 messages'] = time_each(10, burst)
+    window.close()
+    return results
+
+
+def bench_searcher(app: QtWidgets.QApplication, scale: int) -> Dict[str, List[float]]:
+    text = make_document(50_000 * scale)
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText(text)
+    searcher = Searcher(editor, error=print, log=lambda _: None)
+    results = {}
+
+    # The first search finds every match, after that it's only navigation
+    results['searcher: new search'] = time_each(
+        5, lambda n: searcher.search_or_replace('foo'))
+
+    def search_next(n: int) -> None:
+        searcher.search_next()
+    results['searcher: next match'] = time_each(200, search_next)
+
+    words = make_words(2000)
+
+    def count(n: int) -> None:
+        searcher.search_or_replace(f'{words[n]}/#')
+    results[f'searcher: count, {len(text) // 1_000_000} MB'] = time_each(20, count)
+
+    def replace_all(n: int) -> None:
+        searcher.search_or_replace('foo/bar/a')
+    timings = []
+    for _ in range(3):
+        editor.setPlainText(text)
+        timings.extend(time_each(1, replace_all))
+    results[f'searcher: replace all, {len(text) // 1_000_000} MB'] = timings
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiply the sizes of the tests by this')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--save', type=Path)
+    parser.add_argument('--compare', type=Path)
+    args = parser.parse_args()
+    app = offscreen_app()
+    results = {name: summarize(timings)
+               for bench in [bench_terminal, bench_searcher]
+               for name, timings in bench(app, args.scale).items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, summary in results.items():
+            report_latency(name, summary)
+    save_results(args.save, results)
+    if args.compare and compare_to_baseline(results, args.compare, SLOWER_MARGIN):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare loading a large file with DocumentLoader against the usual
+setPlainText(path.read_text()).
+
+Besides the total time, this reports the longest the event loop was
+blocked and the peak memory allocated by Python while loading.
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from PyQt5 import QtWidgets
+
+from libsyntyche.texteditor import DocumentLoader
+
+from .common import offscreen_app
+
+SIZE_MB = 100
+
+
+def make_file(path: Path, size_mb: int) -> None:
+    line = ('{} Lorem ipsum dolor sit amet, consectetur adipiscing elit, '
+            'sed do eiusmod tempor incididunt ut labore et dolore magna.\n')
+    with open(path, 'w', encoding='utf-8') as f:
+        n = 0
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(''.join(line.format(n + i) for i in range(1000)))
+            n += 1000
+
+
+def run(name: str, load: Callable[[QtWidgets.QPlainTextEdit], Callable[[], bool]]) -> None:
+    """
+    Time a load, where load starts loading into an editor and returns a
+    function that says whether it's still running.
+    """
+    app = offscreen_app()
+    editor = QtWidgets.QPlainTextEdit()
+    editor.resize(800, 600)
+    editor.show()
+    app.processEvents()
+    stalls: List[float] = []
+    tracemalloc.start()
+    start = last_turn = time.perf_counter()
+    is_running = load(editor)
+    stalls.append(time.perf_counter() - last_turn)
+    while is_running():
+        last_turn = time.perf_counter()
+        app.processEvents()
+        stalls.append(time.perf_counter() - last_turn)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<24} total {total:8.2f} s   longest stall {max(stalls) * 1000:8.1f} ms'
+          f'   python peak {peak / 1024 / 1024:8.1f} MB'
+          f'   blocks {editor.document().blockCount()}')
+
+
+def main() -> None:
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE_MB
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'big.txt'
+        make_file(path, size_mb)
+        print(f'{size_mb} MB file')
+
+        def read_text(editor: QtWidgets.QPlainTextEdit) -> Callable[[], bool]:
+            editor.setPlainText(path.read_text(encoding='utf-8'))
+            return lambda: False
+
+        def loader(editor: QtWidgets.QPlainTextEdit) -> Callable[[], bool]:
+            doc_loader = DocumentLoader(editor)
+            doc_loader.load(path)
+            return lambda: doc_loader.is_running
+
+        cases: List[Tuple[str, Callable[[QtWidgets.QPlainTextEdit], Callable[[], bool]]]] = [
+            ('setPlainText(read_text)', read_text),
+            ('DocumentLoader', loader),
+        ]
+        for name, load in cases:
+            run(name, load)
+
+
+if __name__ == '__main__':
+    main()
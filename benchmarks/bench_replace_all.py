@@ -0,0 +1,62 @@
+"""
+Compare Searcher's bulk replace-all with the old one-edit-per-match loop.
+"""
+from PyQt5 import QtWidgets
+from PyQt5.QtGui import QTextCursor
+
+from libsyntyche.texteditor import SearchState, Searcher
+
+from .common import measure, offscreen_app, report
+
+
+def legacy_replace_all(editor: QtWidgets.QPlainTextEdit, state: SearchState,
+                       replace_buffer: str) -> None:
+    """The replace-all loop Searcher used before the bulk engine."""
+    temp_cursor = editor.textCursor()
+    editor.moveCursor(QTextCursor.Start)
+    while state.find(editor):
+        editor.textCursor().insertText(replace_buffer)
+    editor.setTextCursor(temp_cursor)
+
+
+def make_text(lines: int, hit_every: int) -> str:
+    return '\n'.join(('lorem ipsum foo dolor' if n % hit_every == 0
+                      else 'lorem ipsum dolor sit amet')
+                     for n in range(lines))
+
+
+def main() -> None:
+    offscreen_app()
+    cases = [
+        # (lines, a hit on every Nth line)
+        (50_000, 1),
+        (50_000, 4),
+        (50_000, 10),
+        (50_000, 1000),
+    ]
+    for lines, hit_every in cases:
+        text = make_text(lines, hit_every)
+        hits = len(range(0, lines, hit_every))
+        editor = QtWidgets.QPlainTextEdit()
+        searcher = Searcher(editor, error=print, log=lambda _: None)
+
+        def reset() -> None:
+            editor.setPlainText(text)
+
+        label = f'{lines} lines, {hits} hits'
+        if hits <= 5000:
+            # The old loop gets very slow with lots of hits
+            report(f'legacy loop, {label}',
+                   measure(lambda: legacy_replace_all(editor, SearchState('foo'), 'bar'),
+                           reset))
+        report(f'bulk replace, {label}',
+               measure(lambda: searcher.search_or_replace('foo/bar/a'), reset))
+        undo_steps = 0
+        while editor.document().isUndoAvailable():
+            editor.undo()
+            undo_steps += 1
+        print(f'{"":<40} undo steps after bulk replace: {undo_steps}')
+
+
+if __name__ == '__main__':
+    main()
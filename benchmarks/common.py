@@ -0,0 +1,99 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run a benchmark from the repository root with
+`python -m benchmarks.<name>`.
+"""
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Union
+
+from PyQt5 import QtWidgets
+
+_app = None
+
+
+def offscreen_app() -> QtWidgets.QApplication:
+    """Return the QApplication, creating a headless one if needed."""
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    if _app is None:
+        _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    return _app
+
+
+def measure(func: Callable[[], None], setup: Callable[[], None] = lambda: None,
+            repeat: int = 3) -> List[float]:
+    """Run setup and then func repeat times, returning func's timings."""
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    print(f'{name:<48} median {statistics.median(timings) * 1000:10.2f} ms'
+          f'  (min {min(timings) * 1000:.2f} ms, n={len(timings)})')
+
+
+def percentile(timings: List[float], percent: float) -> float:
+    """The timing that percent % of the timings are at or below (nearest rank)."""
+    ordered = sorted(timings)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """Latency percentiles (in seconds) and throughput of many single operations."""
+    return {
+        'n': len(timings),
+        'p50': percentile(timings, 50),
+        'p90': percentile(timings, 90),
+        'p99': percentile(timings, 99),
+        'max': max(timings),
+        'ops_per_second': len(timings) / sum(timings) if sum(timings) else 0.0,
+    }
+
+
+def report_latency(name: str, summary: Dict[str, float]) -> None:
+    print(f'{name:<48} p50 {summary["p50"] * 1000:9.3f} ms'
+          f'  p90 {summary["p90"] * 1000:9.3f} ms  p99 {summary["p99"] * 1000:9.3f} ms'
+          f'  {summary["ops_per_second"]:10.0f} ops/s  (n={summary["n"]:.0f})')
+
+
+# How much slower than the baseline a result can be before it counts
+SLOWER_FACTOR = 1.2
+SLOWER_MARGIN = 0.005
+
+
+def _seconds(result: Union[float, Dict[str, float]]) -> float:
+    return result['p50'] if isinstance(result, dict) else result
+
+
+def compare_to_baseline(results: Mapping[str, Union[float, Dict[str, float]]],
+                        baseline_path: Path, margin: float = SLOWER_MARGIN) -> List[str]:
+    """
+    Return the names of the results that are more than 20% (and margin
+    seconds) slower than in the baseline file, printing each one. Results
+    from summarize are compared by their median.
+    """
+    baseline = {name: _seconds(result)
+                for name, result in json.loads(baseline_path.read_text()).items()}
+    current = {name: _seconds(result) for name, result in results.items()}
+    slower = [name for name, seconds in current.items()
+              if name in baseline and seconds > baseline[name] * SLOWER_FACTOR + margin]
+    for name in slower:
+        print(f'SLOWER: {name}: {baseline[name] * 1000:.3f} ms -> '
+              f'{current[name] * 1000:.3f} ms')
+    return slower
+
+
+def save_results(path: Optional[Path], results: object) -> None:
+    if path is not None:
+        path.write_text(json.dumps(results, indent=2))
@@ -1 +1,31 @@
+import importlib
+import os
+
+# Same as typing.TYPE_CHECKING, without importing typing
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import types
+
 __version__ = '2.0.0'
+
+# Submodules are only imported when they are first used, so eg. an app
+# that only needs cli doesn't have to load PyQt. typing isn't imported here
+# for the same reason, hence the string annotations
+_SUBMODULES = frozenset(['app', 'cli', 'console', 'fileindex', 'instance', 'lazy', 'loghandler',
+                         'profiling', 'projectsearch', 'search', 'startup', 'terminal',
+                         'texteditor', 'widgets'])
+
+
+def __getattr__(name: str) -> 'types.ModuleType':
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> 'list[str]':
+    return sorted(set(globals()) | _SUBMODULES)
+
+
+if os.environ.get('LIBSYNTYCHE_PROFILE_STARTUP'):
+    from .startup import enable_startup_profiling
+    enable_startup_profiling()
@@ -1,10 +1,24 @@
+import hashlib
+import json
+import os
+import re
 import sys
+import tempfile
+import threading
+import time
+import traceback
 from pathlib import Path
-from typing import Any, List, Optional, Type, TypeVar, Union, cast
+from typing import (Any, Callable, Dict, Iterable, List, Match, NamedTuple, Optional,
+                    Sequence, Set, Tuple, Type, TypeVar, Union, cast)
 
 from PyQt5 import QtCore, QtWidgets
 
-from .widgets import HBoxLayout, VBoxLayout, mk_signal0
+from .cli import AutocompletionPattern, Command, current_activity
+from .instance import (decode_commands, forward_to_running_instance, is_own_socket,
+                       socket_path)
+from .lazy import LazyPattern
+from .startup import StartupProfiler, startup_profiler
+from .widgets import HBoxLayout, VBoxLayout, mk_signal0, mk_signal1
 
 
 class RootWindow(QtWidgets.QFrame):
@@ -29,28 +43,581 @@ class StackedRootWindow(QtWidgets.QFrame):
 C = TypeVar('C', bound=QtWidgets.QWidget)
 
 
+# Stylesheet preprocessing
+_CSS_CACHE_VERSION = 1
+# Strings are matched so they can be left alone, comments so they can be removed
+_css_token_rx = LazyPattern(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.DOTALL)
+_css_import_rx = LazyPattern(r'''@import\s+(?:url\(\s*)?["']?([^"')\s;]+)["']?\s*\)?\s*;''')
+_css_variable_def_rx = LazyPattern(r'^\s*\$([\w-]+)\s*:\s*([^;]*?)\s*;[ \t]*\n?', re.MULTILINE)
+_css_variable_rx = LazyPattern(r'\$([\w-]+)')
+_css_space_rx = LazyPattern(r'\s+')
+_css_punctuation_rx = LazyPattern(r' ?([{};,>]) ?|: ')
+_css_rule_rx = LazyPattern(r'([^{}]+)\{([^{}]*)\}')
+# The object name of a selector like #name or QLabel#name:hover
+_css_id_selector_rx = LazyPattern(r'^[\w*]*#([\w-]+)')
+_css_id_rx = LazyPattern(r'#([\w-]+)')
+
+
+class CompiledStyleSheet(NamedTuple):
+    css: str
+    # The sha256 of every file that went into the stylesheet
+    inputs: Dict[str, str]
+
+
+def _map_code(text: str, func: Callable[[str], str]) -> str:
+    """Apply func to everything in the css that isn't a string and remove all comments."""
+    out = []
+    pos = 0
+    for match in _css_token_rx.finditer(text):
+        out.append(func(text[pos:match.start()]))
+        if match[1] is not None:
+            out.append(match[0])
+        pos = match.end()
+    out.append(func(text[pos:]))
+    return ''.join(out)
+
+
+def _include_css(path: Path, inputs: Dict[str, str], stack: List[Path]) -> str:
+    """Return the css in path with every @import replaced by the imported file."""
+    path = path.resolve()
+    if path in stack:
+        raise ValueError(f'Stylesheet imports itself: {" -> ".join(map(str, stack + [path]))}')
+    if str(path) in inputs:
+        # Every file is only included once
+        return ''
+    data = path.read_bytes()
+    inputs[str(path)] = hashlib.sha256(data).hexdigest()
+    stack.append(path)
+    # Remove the comments first so commented out imports are ignored
+    css = _css_import_rx.sub(lambda m: _include_css(path.parent / m[1], inputs, stack),
+                             _map_code(data.decode('utf-8'), lambda code: code))
+    stack.pop()
+    return css
+
+
+def _expand_variables(css: str) -> str:
+    """Remove the $name: value; definitions in css and replace every $name with its value."""
+    variables: Dict[str, str] = {}
+
+    def replace(match: Match[str]) -> str:
+        try:
+            return variables[match[1]]
+        except KeyError:
+            raise ValueError(f'Undefined stylesheet variable: ${match[1]}') from None
+
+    def define(match: Match[str]) -> str:
+        variables[match[1]] = _css_variable_rx.sub(replace, match[2])
+        return ''
+
+    # Definitions have to come before they are used, so handle the
+    # definitions and uses in order
+    out = []
+    pos = 0
+    for match in _css_variable_def_rx.finditer(css):
+        out.append(_css_variable_rx.sub(replace, css[pos:match.start()]))
+        define(match)
+        pos = match.end()
+    out.append(_css_variable_rx.sub(replace, css[pos:]))
+    return ''.join(out)
+
+
+def _minify_css(code: str) -> str:
+    code = _css_space_rx.sub(' ', code)
+    return _css_punctuation_rx.sub(lambda m: m[1] or ':', code)
+
+
+def preprocess_stylesheet(css_path: Path) -> CompiledStyleSheet:
+    """
+    Compile a stylesheet, including every file it @imports (relative to
+    the importing file), expanding $variables and minifying the result.
+
+    Variables are defined on their own line with $name: value; and can be
+    used anywhere after that. Raises ValueError if the stylesheet is
+    invalid.
+    """
+    inputs: Dict[str, str] = {}
+    css = _include_css(css_path, inputs, [])
+    css = _map_code(_expand_variables(css), _minify_css)
+    return CompiledStyleSheet(css.replace(';}', '}').strip(), inputs)
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def compile_stylesheet(css_path: Path, cache_dir: Optional[Path] = None
+                       ) -> CompiledStyleSheet:
+    """
+    Return the preprocessed stylesheet, using the copy cached in cache_dir
+    if the hashes of all its input files are the same as when it was
+    cached.
+    """
+    if cache_dir is None:
+        return preprocess_stylesheet(css_path)
+    path_hash = hashlib.sha256(str(css_path.resolve()).encode('utf-8')).hexdigest()
+    cache_file = cache_dir / f'{path_hash[:32]}.json'
+    try:
+        cached = json.loads(cache_file.read_text(encoding='utf-8'))
+        if cached['version'] == _CSS_CACHE_VERSION \
+                and all(_hash_file(path) == digest
+                        for path, digest in cached['inputs'].items()):
+            return CompiledStyleSheet(cached['css'], cached['inputs'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    compiled = preprocess_stylesheet(css_path)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': _CSS_CACHE_VERSION, 'inputs': compiled.inputs,
+                       'css': compiled.css}, f)
+        os.replace(temp_name, cache_file)
+    except OSError:
+        pass
+    return compiled
+
+
+def _parse_rules(css: str) -> Optional[Dict[str, str]]:
+    """Return the rules in minified css by selector, or None if a selector is repeated."""
+    rules: Dict[str, str] = {}
+    for match in _css_rule_rx.finditer(css):
+        if match[1] in rules:
+            return None
+        rules[match[1]] = match[2]
+    return rules
+
+
+def _property_names(body: str) -> Set[str]:
+    return {declaration.split(':', 1)[0] for declaration in body.split(';') if declaration}
+
+
+def _widget_overrides(old_css: str, new_css: str) -> Optional[Dict[str, str]]:
+    """
+    Return the rules that differ between two stylesheets grouped by the
+    object name of the widgets they apply to, or None if the new
+    stylesheet can't be applied widget by widget.
+
+    That is only possible if no rule or property is removed, every changed
+    rule only has #name selectors and no unchanged rule mentions the same
+    names, since widget stylesheets take precedence over the app's
+    stylesheet whatever the specificity (so eg. a changed #a rule set on
+    the widget would beat an unchanged #a:hover rule in the app).
+    """
+    old_rules = _parse_rules(old_css)
+    new_rules = _parse_rules(new_css)
+    if old_rules is None or new_rules is None or not old_rules.keys() <= new_rules.keys():
+        return None
+    overrides: Dict[str, List[str]] = {}
+    for selector, body in new_rules.items():
+        old_body = old_rules.get(selector)
+        if body == old_body:
+            continue
+        if old_body is not None and not _property_names(old_body) <= _property_names(body):
+            return None
+        names = [_css_id_selector_rx.match(s.strip()) for s in selector.split(',')]
+        if not all(names):
+            return None
+        for name in names:
+            overrides.setdefault(cast(Match[str], name)[1], []).append(f'{selector}{{{body}}}')
+    for selector, body in new_rules.items():
+        if old_rules.get(selector) == body \
+                and not overrides.keys().isdisjoint(_css_id_rx.findall(selector)):
+            return None
+    return {name: ''.join(rules) for name, rules in overrides.items()}
+
+
+class StyleSheetReloader(QtCore.QObject):
+    """
+    Applies a stylesheet file to the app and reloads it every time the app
+    is activated, which makes it easy to tweak the theme while it runs.
+
+    The stylesheet is preprocessed (see preprocess_stylesheet) and, if
+    cache_dir is set, the result is cached there.
+
+    Setting a stylesheet makes Qt restyle every widget, so nothing is done
+    unless the modification time or size of one of the input files has
+    changed, and nothing is applied unless the compiled css has changed.
+    If only rules for specific widgets (#name selectors) have changed, the
+    new rules are set on those widgets instead of restyling the whole app.
+    """
+    activation_event = mk_signal0()
+
+    def __init__(self, app: QtWidgets.QApplication, css_path: Path,
+                 cache_dir: Optional[Path] = None) -> None:
+        super().__init__(app)
+        self.app = app
+        self.css_path = css_path
+        self.cache_dir = cache_dir
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        # The stylesheet set on the app and the overrides set on widgets
+        self._app_css: Optional[str] = None
+        self._overrides: Dict[str, str] = {}
+        # The latest compiled stylesheet
+        self._css = ''
+
+    def _input_stats(self, paths: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stats[path] = (-1, -1)
+            else:
+                stats[path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Apply the stylesheet if it has changed. Return whether it was applied.
+
+        Raises ValueError if the stylesheet is invalid.
+        """
+        if not force and self._stats and self._input_stats(self._stats) == self._stats:
+            return False
+        compiled = compile_stylesheet(self.css_path, self.cache_dir)
+        self._stats = self._input_stats(compiled.inputs)
+        overrides = None
+        if not force and self._app_css is not None:
+            overrides = _widget_overrides(self._app_css, compiled.css)
+        if overrides == self._overrides:
+            return False
+        self._css = compiled.css
+        if overrides is None or not self._set_overrides(overrides):
+            self._restyle_app()
+        return True
+
+    def _restyle_app(self) -> None:
+        self._set_overrides({})
+        self._app_css = self._css
+        self.app.setStyleSheet(self._css)
+
+    def _set_overrides(self, overrides: Dict[str, str]) -> bool:
+        """
+        Set the overrides on the widgets they apply to. Return False (and do
+        nothing) if one of them has a stylesheet of its own, which would
+        hide the app's rules that the overrides are part of.
+        """
+        old_overrides = self._overrides
+        names = overrides.keys() | old_overrides.keys()
+        widgets = [w for w in self.app.allWidgets() if w.objectName() in names]
+        own = [w for w in widgets if w.styleSheet() != old_overrides.get(w.objectName(), '')]
+        if overrides and own:
+            return False
+        self._overrides = overrides
+        for widget in widgets:
+            if widget not in own:
+                widget.setStyleSheet(overrides.get(widget.objectName(), ''))
+        return True
+
+    def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.ApplicationActivate:
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                print(f'Could not reload the stylesheet: {e}', file=sys.stderr)
+            self.activation_event.emit()
+        elif self._overrides and event.type() == QtCore.QEvent.Polish \
+                and isinstance(obj, QtWidgets.QWidget) \
+                and obj.objectName() in self._overrides:
+            # Widgets created after a widget-level update need it too
+            if not obj.styleSheet():
+                obj.setStyleSheet(self._overrides[obj.objectName()])
+            elif obj.styleSheet() != self._overrides[obj.objectName()]:
+                # Its own stylesheet would hide the override, so do a full
+                # restyle instead (but not in the middle of polishing it)
+                QtCore.QTimer.singleShot(0, self._restyle_app)
+        return False
+
+
+class StallReport(NamedTuple):
+    # When the stall started, as a unix timestamp
+    started: float
+    # How many seconds the event loop was late
+    duration: float
+    # The command or autocompletion pattern running when the stall was found
+    activity: str
+    # The GUI thread's Python stack when the stall was found
+    stack: str
+
+    def summary(self) -> str:
+        where = f' in {self.activity}' if self.activity else ''
+        return f'The UI was frozen for {self.duration * 1000:.0f} ms{where}'
+
+    def format(self) -> str:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))
+        return f'{started} {self.summary()}\n{self.stack}'
+
+
+def _describe_activity(activity: Union[Command, AutocompletionPattern, None]) -> str:
+    if isinstance(activity, Command):
+        return f'command {activity.name!r} ({activity.short_name})'
+    if isinstance(activity, AutocompletionPattern):
+        return f'autocompletion pattern {activity.name!r}'
+    return ''
+
+
+class StallWatchdog(QtCore.QObject):
+    """
+    Notices when the event loop is blocked for longer than threshold ms.
+
+    A timer in the GUI thread beats every interval ms, and a helper thread
+    checks that the beats keep coming. When they don't, the helper grabs
+    the GUI thread's stack and the CLI command or autocompletion pattern
+    running at the time. Once the event loop is running again, the report
+    is appended to log_path (if set) and stalled is emitted.
+    """
+    stalled = mk_signal1(StallReport)
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None, threshold: int = 250,
+                 interval: int = 50, log_path: Optional[Path] = None) -> None:
+        super().__init__(parent)
+        self.threshold = threshold
+        self.interval = interval
+        self.log_path = log_path
+        # How late the last heartbeat was, in seconds
+        self.latency = 0.0
+        self._last_beat = time.monotonic()
+        self._gui_thread = threading.get_ident()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self._beat)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._gui_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._timer.start(self.interval)
+        self._thread = threading.Thread(target=self._watch, name='StallWatchdog',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._timer.stop()
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        self.latency = max(0.0, now - self._last_beat - self.interval / 1000)
+        self._last_beat = now
+
+    def _watch(self) -> None:
+        # Everything here runs in the helper thread
+        interval = self.interval / 1000
+        limit = interval + self.threshold / 1000
+        stall: Optional[Tuple[float, float, str, str]] = None
+        while not self._stopping.wait(min(interval, self.threshold / 1000) / 2):
+            last_beat = self._last_beat
+            now = time.monotonic()
+            if stall is None:
+                if now - last_beat > limit:
+                    frame = sys._current_frames().get(self._gui_thread)
+                    stack = ''.join(traceback.format_stack(frame)) if frame else ''
+                    stall = (last_beat, time.time() - (now - last_beat),
+                             _describe_activity(current_activity()), stack)
+            elif last_beat != stall[0]:
+                beat, started, activity, stack = stall
+                stall = None
+                self._report(StallReport(started, last_beat - beat - interval,
+                                         activity, stack))
+
+    def _report(self, report: StallReport) -> None:
+        if self.log_path is not None:
+            try:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.log_path.open('a', encoding='utf-8') as f:
+                    f.write(report.format() + '\n')
+            except OSError as e:
+                print(f'Could not log the stall: {e}', file=sys.stderr)
+        # Queued to the GUI thread
+        self.stalled.emit(report)
+
+
+class _FirstPaintFilter(QtCore.QObject):
+    """Reports the startup profile once the first widget has been painted."""
+    def __init__(self, app: QtWidgets.QApplication, profiler: StartupProfiler) -> None:
+        super().__init__(app)
+        self.app = app
+        self.profiler = profiler
+
+    def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.Paint:
+            self.app.removeEventFilter(self)
+            self.profiler.uninstall()
+            self.profiler.mark('first paint')
+            print(self.profiler.report(), file=sys.stderr)
+        return False
+
+
+def _install_stall_watchdog(app: QtWidgets.QApplication, window: QtWidgets.QWidget,
+                            threshold: int) -> StallWatchdog:
+    from .terminal import Terminal
+    data_location = QtCore.QStandardPaths.writableLocation(
+        QtCore.QStandardPaths.AppLocalDataLocation)
+    watchdog = StallWatchdog(app, threshold,
+                             log_path=Path(data_location) / 'stalls.log'
+                             if data_location else None)
+    terminals = window.findChildren(Terminal)
+
+    def log_stall(report: StallReport) -> None:
+        for terminal in terminals:
+            terminal.log_history.add_error(report.summary())
+    watchdog.stalled.connect(log_stall)
+    watchdog.start()
+    app.aboutToQuit.connect(watchdog.stop)
+    return watchdog
+
+
+class InstanceServer(QtCore.QObject):
+    """
+    Receives the commands that later launches of the app send with
+    instance.forward_to_running_instance, and emits commands_received.
+    """
+    commands_received = mk_signal1(list)
+
+    def __init__(self, name: str, parent: Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+        from PyQt5.QtNetwork import QLocalServer
+        self.name = name
+        self._server = QLocalServer(self)
+        self._server.setSocketOptions(QLocalServer.UserAccessOption)
+        self._server.newConnection.connect(self._accept)
+
+    def listen(self) -> bool:
+        """Start listening. Return False if that isn't possible."""
+        try:
+            path = socket_path(self.name)
+        except OSError:
+            return False
+        if self._server.listen(path):
+            return True
+        # A crashed instance leaves its socket behind. This is only called
+        # when no running instance answered, so it's safe to remove, as long
+        # as it is ours
+        if hasattr(os, 'getuid') and not is_own_socket(path):
+            return False
+        self._server.removeServer(path)
+        return self._server.listen(path)
+
+    def close(self) -> None:
+        self._server.close()
+
+    def _accept(self) -> None:
+        connection = self._server.nextPendingConnection()
+        while connection is not None:
+            connection.readyRead.connect(lambda c=connection: self._read(c))
+            connection.disconnected.connect(connection.deleteLater)
+            connection = self._server.nextPendingConnection()
+
+    def _read(self, connection: Any) -> None:
+        if not connection.canReadLine():
+            return
+        try:
+            commands = decode_commands(bytes(connection.readLine()))
+        except ValueError:
+            connection.write(b'error\n')
+            connection.disconnectFromServer()
+            return
+        connection.write(b'ok\n')
+        connection.flush()
+        connection.disconnectFromServer()
+        self.commands_received.emit(commands)
+
+
+def _install_instance_server(app: QtWidgets.QApplication, window: QtWidgets.QWidget,
+                             name: str) -> Optional[InstanceServer]:
+    from .terminal import Terminal
+    server = InstanceServer(name, app)
+    if not server.listen():
+        print(f'Could not listen for other instances of {name}', file=sys.stderr)
+        return None
+    terminal = window.findChild(Terminal)
+
+    def run_commands(commands: List[str]) -> None:
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        if terminal is not None:
+            for command in commands:
+                terminal.exec_command(command)
+    server.commands_received.connect(run_commands)
+    app.aboutToQuit.connect(server.close)
+    return server
+
+
 def run_app(css_path: Union[Path, str, None], window_constructor: Type[C],
-            args: Optional[List[Any]] = None) -> None:
+            args: Optional[List[Any]] = None,
+            stall_threshold: Optional[int] = None,
+            single_instance: Optional[str] = None,
+            commands: Sequence[str] = ()) -> None:
+    """
+    Create the app and the main window and run the event loop.
+
+    commands are run in the main window's Terminal (see
+    Terminal.exec_command) once the window is created.
+
+    If single_instance is set, it is the app's name and only one instance
+    of the app runs at a time. If one is already running, commands are
+    sent to it instead and this one exits right away.
+
+    If stall_threshold is set (or the LIBSYNTYCHE_STALL_THRESHOLD
+    environment variable is), a StallWatchdog reports every time the event
+    loop is blocked for longer than that many ms. The reports are logged to
+    stalls.log in the app's data directory and to the log of every Terminal
+    in the main window.
+    """
+    if single_instance and forward_to_running_instance(single_instance, commands):
+        sys.exit()
+    profiler = startup_profiler()
+    if profiler is not None:
+        profiler.mark('run_app')
     app = QtWidgets.QApplication(sys.argv)
+    if profiler is not None:
+        profiler.mark('QApplication created')
+        app.installEventFilter(_FirstPaintFilter(app, profiler))
     if css_path:
         if isinstance(css_path, str):
             css_path = Path(css_path)
-        app.setStyleSheet(css_path.read_text())
-
-        class AppEventFilter(QtCore.QObject):
-            activation_event = mk_signal0()
-
-            def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
-                if event.type() == QtCore.QEvent.ApplicationActivate:
-                    cast(QtWidgets.QApplication, obj).setStyleSheet(
-                        cast(Path, css_path).read_text())
-                    self.activation_event.emit()
-                return False
-        event_filter = AppEventFilter()
+        cache_location = QtCore.QStandardPaths.writableLocation(
+            QtCore.QStandardPaths.CacheLocation)
+        event_filter = StyleSheetReloader(
+            app, css_path, Path(cache_location) / 'stylesheets' if cache_location else None)
+        event_filter.reload()
         setattr(app, 'event_filter', event_filter)
         app.installEventFilter(event_filter)
+        if profiler is not None:
+            profiler.mark('stylesheet loaded')
     if args is None:
         args = []
     window = window_constructor(*args)
+    if profiler is not None:
+        profiler.mark('main window created')
+    if stall_threshold is None and os.environ.get('LIBSYNTYCHE_STALL_THRESHOLD'):
+        stall_threshold = int(os.environ['LIBSYNTYCHE_STALL_THRESHOLD'])
+    if stall_threshold is not None:
+        setattr(app, 'stall_watchdog', _install_stall_watchdog(app, window, stall_threshold))
+    if single_instance:
+        setattr(app, 'instance_server',
+                _install_instance_server(app, window, single_instance))
+    if commands:
+        from .terminal import Terminal
+        terminal = window.findChild(Terminal)
+        if terminal is not None:
+            for command in commands:
+                terminal.exec_command(command)
     app.setActiveWindow(window)
     sys.exit(app.exec_())
@@ -19,18 +19,37 @@ if any other key is pressed:
     - completion -> not running
 """
 import enum
-import logging
 import re
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from functools import lru_cache
 from operator import itemgetter
-from pathlib import Path
-from typing import (Any, Callable, Dict, Iterator, List, NamedTuple, Optional,
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterator, List, NamedTuple, Optional,
                     Tuple, Union, cast)
 
+from .lazy import LazyPattern
+
 # TODO: add some check to warn when overwriting an existing command
 # TODO: also either completely remove long mode or just default to short mode
 
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    import cProfile
+    import logging
+    from pathlib import Path
+
+
+def _logger() -> 'logging.Logger':
+    # logging takes a while to import and is only needed when something
+    # goes wrong, so it's imported on first use
+    import logging
+    return logging.getLogger(__name__)
+
+
+def __getattr__(name: str) -> 'logging.Logger':
+    if name == 'logger':
+        return _logger()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class ArgumentRules(enum.Enum):
@@ -39,6 +58,17 @@ class ArgumentRules(enum.Enum):
     REQUIRED = enum.auto()
 
 
+class CachePolicy(enum.Enum):
+    # Always call get_suggestions (the default)
+    NONE = enum.auto()
+    # Reuse the result for the exact same match text
+    EXACT = enum.auto()
+    # Like EXACT, but a longer text can also be answered by filtering the
+    # result of a shorter prefix. Only use this if every suggestion for a
+    # text starts with that text.
+    PREFIX = enum.auto()
+
+
 class AutocompletionPattern(NamedTuple):
     name: str
     get_suggestions: Callable[[str, str], List[str]]
@@ -46,6 +76,7 @@ class AutocompletionPattern(NamedTuple):
     start: str = r'^'
     end: str = r'$'
     illegal_chars: str = ''
+    cache: CachePolicy = CachePolicy.NONE
 
 
 _ArgCallback = Callable[[str], Any]
@@ -56,7 +87,9 @@ _NoArgCallback = Callable[[], Any]
 class Command(NamedTuple):
     name: str
     help_text: str
-    callback: Union[_ArgCallback, _NoArgCallback]
+    # Either a function or a "module:function" reference to one, which is
+    # only imported the first time the command is run
+    callback: Union[_ArgCallback, _NoArgCallback, str]
     args: ArgumentRules = ArgumentRules.OPTIONAL
     short_name: str = ''
     arg_help: Tuple[Tuple[str, str], ...] = ()
@@ -64,6 +97,97 @@ class Command(NamedTuple):
     strip_input: bool = True
 
 
+# The command or autocompletion pattern being run right now. This is read
+# from other threads (eg. by the stall watchdog in app.py) to find out what
+# is blocking the thread running the CLI.
+_current_activity: Optional[Union[Command, AutocompletionPattern]] = None
+
+
+@contextmanager
+def _running(activity: Union[Command, AutocompletionPattern]) -> Iterator[None]:
+    global _current_activity
+    previous = _current_activity
+    _current_activity = activity
+    try:
+        yield
+    finally:
+        _current_activity = previous
+
+
+def current_activity() -> Optional[Union[Command, AutocompletionPattern]]:
+    """Return the command or autocompletion pattern that is running, if any."""
+    return _current_activity
+
+
+class SuggestionCache:
+    """
+    LRU cache for the results of AutocompletionPattern.get_suggestions.
+
+    Entries are keyed by pattern name and match text and are evicted when
+    there are more than max_size of them or when they are older than ttl
+    seconds (if ttl is not None).
+    """
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = 60.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, List[str]]]' \
+            = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: Tuple[str, str], now: float) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        timestamp, suggestions = entry
+        if self.ttl is not None and now - timestamp > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return suggestions
+
+    def _put(self, key: Tuple[str, str], suggestions: List[str], now: float) -> None:
+        self._entries[key] = (now, suggestions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_suggestions(self, pattern: AutocompletionPattern, text: str) -> List[str]:
+        """Return the suggestions for text, calling the provider if needed."""
+        if pattern.cache == CachePolicy.NONE:
+            return pattern.get_suggestions(pattern.name, text)
+        now = self._clock()
+        key = (pattern.name, text)
+        suggestions = self._get(key, now)
+        if suggestions is None and pattern.cache == CachePolicy.PREFIX:
+            # Look for the longest cached prefix of the text
+            for end in range(len(text) - 1, -1, -1):
+                prefix_suggestions = self._get((pattern.name, text[:end]), now)
+                if prefix_suggestions is not None:
+                    suggestions = [x for x in prefix_suggestions
+                                   if x.startswith(text)]
+                    self._put(key, suggestions, now)
+                    break
+        if suggestions is None:
+            suggestions = pattern.get_suggestions(pattern.name, text)
+            self._put(key, suggestions, now)
+        return list(suggestions)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Drop cached suggestions for the pattern with the specified name,
+        or for all patterns if name is None.
+        """
+        if name is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+
+
 class AutocompletionState(NamedTuple):
     suggestions: List[str] = []
     suggestion_index: int = 0
@@ -80,7 +204,7 @@ class CommandLineInterface:
                  get_cursor_pos: Callable[[], int],
                  set_cursor_pos: Callable[[int], None],
                  show_error: Optional[Callable[[str], None]] = None,
-                 history_file: Optional[Path] = None,
+                 history_file: Optional['Path'] = None,
                  ) -> None:
         self.get_input = get_input
         self.set_input = set_input
@@ -106,6 +230,9 @@ class CommandLineInterface:
                 reversed(history_file.read_text().splitlines()))
 
         self.autocompletion_state = AutocompletionState()
+        self.suggestion_cache = SuggestionCache()
+        # If set, every command is run with this profile enabled
+        self.command_profile: Optional['cProfile.Profile'] = None
 
         self.commands: Dict[str, Command] = {}
         self.autocompletion_patterns: List[AutocompletionPattern] = []
@@ -117,7 +244,8 @@ class CommandLineInterface:
                 'help',
                 lambda name, text: _command_suggestions(self.commands, name, text),
                 prefix=r'\?\s*',
-                illegal_chars=' \t'
+                illegal_chars=' \t',
+                cache=CachePolicy.PREFIX
             )
         )
 
@@ -143,6 +271,7 @@ class CommandLineInterface:
             yield
         except Exception as e:
             full_msg = f'[UNHANDLED EXCEPTION] {msg}, due to exception: {e!r}'
+            logger = _logger()
             logger.exception(full_msg)
             try:
                 self.error(full_msg)
@@ -151,11 +280,25 @@ class CommandLineInterface:
 
     # Outside-visible methods
     def add_command(self, command: Command) -> None:
+        """Add a command. Raises ValueError if its callback reference is malformed."""
+        if isinstance(command.callback, str) \
+                and not _callback_reference_rx.fullmatch(command.callback):
+            raise ValueError(f'Malformed callback reference: {command.callback!r}')
         self.commands[command.short_name] = command
+        self.suggestion_cache.invalidate('help')
 
     def add_autocompletion_pattern(self, pattern: AutocompletionPattern) -> None:
         self.autocompletion_patterns.append(pattern)
 
+    def invalidate_suggestions(self, name: Optional[str] = None) -> None:
+        """
+        Forget cached suggestions for the autocompletion pattern with the
+        specified name, or for all patterns if name is None.
+
+        Call this when the data behind a cached pattern changes.
+        """
+        self.suggestion_cache.invalidate(name)
+
     def print_(self, text: str) -> None:
         self.set_output(text)
 
@@ -182,7 +325,8 @@ class CommandLineInterface:
             state = self.autocompletion_state
             if not state.suggestions:
                 state = _init_autocompletion(input_text, cursor_pos, state,
-                                             self.autocompletion_patterns)
+                                             self.autocompletion_patterns,
+                                             self.suggestion_cache)
             new_input_text, new_cursor_pos, new_autocompletion_state = \
                 _run_autocompletion(input_text, cursor_pos, state, reverse=reverse)
             self.set_input(new_input_text)
@@ -224,8 +368,15 @@ class CommandLineInterface:
                                      input_text == 'y')
                 self.confirmation_callback = None
                 return
-            new_input_text, (error, new_output_text), append_to_history =\
-                _run_command(input_text, self.commands, quiet)
+            profile = self.command_profile
+            if profile is not None:
+                profile.enable()
+            try:
+                new_input_text, (error, new_output_text), append_to_history =\
+                    _run_command(input_text, self.commands, quiet)
+            finally:
+                if profile is not None:
+                    profile.disable()
             if self.string_to_prompt:
                 self.set_input(self.string_to_prompt)
                 self.string_to_prompt = None
@@ -261,12 +412,14 @@ def _error(text: str) -> str:
 def _init_autocompletion(input_text: str,
                          cursor_pos: int,
                          autocompletion_state: AutocompletionState,
-                         autocompletion_patterns: List[AutocompletionPattern]
+                         autocompletion_patterns: List[AutocompletionPattern],
+                         cache: Optional[SuggestionCache] = None
                          ) -> AutocompletionState:
     suggestions, start, end = _generate_suggestions(
         autocompletion_patterns,
         input_text,
-        cursor_pos
+        cursor_pos,
+        cache
     )
     return autocompletion_state._replace(
         suggestions=suggestions,
@@ -321,7 +474,8 @@ def _command_suggestions(commands: Dict[str, Command], name: str, text: str) ->
 
 
 def _generate_suggestions(autocompletion_patterns: List[AutocompletionPattern],
-                          rawtext: str, rawpos: int
+                          rawtext: str, rawpos: int,
+                          cache: Optional[SuggestionCache] = None
                           ) -> Tuple[List[str], int, int]:
     # TODO: docstring ffs
     for ac in autocompletion_patterns:
@@ -348,7 +502,11 @@ def _generate_suggestions(autocompletion_patterns: List[AutocompletionPattern],
         if any(ch for ch in ac.illegal_chars if ch in matchtext):
             continue
         match_start, match_end = (start + prefix_length, end + prefix_length)
-        suggestions = [matchtext] + ac.get_suggestions(ac.name, matchtext)
+        with _running(ac):
+            if cache is None:
+                suggestions = [matchtext] + ac.get_suggestions(ac.name, matchtext)
+            else:
+                suggestions = [matchtext] + cache.get_suggestions(ac, matchtext)
         return suggestions, match_start, match_end
     return [], 0, 0
 
@@ -374,13 +532,34 @@ def _run_command(input_text: str, commands: Dict[str, Command], quiet: bool
         return (input_text, (True, "This command doesn't take any arguments"), False)
     if not arg and command.args == ArgumentRules.REQUIRED:
         return input_text, (True, 'This command requires an argument'), False
-    if command.args == ArgumentRules.NONE:
-        cast(_NoArgCallback, command.callback)()
-    else:
-        cast(_ArgCallback, command.callback)(arg)
+    callback = command.callback
+    if isinstance(callback, str):
+        try:
+            callback = _resolve_callback(callback)
+        except (ImportError, AttributeError) as e:
+            return input_text, (True, f'Could not load the command: {e}'), False
+    with _running(command):
+        if command.args == ArgumentRules.NONE:
+            cast(_NoArgCallback, callback)()
+        else:
+            cast(_ArgCallback, callback)(arg)
     return '', (False, None), not quiet
 
 
+_callback_reference_rx = LazyPattern(r'\w+(\.\w+)*:\w+(\.\w+)*')
+
+
+@lru_cache(maxsize=None)
+def _resolve_callback(reference: str) -> Callable[..., Any]:
+    """Import the function a "module:function" reference points to."""
+    from importlib import import_module
+    module_name, attributes = reference.split(':')
+    obj = import_module(module_name)
+    for attribute in attributes.split('.'):
+        obj = getattr(obj, attribute)
+    return cast(Callable[..., Any], obj)
+
+
 def _handle_confirmation(confirmation_callback: Tuple[_ArgCallback, str],
                          print_: Callable[[str], None],
                          confirmed: bool) -> None:
@@ -0,0 +1,130 @@
+"""
+A frontend for CommandLineInterface in a plain terminal, without Qt.
+
+Console reads commands from a TTY line by line (with tab completion and
+history if readline is available), or runs them in batch mode from a file
+or pipe, which is handy for running the same commands in scripts:
+
+    console = Console()
+    console.cli.add_command(Command('greet', 'Say hi', greet, short_name='g'))
+    sys.exit(console.run())
+"""
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional, TextIO
+
+from .cli import _generate_suggestions, CommandLineInterface
+
+
+class Console:
+    def __init__(self, prompt: str = '> ', history_file: Optional[Path] = None,
+                 stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> None:
+        self.prompt = prompt
+        self.stdout = stdout or sys.stdout
+        self.stderr = stderr or sys.stderr
+        self.errors = 0
+        self._input = ''
+        self._cursor_pos = 0
+        self._completions: List[str] = []
+        self.cli = CommandLineInterface(
+            get_input=lambda: self._input,
+            set_input=self._set_input,
+            set_output=self._print,
+            get_cursor_pos=lambda: self._cursor_pos,
+            set_cursor_pos=self._set_cursor_pos,
+            show_error=self._error,
+            history_file=history_file,
+        )
+
+    def _set_input(self, text: str) -> None:
+        self._input = text
+        self._cursor_pos = len(text)
+
+    def _set_cursor_pos(self, pos: int) -> None:
+        self._cursor_pos = pos
+
+    def _print(self, text: str) -> None:
+        if text:
+            self.stdout.write(text + '\n')
+
+    def _error(self, text: str) -> None:
+        self.errors += 1
+        self.stderr.write(text + '\n')
+
+    def complete(self, line: str, state: int) -> Optional[str]:
+        """
+        A readline completer: return the state-th way to complete line (up
+        to the cursor) or None when there are no more.
+        """
+        if state == 0:
+            suggestions, start, end = _generate_suggestions(
+                self.cli.autocompletion_patterns, line, len(line), self.cli.suggestion_cache)
+            self._completions = [line[:start] + s + line[end:] for s in suggestions[1:]]
+        if state < len(self._completions):
+            return self._completions[state]
+        return None
+
+    def run_batch(self, lines: Iterable[str], stop_on_error: bool = False) -> int:
+        """
+        Run every line as a command, skipping empty lines and lines starting
+        with #. Return the number of errors.
+        """
+        errors = self.errors
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            before = self.errors
+            self._set_input(line)
+            self.cli.run_command(line, quiet=True)
+            if stop_on_error and self.errors > before:
+                break
+        self.stdout.flush()
+        return self.errors - errors
+
+    def run_interactive(self) -> None:
+        """Read and run commands from stdin until EOF (Ctrl+D)."""
+        try:
+            import readline
+        except ImportError:
+            readline = None  # type: ignore
+        if readline is not None:
+            readline.set_completer_delims('')
+            readline.set_completer(self.complete)
+            readline.parse_and_bind('tab: complete')
+            for entry in reversed(self.cli.history[1:]):
+                readline.add_history(entry)
+
+            def prefill() -> None:
+                # Like set_input in the Qt terminal, eg. when a command prompts
+                if self._input:
+                    readline.insert_text(self._input)
+            readline.set_startup_hook(prefill)
+        try:
+            while True:
+                try:
+                    line = input(self.prompt)
+                except KeyboardInterrupt:
+                    self.stdout.write('\n')
+                    self._set_input('')
+                    continue
+                self._set_input(line)
+                self.cli.run_command(line)
+        except EOFError:
+            self.stdout.write('\n')
+        finally:
+            if readline is not None:
+                readline.set_startup_hook(None)
+                readline.set_completer(None)
+
+    def run(self, source: Optional[TextIO] = None, stop_on_error: bool = False) -> int:
+        """
+        Run commands from source (by default stdin), interactively if it is a
+        TTY and in batch mode otherwise. Return an exit code for sys.exit.
+        """
+        if source is None:
+            source = sys.stdin
+            if source.isatty():
+                self.run_interactive()
+                return 0
+        return 1 if self.run_batch(source, stop_on_error) else 0
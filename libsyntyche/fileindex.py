@@ -0,0 +1,237 @@
+"""
+An index of every file under a directory, for completing paths anywhere
+in a project by a fragment of their name:
+
+    index = FileIndex(project_root)
+    index.start()
+    terminal.add_autocompletion_pattern(AutocompletionPattern(
+        'open-file', index.get_suggestions, prefix=r'o\\s*'))
+
+The index is built and kept up to date by a background thread. It checks
+the modification time of every directory every refresh_interval seconds
+and only rescans the ones that have changed. The paths are kept in one
+newline-separated string, which is both compact and fast to search.
+"""
+import os
+import re
+import threading
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_IGNORE = frozenset(['.git', '.hg', '.svn', '__pycache__', 'node_modules'])
+
+
+class _Directory(NamedTuple):
+    mtime: int
+    # The names of the files in it, separated by newlines
+    files: str
+    # The relative paths of the directories in it
+    subdirs: Tuple[str, ...]
+
+
+class _Paths(NamedTuple):
+    # Every relative path, each one followed by a newline, sorted by
+    # directory and then by name
+    text: str
+    # text.lower(), or None if that doesn't line up with text
+    lower: Optional[str]
+    size: int
+
+
+class _Search(NamedTuple):
+    haystack: str
+    needle: str
+    # Where the lines that contain needle start and end, up to end
+    lines: List[Tuple[int, int]]
+    # Where the search stopped, or -1 if it searched all of haystack
+    end: int
+
+
+class FileIndex:
+    def __init__(self, root: str, ignore: Iterable[str] = DEFAULT_IGNORE,
+                 refresh_interval: float = 5.0) -> None:
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.ignore: FrozenSet[str] = frozenset(ignore)
+        self.refresh_interval = refresh_interval
+        # Only touched by whichever thread is refreshing the index
+        self._dirs: Dict[str, _Directory] = {}
+        # Replaced as a whole, so readers in other threads see a consistent set
+        self._paths = _Paths('', '', 0)
+        self._last_search: Optional[_Search] = None
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._paths.size
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the index has been built (it may still be refreshed later)."""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def start(self) -> None:
+        """Build the index and keep it up to date in a background thread."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='FileIndex', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        self.refresh()
+        while not self._stopping.wait(self.refresh_interval):
+            self.refresh()
+
+    def _full_path(self, rel: str) -> str:
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _scan_directory(self, rel: str) -> Optional[_Directory]:
+        path = self._full_path(rel)
+        files = []
+        subdirs = []
+        try:
+            # Taken before listing, so changes made while listing are caught
+            # by the next refresh
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if '\n' in entry.name:
+                        # Would break the newline-separated lists
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.ignore:
+                                subdirs.append(f'{rel}/{entry.name}' if rel else entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        files.sort()
+        subdirs.sort()
+        return _Directory(mtime, '\n'.join(files), tuple(subdirs))
+
+    def _add_tree(self, rel: str) -> None:
+        stack = [rel]
+        while stack:
+            rel = stack.pop()
+            directory = self._scan_directory(rel)
+            if directory is not None:
+                self._dirs[rel] = directory
+                stack.extend(directory.subdirs)
+
+    def _remove_tree(self, rel: str) -> None:
+        directory = self._dirs.pop(rel, None)
+        if directory is not None:
+            for subdir in directory.subdirs:
+                self._remove_tree(subdir)
+
+    def refresh(self) -> bool:
+        """
+        Rescan the directories that have changed since the last refresh (or
+        everything, the first time). Return whether anything had changed.
+        """
+        if not self._dirs:
+            self._add_tree('')
+            changed = True
+        else:
+            changed = False
+            for rel, old in list(self._dirs.items()):
+                if rel not in self._dirs:
+                    # A parent was removed earlier in this loop
+                    continue
+                try:
+                    mtime = os.stat(self._full_path(rel)).st_mtime_ns
+                except OSError:
+                    mtime = -1
+                if mtime == old.mtime:
+                    continue
+                changed = True
+                new = self._scan_directory(rel)
+                if new is None:
+                    self._remove_tree(rel)
+                    continue
+                self._dirs[rel] = new
+                for subdir in set(old.subdirs) - set(new.subdirs):
+                    self._remove_tree(subdir)
+                for subdir in set(new.subdirs) - set(old.subdirs):
+                    self._add_tree(subdir)
+        if changed:
+            self._build_paths()
+        self._ready.set()
+        return changed
+
+    def _build_paths(self) -> None:
+        chunks = []
+        count = 0
+        for rel in sorted(self._dirs):
+            files = self._dirs[rel].files
+            if not files:
+                continue
+            names = files.split('\n')
+            count += len(names)
+            if rel:
+                chunks.append(''.join(f'{rel}/{name}\n' for name in names))
+            else:
+                chunks.append(files + '\n')
+        text = ''.join(chunks)
+        lower = text.lower()
+        self._paths = _Paths(text, lower if len(lower) == len(text) else None, count)
+
+    def find(self, fragment: str, limit: int = 100) -> List[str]:
+        """
+        Return the relative paths (using / as the separator) that contain
+        fragment, in path order. The search ignores case unless fragment
+        has upper case letters.
+        """
+        paths = self._paths
+        text = paths.text
+        if fragment != fragment.lower():
+            haystack, needle = text, fragment
+        elif paths.lower is not None:
+            haystack, needle = paths.lower, fragment.lower()
+        else:
+            rx = re.compile(f'^.*{re.escape(fragment)}.*$', re.IGNORECASE | re.MULTILINE)
+            return [m[0] for _, m in zip(range(limit), rx.finditer(text))]
+        last = self._last_search
+        if last is not None and last.haystack is haystack and last.needle in needle:
+            # Typing more of the fragment can only narrow down the matches,
+            # so only the ones found last time and the rest of the paths
+            # after them need to be searched
+            lines = [(start, end) for start, end in last.lines
+                     if needle in haystack[start:end]]
+            pos = last.end
+        else:
+            lines = []
+            pos = 0
+        while pos != -1 and len(lines) < limit:
+            index = haystack.find(needle, pos)
+            if index == -1 or index == len(haystack):
+                pos = -1
+                break
+            start = haystack.rfind('\n', 0, index) + 1
+            end = haystack.find('\n', index)
+            lines.append((start, end))
+            pos = end + 1
+        self._last_search = _Search(haystack, needle, lines, pos)
+        return [text[start:end] for start, end in lines[:limit]]
+
+    def get_suggestions(self, name: str, text: str) -> List[str]:
+        """
+        For AutocompletionPattern: the full paths of the files that contain
+        text, or nothing until the index is built.
+        """
+        if not text:
+            return []
+        return [os.path.join(self.root, path) for path in self.find(text)]
@@ -0,0 +1,114 @@
+"""
+Forward commands to an app that is already running, instead of starting
+a second instance of it.
+
+This doesn't import PyQt (or anything else that is slow to import), so to
+make a second launch as fast as possible, call forward_to_running_instance
+at the very top of the app's main script:
+
+    import sys
+    from libsyntyche.instance import forward_to_running_instance
+    if forward_to_running_instance('myapp', sys.argv[1:]):
+        sys.exit()
+
+run_app does the same check when its single_instance argument is set,
+but by then PyQt has already been imported.
+
+Only works on platforms with Unix domain sockets.
+"""
+import json
+import os
+import socket
+import stat
+from typing import List, Sequence
+
+
+def _private_dir() -> str:
+    """
+    Return a directory only the current user can use, creating it if needed.
+
+    Raises OSError if the directory isn't safe to use, eg. because another
+    user created it first.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        path = runtime_dir
+    else:
+        path = os.path.join(os.environ.get('TMPDIR') or '/tmp', f'libsyntyche-{os.getuid()}')
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() \
+            or info.st_mode & 0o077:
+        raise OSError(f'{path} is not a private directory')
+    return path
+
+
+def socket_path(name: str) -> str:
+    """
+    Where the running instance of the app called name listens.
+
+    That's in $XDG_RUNTIME_DIR if it is set, or otherwise in a directory in
+    /tmp that only the current user can access. Raises OSError if that
+    directory isn't safe to use.
+    """
+    if not hasattr(os, 'getuid'):
+        # QLocalServer uses the name of a named pipe as is
+        return f'{name}-{os.environ.get("USERNAME", "")}'
+    return os.path.join(_private_dir(), name)
+
+
+def is_own_socket(path: str) -> bool:
+    """Whether path is missing or belongs to the current user."""
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return True
+    return info.st_uid == os.getuid()
+
+
+def encode_commands(commands: Sequence[str]) -> bytes:
+    return json.dumps(list(commands)).encode('utf-8') + b'\n'
+
+
+def decode_commands(data: bytes) -> List[str]:
+    """Raises ValueError if data isn't a list of command strings."""
+    commands = json.loads(data)
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        raise ValueError('Not a list of commands')
+    return commands
+
+
+def forward_to_running_instance(name: str, commands: Sequence[str],
+                                timeout: float = 1.0) -> bool:
+    """
+    Send commands to the running instance of the app called name, to be
+    run as if they came from the config (see Terminal.exec_command).
+
+    Return whether an instance was running and accepted them.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    try:
+        path = socket_path(name)
+        if not is_own_socket(path):
+            return False
+    except OSError:
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path)
+            sock.sendall(encode_commands(commands))
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+        except OSError:
+            # Nothing is running, or it's stuck
+            return False
+    return reply == b'ok\n'
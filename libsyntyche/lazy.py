@@ -0,0 +1,42 @@
+"""
+Things that are only set up the first time they're used, to keep
+importing libsyntyche cheap.
+"""
+import re
+from typing import Callable, Iterator, List, Match, Optional, Pattern, Union
+
+
+class LazyPattern:
+    """A regex that isn't compiled until it's used for the first time."""
+    def __init__(self, pattern: str, flags: int = 0) -> None:
+        self._pattern = pattern
+        self._flags = flags
+        self._compiled: Optional[Pattern[str]] = None
+
+    @property
+    def compiled(self) -> Pattern[str]:
+        if self._compiled is None:
+            self._compiled = re.compile(self._pattern, self._flags)
+        return self._compiled
+
+    @property
+    def pattern(self) -> str:
+        return self._pattern
+
+    def match(self, string: str) -> Optional[Match[str]]:
+        return self.compiled.match(string)
+
+    def fullmatch(self, string: str) -> Optional[Match[str]]:
+        return self.compiled.fullmatch(string)
+
+    def search(self, string: str) -> Optional[Match[str]]:
+        return self.compiled.search(string)
+
+    def finditer(self, string: str) -> Iterator[Match[str]]:
+        return self.compiled.finditer(string)
+
+    def findall(self, string: str) -> List[str]:
+        return self.compiled.findall(string)
+
+    def sub(self, repl: Union[str, Callable[[Match[str]], str]], string: str) -> str:
+        return self.compiled.sub(repl, string)
@@ -0,0 +1,103 @@
+"""
+A logging handler that shows log records in a Terminal's log.
+
+Records can come from any thread. They are put in a queue and added to
+the log in batches by the GUI thread, so logging never waits on the UI.
+"""
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+
+from PyQt5 import QtCore
+
+from .terminal import MessageType, Terminal
+from .widgets import mk_signal0
+
+
+class _Pump(QtCore.QObject):
+    # Emitted from the logging thread when the queue stops being empty
+    wake = mk_signal0()
+
+
+class TerminalLogHandler(logging.Handler):
+    """
+    Adds log records of at least level to a terminal's log history (and
+    with that to anything connected to Terminal.show_message, like a
+    MessageTray). Records at ERROR and above are shown as errors.
+
+    At most max_queue records wait to be shown. If more come in before the
+    GUI thread gets to them, the oldest are dropped and a note of how many
+    were dropped is added to the log instead. The records are added every
+    interval ms at most.
+    """
+    def __init__(self, terminal: Terminal, level: int = logging.WARNING,
+                 max_queue: int = 1000, interval: int = 100) -> None:
+        # The Qt parts are set up first since logging keeps track of the
+        # handler (and closes it at exit) as soon as Handler.__init__ runs
+        self._pump = _Pump(terminal)
+        self._timer = QtCore.QTimer(self._pump)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+        # Queued to the GUI thread when emitted from any other thread
+        self._pump.wake.connect(self._timer.start)
+        self._pump.destroyed.connect(self._on_destroyed)
+        self.terminal = terminal
+        self.dropped = 0
+        self._queue: Deque[Tuple[datetime, MessageType, str]] = deque(maxlen=max_queue)
+        self._closed = False
+        super().__init__(level)
+        self.setFormatter(logging.Formatter('%(levelname)s: %(name)s: %(message)s'))
+
+    def _on_destroyed(self) -> None:
+        self._closed = True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # logging holds the handler's lock while this runs
+        if self._closed:
+            return
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        type_ = MessageType.ERROR if record.levelno >= logging.ERROR else MessageType.PRINT
+        was_empty = not self._queue
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append((datetime.fromtimestamp(record.created), type_, message))
+        if was_empty:
+            self._pump.wake.emit()
+
+    def flush(self) -> None:
+        """Add the queued records to the log. Only call this in the GUI thread."""
+        self.acquire()
+        try:
+            records: List[Tuple[datetime, MessageType, str]] = list(self._queue)
+            self._queue.clear()
+            dropped = self.dropped
+            self.dropped = 0
+        finally:
+            self.release()
+        if self._closed or not (records or dropped):
+            return
+        if dropped:
+            records.insert(0, (datetime.now(), MessageType.ERROR,
+                               f'{dropped} log messages were dropped'))
+        self.terminal.log_history.add_many(records)
+
+    def close(self) -> None:
+        if not self._closed:
+            self._timer.stop()
+            self._closed = True
+            self._pump.deleteLater()
+        super().close()
+
+
+def install_log_handler(terminal: Terminal, level: int = logging.WARNING,
+                        logger: Optional[logging.Logger] = None) -> TerminalLogHandler:
+    """Send the records of logger (by default the root logger) to the terminal."""
+    handler = TerminalLogHandler(terminal, level)
+    (logger or logging.getLogger()).addHandler(handler)
+    return handler
@@ -0,0 +1,340 @@
+"""
+Profile an app while it runs, without restarting it.
+
+SamplingProfiler looks at a thread's Python stack every few milliseconds
+from a helper thread, which is cheap enough to leave on while using the
+app normally. TerminalProfiler adds a terminal command to start and stop
+it, or to run the following commands under cProfile instead.
+
+MemoryTracker compares tracemalloc snapshots to find what keeps growing,
+and TerminalMemoryInspector adds a terminal command for it, along with
+counts of live widgets and the sizes of the terminal's own structures.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .cli import ArgumentRules, Command
+
+if TYPE_CHECKING:
+    from .terminal import Terminal
+
+
+class HotFunction(NamedTuple):
+    name: str
+    # Seconds spent in the function itself, and including what it called
+    self_time: float
+    total_time: float
+
+
+def _format_hot_functions(functions: Iterable[HotFunction]) -> str:
+    return ', '.join(f'{f.name} ({f.self_time * 1000:.1f} ms)' for f in functions)
+
+
+class SamplingProfiler:
+    """
+    Records the stack of a thread (by default the one calling start) every
+    interval seconds until stopped. Can be started and stopped many times;
+    the samples are kept until clear is called.
+    """
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        # How many times each stack was seen, outermost function first
+        self.samples: 'Counter[Tuple[str, ...]]' = Counter()
+        # Seconds spent sampling, to estimate the time of each sample
+        self.elapsed = 0.0
+        self._labels: Dict[CodeType, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: Optional[int] = None) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name='SamplingProfiler', daemon=True,
+            args=(threading.get_ident() if thread_id is None else thread_id,))
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def clear(self) -> None:
+        self.samples.clear()
+        self.elapsed = 0.0
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = (f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                     f':{code.co_firstlineno})').replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def _sample(self, thread_id: int) -> None:
+        # Everything here runs in the helper thread
+        start = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            frame: Optional[FrameType] = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[tuple(stack)] += 1
+        self.elapsed += time.perf_counter() - start
+
+    def collapsed(self) -> List[str]:
+        """The samples in the collapsed stack format that flame graph tools read."""
+        return [f'{";".join(stack)} {count}'
+                for stack, count in sorted(self.samples.items())]
+
+    def write_collapsed(self, path: Path) -> None:
+        path.write_text(''.join(line + '\n' for line in self.collapsed()), encoding='utf-8')
+
+    def hot_functions(self, top: int = 10) -> List[HotFunction]:
+        """The functions that were seen the most on top of the stack."""
+        total = sum(self.samples.values())
+        if not total:
+            return []
+        seconds = self.elapsed / total
+        self_counts: 'Counter[str]' = Counter()
+        total_counts: 'Counter[str]' = Counter()
+        for stack, count in self.samples.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        return [HotFunction(label, count * seconds, total_counts[label] * seconds)
+                for label, count in self_counts.most_common(top)]
+
+
+def profile_hot_functions(profile: cProfile.Profile, top: int = 10) -> List[HotFunction]:
+    """The functions that the profile spent the most time in."""
+    stats = pstats.Stats(profile).stats  # type: ignore
+    functions = [HotFunction(f'{name} ({os.path.basename(filename)}:{line})', tt, ct)
+                 for (filename, line, name), (_, _, tt, ct, _) in stats.items()]
+    functions.sort(key=lambda f: f.self_time, reverse=True)
+    return functions[:top]
+
+
+class TerminalProfiler:
+    """
+    Adds a command to the terminal that starts and stops profiling. The
+    results are written to output_dir (by default the temp directory) and
+    the hottest functions are printed in the terminal.
+    """
+    def __init__(self, terminal: 'Terminal', short_name: str = 'p',
+                 output_dir: Optional[Path] = None, top: int = 5) -> None:
+        self.terminal = terminal
+        self.output_dir = output_dir
+        self.top = top
+        self.sampler = SamplingProfiler()
+        terminal.add_command(Command(
+            'profile', 'Profile the app while it runs.', self.command,
+            args=ArgumentRules.OPTIONAL, short_name=short_name,
+            arg_help=(('s', 'Start the sampling profiler.'),
+                      ('c', 'Run the following commands under cProfile.'),
+                      ('', 'Stop profiling, save the result and show the '
+                       'hottest functions.'))
+        ))
+
+    def command(self, arg: str) -> None:
+        if arg and (self.sampler.is_running or self.terminal.cli.command_profile):
+            self.terminal.error('Already profiling')
+        elif arg == 's':
+            self.sampler.clear()
+            self.sampler.start()
+            self.terminal.print_('Sampling profiler started')
+        elif arg == 'c':
+            self.terminal.cli.command_profile = cProfile.Profile()
+            self.terminal.print_('Profiling the following commands')
+        elif arg:
+            self.terminal.error('Unknown argument')
+        else:
+            self.stop()
+
+    def _output_path(self, suffix: str) -> Path:
+        output_dir = self.output_dir or Path(tempfile.gettempdir())
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir / f'profile-{time.strftime("%Y%m%d-%H%M%S")}{suffix}'
+
+    def stop(self) -> None:
+        """Stop profiling, save the result and print the hottest functions."""
+        profile = self.terminal.cli.command_profile
+        write: Callable[[Path], None]
+        if self.sampler.is_running:
+            self.sampler.stop()
+            suffix = '.collapsed'
+            hot_functions = self.sampler.hot_functions(self.top)
+            write = self.sampler.write_collapsed
+        elif profile is not None:
+            self.terminal.cli.command_profile = None
+            profile.disable()
+            suffix = '.pstats'
+            hot_functions = profile_hot_functions(profile, self.top)
+            write = profile.dump_stats
+        else:
+            self.terminal.error('Not profiling')
+            return
+        try:
+            path = self._output_path(suffix)
+            write(path)
+        except OSError as e:
+            self.terminal.error(f'Could not save the profile: {e}')
+            return
+        self.terminal.print_(f'Saved profile to {path}. Hottest: '
+                             + (_format_hot_functions(hot_functions) or 'nothing'))
+
+
+class MemoryDiff(NamedTuple):
+    # Where the memory was allocated, as "file:line"
+    location: str
+    size_diff: int
+    count_diff: int
+
+
+class MemoryTracker:
+    """
+    Finds the lines that allocated memory since the last snapshot.
+
+    tracemalloc is started by the first snapshot. It makes allocations
+    noticeably slower, so call stop when done.
+    """
+    def __init__(self, frames: int = 1) -> None:
+        self.frames = frames
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def has_snapshot(self) -> bool:
+        return self._snapshot is not None
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def snapshot(self) -> int:
+        """Take the snapshot to compare to later. Return the memory traced so far."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._snapshot = self._take_snapshot()
+        return tracemalloc.get_traced_memory()[0]
+
+    def diff(self, top: int = 10) -> List[MemoryDiff]:
+        """
+        Compare the memory now to the last snapshot, biggest growth first.
+        The current state becomes the new snapshot.
+
+        Raises ValueError if there is no snapshot.
+        """
+        if self._snapshot is None or not tracemalloc.is_tracing():
+            raise ValueError('No memory snapshot taken')
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(self._snapshot, 'lineno')
+        self._snapshot = snapshot
+        return [MemoryDiff(f'{os.path.basename(stat.traceback[0].filename)}'
+                           f':{stat.traceback[0].lineno}', stat.size_diff, stat.count_diff)
+                for stat in stats[:top] if stat.size_diff > 0]
+
+    def stop(self) -> None:
+        self._snapshot = None
+        tracemalloc.stop()
+
+
+def widget_counts(top: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    Count the live widgets of each class, most common first. This includes
+    widgets that are waiting to be deleted with deleteLater.
+    """
+    from PyQt5.QtWidgets import QApplication
+    counts = Counter(type(widget).__name__ for widget in QApplication.allWidgets())
+    return counts.most_common(top)
+
+
+def terminal_sizes(terminal: 'Terminal') -> Dict[str, int]:
+    """The sizes of the structures a terminal holds on to, which grow over time."""
+    cli = terminal.cli
+    help_html = terminal.help_view.help_html
+    return {
+        'history entries': len(cli.history),
+        'history chars': sum(map(len, cli.history)),
+        'log rows': terminal.log_history.count(),
+        'suggestions': len(cli.autocompletion_state.suggestions),
+        'cached suggestion lists': len(cli.suggestion_cache),
+        'help pages': len(help_html),
+        'help html chars': sum(map(len, help_html.values())),
+    }
+
+
+def _format_size(size: int) -> str:
+    sign = '-' if size < 0 else '+'
+    size = abs(size)
+    if size < 1024:
+        return f'{sign}{size} B'
+    if size < 1024 ** 2:
+        return f'{sign}{size / 1024:.1f} KiB'
+    return f'{sign}{size / 1024 ** 2:.1f} MiB'
+
+
+class TerminalMemoryInspector:
+    """Adds a command to the terminal that shows what is using memory."""
+    def __init__(self, terminal: 'Terminal', short_name: str = 'm', top: int = 5) -> None:
+        self.terminal = terminal
+        self.top = top
+        self.tracker = MemoryTracker()
+        terminal.add_command(Command(
+            'memory', 'Show what is using memory.', self.command,
+            args=ArgumentRules.OPTIONAL, short_name=short_name,
+            arg_help=(('', 'Show the sizes of the terminal\'s history, log and caches.'),
+                      ('w', 'Count the live widgets of each class.'),
+                      ('s', 'Start tracing memory and take a snapshot.'),
+                      ('d', 'Show where memory was allocated since the last '
+                       'snapshot and take a new one.'),
+                      ('x', 'Stop tracing memory.'))
+        ))
+
+    def command(self, arg: str) -> None:
+        if not arg:
+            self.terminal.print_(', '.join(f'{name}: {size}' for name, size
+                                           in terminal_sizes(self.terminal).items()))
+        elif arg == 'w':
+            self.terminal.print_('Live widgets: ' + ', '.join(
+                f'{name} ({count})' for name, count in widget_counts(self.top)))
+        elif arg == 's':
+            traced = self.tracker.snapshot()
+            self.terminal.print_(f'Took a memory snapshot, {_format_size(traced)[1:]} traced')
+        elif arg == 'd':
+            try:
+                diffs = self.tracker.diff(self.top)
+            except ValueError as e:
+                self.terminal.error(str(e))
+                return
+            self.terminal.print_('Growth since the last snapshot: ' + (', '.join(
+                f'{d.location} ({_format_size(d.size_diff)}, {d.count_diff:+d} blocks)'
+                for d in diffs) or 'none'))
+        elif arg == 'x':
+            self.tracker.stop()
+            self.terminal.print_('Stopped tracing memory')
+        else:
+            self.terminal.error('Unknown argument')
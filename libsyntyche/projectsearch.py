@@ -0,0 +1,222 @@
+"""
+Search and replace across every file in a directory, using the same
+/search/replace/flags syntax as the editor's Searcher.
+
+The files are read through mmap and processed in a pool of worker
+processes. Replacements are written to a temporary file next to the
+original which is then renamed over it, so a file is never left half
+written.
+"""
+import bisect
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from .fileindex import DEFAULT_IGNORE
+from .search import (_compile_search_rx, _expand_replacement, _iter_matches, _parse_flags,
+                     _replace_rx, _search_flags_rx, _search_rx, SearchFlags)
+
+
+class Preview(NamedTuple):
+    line: int
+    column: int
+    text: str
+
+
+class FileResult(NamedTuple):
+    path: Path
+    hits: int
+    previews: List[Preview]
+    error: Optional[str] = None
+
+
+class _Command(NamedTuple):
+    search: str
+    replace: Optional[str]
+    flags: FrozenSet[SearchFlags]
+
+
+def _parse_command(cmd: str) -> _Command:
+    """
+    Parse a command the same way Searcher does. Raises ValueError if it's
+    malformed or has an invalid regex.
+    """
+    if _search_rx.fullmatch(cmd):
+        command = _Command(cmd, None, frozenset())
+    elif (match := _search_flags_rx.fullmatch(cmd)):
+        command = _Command(match['search'], None, frozenset(_parse_flags(match['flags'])))
+    elif (match := _replace_rx.fullmatch(cmd)):
+        command = _Command(match['search'], match['replace'],
+                           frozenset(_parse_flags(match['flags'])))
+    else:
+        raise ValueError(f'Malformed search/replace: {cmd!r}')
+    try:
+        # Compiled here so errors don't come from the worker processes
+        _compile_search_rx(command.search, command.flags - {SearchFlags.backwards})
+    except re.error as e:
+        raise ValueError(f'Invalid regex: {e}') from e
+    return command
+
+
+def _iter_files(root: Path, pattern: str, ignore: FrozenSet[str]) -> Iterator[Path]:
+    """Yield the files matching pattern, except in directories named in ignore."""
+    for path in sorted(root.glob(pattern)):
+        if path.is_file() and not path.is_symlink() \
+                and ignore.isdisjoint(path.relative_to(root).parts[:-1]):
+            yield path
+
+
+def _read_text(path: Path, needle: Optional[bytes] = None) -> Optional[str]:
+    """
+    Return the contents of a UTF-8 file, or None if needle is given and
+    can't be found anywhere in it (which skips decoding the file at all).
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None if needle else ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if needle and data.find(needle) == -1:
+                return None
+            return str(data, 'utf-8')
+
+
+def _crlf_positions(text: str) -> List[int]:
+    """
+    Return where the newlines of the \r\n line endings in text end up once
+    the \r are removed.
+    """
+    return [m.start() - n for n, m in enumerate(re.finditer('\r\n', text))]
+
+
+def _write_atomically(path: Path, text: str) -> None:
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.',
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, temp_name)
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _process_file(path: Path, command: _Command, max_previews: int,
+                  dry_run: bool) -> FileResult:
+    """Search (and unless dry_run is set, replace) in a single file."""
+    search_flags = command.flags - {SearchFlags.backwards}
+    needle = None
+    # A plain case-sensitive search can rule out files without decoding them
+    if not search_flags & {SearchFlags.regex, SearchFlags.case_insensitive}:
+        needle = command.search.encode('utf-8')
+    try:
+        text = _read_text(path, needle)
+    except UnicodeDecodeError:
+        return FileResult(path, 0, [], 'Not a UTF-8 file')
+    except OSError as e:
+        return FileResult(path, 0, [], e.strerror or str(e))
+    if text is None:
+        return FileResult(path, 0, [])
+    # Match against the text with \n line endings like the editor does, so
+    # eg. $ matches at the end of every line, but write the original line
+    # endings back
+    original_text = text
+    crlf_positions = _crlf_positions(text) if '\r' in text else []
+    if crlf_positions:
+        text = text.replace('\r\n', '\n')
+
+    def original_pos(pos: int) -> int:
+        return pos + bisect.bisect_left(crlf_positions, pos)
+    rx = _compile_search_rx(command.search, frozenset(search_flags))
+    hits = 0
+    previews: List[Preview] = []
+    chunks: List[str] = []
+    last_end = 0
+    line = 1
+    line_counted_to = 0
+    for match in _iter_matches(rx, text):
+        hits += 1
+        if len(previews) < max_previews:
+            line += text.count('\n', line_counted_to, match.start())
+            line_counted_to = match.start()
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = text.find('\n', match.start())
+            if line_end == -1:
+                line_end = len(text)
+            previews.append(Preview(line, match.start() - line_start,
+                                    text[line_start:line_end].rstrip('\r')))
+        if command.replace is not None:
+            chunks.append(original_text[last_end:original_pos(match.start())])
+            if SearchFlags.regex in command.flags:
+                chunks.append(_expand_replacement(match, command.replace))
+            else:
+                chunks.append(command.replace)
+            last_end = original_pos(match.end())
+    if hits and command.replace is not None and not dry_run:
+        chunks.append(original_text[last_end:])
+        try:
+            _write_atomically(path, ''.join(chunks))
+        except OSError as e:
+            return FileResult(path, hits, previews, e.strerror or str(e))
+    return FileResult(path, hits, previews)
+
+
+def _run(paths: Iterable[Path], command: _Command, max_workers: Optional[int],
+         max_previews: int, dry_run: bool) -> List[FileResult]:
+    paths = list(paths)
+    commands = [command] * len(paths)
+    previews = [max_previews] * len(paths)
+    dry_runs = [dry_run] * len(paths)
+    if max_workers == 1 or len(paths) < 2:
+        results: Iterable[FileResult] = map(_process_file, paths, commands, previews,
+                                            dry_runs)
+        return [r for r in results if r.hits or r.error]
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_process_file, paths, commands, previews, dry_runs,
+                               chunksize=max(1, len(paths) // (4 * workers)))
+        return [r for r in results if r.hits or r.error]
+
+
+def search_project(root: Union[str, Path], cmd: str, pattern: str = '**/*',
+                   max_workers: Optional[int] = None,
+                   max_previews: int = 5,
+                   ignore: Iterable[str] = DEFAULT_IGNORE) -> List[FileResult]:
+    """
+    Count the matches of a search command (eg. "foo/iw") in every file
+    under root matching the glob pattern, skipping directories named in
+    ignore (like .git). A replace command is treated as a dry run.
+
+    Only files with matches or errors are included in the result.
+    """
+    return _run(_iter_files(Path(root), pattern, frozenset(ignore)), _parse_command(cmd),
+                max_workers, max_previews, True)
+
+
+def replace_project(root: Union[str, Path], cmd: str, pattern: str = '**/*',
+                    max_workers: Optional[int] = None,
+                    max_previews: int = 5,
+                    ignore: Iterable[str] = DEFAULT_IGNORE) -> List[FileResult]:
+    """
+    Replace every match of a replace command (eg. "foo/bar/i") in every
+    file under root matching the glob pattern, skipping directories named
+    in ignore (like .git). The a and b flags make no difference here since
+    every match is always replaced.
+
+    Only files with matches or errors are included in the result.
+    """
+    command = _parse_command(cmd)
+    if command.replace is None:
+        raise ValueError(f'Not a replace command: {cmd!r}')
+    return _run(_iter_files(Path(root), pattern, frozenset(ignore)), command,
+                max_workers, max_previews, False)
@@ -0,0 +1,115 @@
+"""
+The search and replace syntax shared by the editor's Searcher and the
+project-wide search. Nothing in here depends on Qt.
+"""
+import enum
+import functools
+import re
+from typing import FrozenSet, Iterator, Match, Optional, Pattern, Set
+
+from .lazy import LazyPattern
+
+# Flags
+_FLAG_BACKWARDS = 'b'
+_FLAG_CASE_INSENSITIVE = 'i'
+_FLAG_WHOLE_WORDS = 'w'
+_FLAG_COUNT = '#'
+_FLAG_REPLACE_ALL = 'a'
+_FLAG_REGEX = 'r'
+
+_SEARCH_FLAGS = ''.join([
+    _FLAG_BACKWARDS,
+    _FLAG_CASE_INSENSITIVE,
+    _FLAG_WHOLE_WORDS,
+    _FLAG_COUNT,
+    _FLAG_REGEX,
+])
+
+_REPLACE_FLAGS = ''.join([
+    _FLAG_BACKWARDS,
+    _FLAG_CASE_INSENSITIVE,
+    _FLAG_WHOLE_WORDS,
+    _FLAG_REPLACE_ALL,
+    _FLAG_REGEX,
+])
+
+
+# Regexes
+_SEARCH_PAYLOAD = r'(?:\\/|[^/])'
+_search_rx = LazyPattern(fr'{_SEARCH_PAYLOAD}+')
+# What QTextDocument.find considers a word: a run of letters and numbers
+_word_rx = LazyPattern(r'[^\W_]+')
+_search_flags_rx = LazyPattern(fr"""
+    (?P<search>{_SEARCH_PAYLOAD}*?[^\\])
+    /
+    (?P<flags>[{_SEARCH_FLAGS}]*)
+""", re.VERBOSE)
+_replace_rx = LazyPattern(fr"""
+    (?P<search>{_SEARCH_PAYLOAD}*?[^\\])
+    /
+    (?P<replace>({_SEARCH_PAYLOAD}*?[^\\])?)
+    /
+    (?P<flags>[{_REPLACE_FLAGS}]*)
+""", re.VERBOSE)
+
+
+class SearchFlags(enum.Enum):
+    backwards = enum.auto()
+    case_insensitive = enum.auto()
+    whole_words = enum.auto()
+    regex = enum.auto()
+
+
+def _parse_flags(flag_str: str) -> Set[SearchFlags]:
+    out = set()
+    if _FLAG_BACKWARDS in flag_str:
+        out.add(SearchFlags.backwards)
+    if _FLAG_CASE_INSENSITIVE in flag_str:
+        out.add(SearchFlags.case_insensitive)
+    if _FLAG_WHOLE_WORDS in flag_str:
+        out.add(SearchFlags.whole_words)
+    if _FLAG_REGEX in flag_str:
+        out.add(SearchFlags.regex)
+    return out
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_search_rx(text: str, flags: FrozenSet[SearchFlags]) -> Pattern[str]:
+    """
+    Return a regex that matches text the same way QTextDocument.find does.
+
+    QTextDocument.find only treats letters and numbers as part of a word,
+    so underscores count as word boundaries too.
+
+    With the regex flag, text is used as a regex where ^ and $ match at
+    the start and end of every line. Invalid regexes raise re.error.
+    """
+    re_flags = (re.IGNORECASE if SearchFlags.case_insensitive in flags else 0) | re.MULTILINE
+    if SearchFlags.regex in flags:
+        # Compiled on its own first so the positions in any errors match
+        # what the user typed
+        raw_rx = re.compile(text, re_flags)
+        if SearchFlags.whole_words not in flags:
+            return raw_rx
+        rx = f'(?:{text})'
+    else:
+        rx = re.escape(text)
+    if SearchFlags.whole_words in flags:
+        rx = fr'(?<![^\W_]){rx}(?![^\W_])'
+    return re.compile(rx, re_flags)
+
+
+def _iter_matches(rx: Pattern[str], text: str, pos: int = 0,
+                  endpos: Optional[int] = None) -> Iterator[Match[str]]:
+    """Like rx.finditer, but without empty matches since they can't be selected."""
+    matches = rx.finditer(text, pos, len(text) if endpos is None else endpos)
+    return (m for m in matches if m.end() > m.start())
+
+
+def _expand_replacement(match: Match[str], template: str) -> str:
+    """
+    Return the replacement for a regex match, where template can refer to
+    capture groups like re.sub does (\\1, \\g<name>, etc).
+    """
+    # Slashes have to be escaped in the command, but not in the template
+    return match.expand(template.replace('\\/', '/'))
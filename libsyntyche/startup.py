@@ -0,0 +1,143 @@
+"""
+A profiler for how long an app takes to start.
+
+Set the LIBSYNTYCHE_PROFILE_STARTUP environment variable to profile
+everything imported after libsyntyche itself, plus the steps in run_app
+up to the first time the main window is painted. The report is printed
+to stderr after that first paint.
+
+To include the imports before libsyntyche, import libsyntyche first
+thing in the app's main script.
+"""
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class ImportTiming(NamedTuple):
+    name: str
+    # Seconds spent importing the module, not counting (or counting) the
+    # modules it imported in turn
+    self_time: float
+    cumulative: float
+
+
+class _TimingLoader(Loader):
+    """Wraps a module's loader to time creating and executing the module."""
+    def __init__(self, profiler: 'StartupProfiler', loader: Loader, name: str) -> None:
+        self._profiler = profiler
+        self._loader = loader
+        self._name = name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec: ModuleSpec) -> Optional[ModuleType]:
+        # Extension modules do most of their work here
+        with self._profiler._timing(self._name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        with self._profiler._timing(self._name):
+            self._loader.exec_module(module)
+
+
+class _TimingFinder(MetaPathFinder):
+    def __init__(self, profiler: 'StartupProfiler') -> None:
+        self._profiler = profiler
+
+    def find_spec(self, fullname: str, path: Optional[Sequence[str]],
+                  target: Optional[ModuleType] = None) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec: Optional[ModuleSpec] = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(self._profiler, spec.loader, fullname)
+                return spec
+        return None
+
+
+class _Timing:
+    def __init__(self, profiler: 'StartupProfiler', name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._profiler._stack.append(0.0)
+        self._start = time.perf_counter()
+
+    def __exit__(self, *args: Any) -> None:
+        elapsed = time.perf_counter() - self._start
+        stack = self._profiler._stack
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self._profiler._add_import(self._name, elapsed - children, elapsed)
+
+
+class StartupProfiler:
+    """Times imports and any other steps marked with mark()."""
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.imports: List[ImportTiming] = []
+        self.marks: List[Tuple[str, float]] = []
+        self._finder = _TimingFinder(self)
+        # The time spent in the children of every import in progress
+        self._stack: List[float] = []
+
+    def _timing(self, name: str) -> _Timing:
+        return _Timing(self, name)
+
+    def _add_import(self, name: str, self_time: float, cumulative: float) -> None:
+        # create_module and exec_module are timed separately
+        if self.imports and self.imports[-1].name == name:
+            last = self.imports.pop()
+            self_time += last.self_time
+            cumulative += last.cumulative
+        self.imports.append(ImportTiming(name, self_time, cumulative))
+
+    def install(self) -> None:
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self) -> None:
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def mark(self, label: str) -> None:
+        """Note that a step is done, timed from when the profiler was created."""
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def report(self, top: int = 15) -> str:
+        lines = ['Startup profile', '  Steps:']
+        lines.extend(f'    {seconds * 1000:9.1f} ms  {label}' for label, seconds in self.marks)
+        total = sum(timing.self_time for timing in self.imports)
+        lines.append(f'  Imports: {len(self.imports)} modules, {total * 1000:.1f} ms')
+        lines.append(f'    {"self":>9}     {"cumulative":>10}')
+        for timing in sorted(self.imports, key=lambda t: t.self_time, reverse=True)[:top]:
+            lines.append(f'    {timing.self_time * 1000:9.1f} ms  '
+                         f'{timing.cumulative * 1000:9.1f} ms  {timing.name}')
+        return '\n'.join(lines)
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def enable_startup_profiling() -> StartupProfiler:
+    """Start profiling imports, if that isn't already being done."""
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+        _profiler.install()
+    return _profiler
+
+
+def startup_profiler() -> Optional[StartupProfiler]:
+    """Return the running startup profiler, if there is one."""
+    return _profiler
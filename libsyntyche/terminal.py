@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, Optional, cast
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, cast
 
 from PyQt5.QtCore import (QEasingCurve, QEvent, QObject, QPoint,
                           QPropertyAnimation, Qt, QTimer)
@@ -54,6 +54,7 @@ class Terminal(QFrame):
         )
         self.add_command = self.cli.add_command
         self.add_autocompletion_pattern = self.cli.add_autocompletion_pattern
+        self.invalidate_suggestions = self.cli.invalidate_suggestions
         self.print_ = self.cli.print_
         self.error = self.cli.error
         self.prompt = self.cli.prompt
@@ -247,16 +248,28 @@ class LogHistory(QListWidget):
     def add_input(self, text: str) -> None:
         self._add_to_log(MessageType.INPUT, text)
 
+    def add_many(self, messages: Iterable[Tuple[datetime, MessageType, str]]) -> None:
+        """Add a batch of messages with a single update of the list."""
+        rows = []
+        for timestamp, type_, message in messages:
+            self.show_message.emit(timestamp, type_, message)
+            rows.append(_log_row(timestamp, type_, message))
+        self.addItems(rows)
+
     def _add_to_log(self, type_: MessageType, message: str) -> None:
         timestamp = datetime.now()
         self.show_message.emit(timestamp, type_, message)
-        if type_ == MessageType.ERROR:
-            message = '< [ERROR] ' + message
-        elif type_ == MessageType.INPUT:
-            message = '> ' + message
-        else:
-            message = '< ' + message
-        self.addItem(f'{timestamp.strftime("%H:%M:%S")} - {message}')
+        self.addItem(_log_row(timestamp, type_, message))
+
+
+def _log_row(timestamp: datetime, type_: MessageType, message: str) -> str:
+    if type_ == MessageType.ERROR:
+        message = '< [ERROR] ' + message
+    elif type_ == MessageType.INPUT:
+        message = '> ' + message
+    else:
+        message = '< ' + message
+    return f'{timestamp.strftime("%H:%M:%S")} - {message}'
 
 
 class HelpView(QLabel):
@@ -1,61 +1,57 @@
-import enum
+import bisect
+import codecs
+import gc
+import itertools
+import mmap
+import os
 import re
+import threading
+import time
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
-from typing import Callable, Optional, Set, Union
-
-from PyQt5 import QtWidgets
-from PyQt5.QtGui import QTextCursor, QTextDocument
-
-# Flags
-_FLAG_BACKWARDS = 'b'
-_FLAG_CASE_INSENSITIVE = 'i'
-_FLAG_WHOLE_WORDS = 'w'
-_FLAG_COUNT = '#'
-_FLAG_REPLACE_ALL = 'a'
-
-_SEARCH_FLAGS = ''.join([
-    _FLAG_BACKWARDS,
-    _FLAG_CASE_INSENSITIVE,
-    _FLAG_WHOLE_WORDS,
-    _FLAG_COUNT,
-])
-
-_REPLACE_FLAGS = ''.join([
-    _FLAG_BACKWARDS,
-    _FLAG_CASE_INSENSITIVE,
-    _FLAG_WHOLE_WORDS,
-    _FLAG_REPLACE_ALL,
-])
-
-
-# Regexes
-_SEARCH_PAYLOAD = r'(?:\\/|[^/])'
-_search_rx = re.compile(fr'{_SEARCH_PAYLOAD}+')
-_search_flags_rx = re.compile(fr"""
-    (?P<search>{_SEARCH_PAYLOAD}*?[^\\])
-    /
-    (?P<flags>[{_SEARCH_FLAGS}]*)
-""")
-_replace_rx = re.compile(fr"""
-    (?P<search>{_SEARCH_PAYLOAD}*?[^\\])
-    /
-    (?P<replace>({_SEARCH_PAYLOAD}*?[^\\])?)
-    /
-    (?P<flags>[{_REPLACE_FLAGS}]*)
-""", re.VERBOSE)
+from pathlib import Path
+from typing import (BinaryIO, Callable, Counter as CounterType, Dict, FrozenSet, Iterable,
+                    Iterator, List, Match, NamedTuple, Optional, Pattern, Set,
+                    Tuple, Union, cast)
 
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtGui import (QColor, QTextBlock, QTextCharFormat, QTextCursor,
+                         QTextDocument, QTextFormat)
 
-# State
-class SearchFlags(enum.Enum):
-    backwards = enum.auto()
-    case_insensitive = enum.auto()
-    whole_words = enum.auto()
+from .lazy import LazyPattern
+from .search import (_FLAG_COUNT, _FLAG_REPLACE_ALL, SearchFlags, _compile_search_rx,
+                     _expand_replacement, _iter_matches, _parse_flags, _replace_rx,
+                     _search_flags_rx, _search_rx, _word_rx)
+from .widgets import Signal0, Signal3, mk_signal0, mk_signal1, mk_signal2
+
+# Replace-all rebuilds the text between the first and last match in one go
+# instead of editing every match separately when there is at least one
+# match per this many characters in that span
+_REBUILD_MAX_CHARS_PER_HIT = 40
+
+# Marks the extra selections that belong to the match highlighter
+_HIGHLIGHT_PROPERTY = QTextFormat.UserProperty + 0x5ea
+
+# Escapes for characters (or classes of them) that might be newlines
+_spanning_escape_rx = LazyPattern(r'\\[nsSWDxuUN0-7]')
+# The lookarounds _compile_search_rx adds for whole word searches
+_WHOLE_WORD_LOOKAROUNDS = (r'(?<![^\W_])', r'(?![^\W_])')
 
 
+# State
 @dataclass
 class SearchState:
     text: str
     flags: Set[SearchFlags] = field(default_factory=set)
+    # The sorted start and end positions of every match, valid for
+    # _revision of _document
+    _starts: List[int] = field(default_factory=list, init=False, repr=False,
+                               compare=False)
+    _ends: List[int] = field(default_factory=list, init=False, repr=False,
+                             compare=False)
+    _document: Optional[QTextDocument] = field(default=None, init=False, repr=False,
+                                               compare=False)
+    _revision: int = field(default=-1, init=False, repr=False, compare=False)
 
     def find(self, editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
              override_flags: Optional[Set[SearchFlags]] = None) -> bool:
@@ -63,16 +59,900 @@ class SearchState:
                            _encode_flags(override_flags if override_flags is not None
                                          else self.flags))
 
+    def _rx(self) -> Pattern[str]:
+        return _compile_search_rx(self.text, frozenset(self.flags - {SearchFlags.backwards}))
+
+    def has_matches(self, document: QTextDocument) -> bool:
+        """Return whether the match positions are up to date with document."""
+        return self._document is document and self._revision == document.revision()
+
+    def update_matches(self, document: QTextDocument, text: str) -> None:
+        """Find every match in text, the document's current plain text."""
+        self._starts = []
+        self._ends = []
+        for match in _iter_matches(self._rx(), text):
+            self._starts.append(match.start())
+            self._ends.append(match.end())
+        self._document = document
+        self._revision = document.revision()
+
+    def next_match(self, pos: int, backwards: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Return the first match starting at or after pos (or when going
+        backwards, the last one starting before pos), wrapping around if
+        needed.
+        """
+        if not self._starts:
+            return None
+        index = bisect.bisect_left(self._starts, pos)
+        if backwards:
+            index -= 1
+        index %= len(self._starts)
+        return self._starts[index], self._ends[index]
+
+    def patch_matches(self, document: QTextDocument, position: int,
+                      chars_removed: int, chars_added: int) -> None:
+        """
+        Update the match positions after an edit in the document.
+
+        Only the edited blocks are searched again. Matches after them are
+        moved. Regex matches can span blocks, so regex searches are
+        invalidated instead.
+        """
+        if self._document is not document:
+            return
+        first_block = document.findBlock(position)
+        last_block = document.findBlock(position + chars_added)
+        if SearchFlags.regex in self.flags or '\n' in self.text \
+                or not first_block.isValid() or not last_block.isValid():
+            self._document = None
+            return
+        delta = chars_added - chars_removed
+        region_start = first_block.position()
+        region_end = last_block.position() + last_block.length()
+        low = bisect.bisect_left(self._starts, region_start)
+        high = bisect.bisect_left(self._starts, region_end - delta)
+        new_starts = []
+        new_ends = []
+        rx = self._rx()
+        for block in _iter_blocks(first_block, last_block.blockNumber()
+                                  - first_block.blockNumber() + 1):
+            block_pos = block.position()
+            # Treat non-breaking spaces like find does
+            for match in _iter_matches(rx, block.text().replace('\xa0', ' ')):
+                new_starts.append(block_pos + match.start())
+                new_ends.append(block_pos + match.end())
+        if delta:
+            self._starts[high:] = [x + delta for x in self._starts[high:]]
+            self._ends[high:] = [x + delta for x in self._ends[high:]]
+        self._starts[low:high] = new_starts
+        self._ends[low:high] = new_ends
+        self._revision = document.revision()
+
+
+def _may_span_lines(rx: Pattern[str]) -> bool:
+    """
+    Return whether a match of rx might include a newline. This errs on the
+    side of True, eg. for negated character sets.
+    """
+    pattern = rx.pattern
+    for lookaround in _WHOLE_WORD_LOOKAROUNDS:
+        pattern = pattern.replace(lookaround, '')
+    return bool('\n' in pattern or '[^' in pattern or '(?s' in pattern
+                or rx.flags & re.DOTALL or _spanning_escape_rx.search(pattern))
+
+
+class _DocumentSnapshot:
+    """
+    A plain text copy of an editor's document.
+
+    The copy (and everything cached alongside it) is only refreshed when
+    the document's revision changes.
+    """
+    def __init__(self, editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit]
+                 ) -> None:
+        self._editor = editor
+        self._document: Optional[QTextDocument] = None
+        self._revision = -1
+        self._text = ''
+        self._block_starts: Optional[List[int]] = None
+        self.counts: Dict[Tuple[str, FrozenSet[SearchFlags]], int] = {}
+
+    def refresh(self) -> None:
+        document = self._editor.document()
+        if document is not self._document or document.revision() != self._revision:
+            self._document = document
+            self._revision = document.revision()
+            # toPlainText turns paragraph separators into newlines and
+            # non-breaking spaces into spaces, just like find does, so
+            # positions in the snapshot match document positions
+            self._text = document.toPlainText()
+            self._block_starts = None
+            self.counts.clear()
+
+    @property
+    def text(self) -> str:
+        self.refresh()
+        return self._text
 
-def _parse_flags(flag_str: str) -> Set[SearchFlags]:
-    out = set()
-    if _FLAG_BACKWARDS in flag_str:
-        out.add(SearchFlags.backwards)
-    if _FLAG_CASE_INSENSITIVE in flag_str:
-        out.add(SearchFlags.case_insensitive)
-    if _FLAG_WHOLE_WORDS in flag_str:
-        out.add(SearchFlags.whole_words)
-    return out
+    @property
+    def revision(self) -> int:
+        """The revision of the document the snapshot was taken of."""
+        self.refresh()
+        return self._revision
+
+    @property
+    def block_starts(self) -> List[int]:
+        """The position where each block (line) starts."""
+        self.refresh()
+        if self._block_starts is None:
+            self._block_starts = [0]
+            self._block_starts.extend(m.end() for m in re.finditer('\n', self._text))
+        return self._block_starts
+
+    def count(self, target: str, flags: FrozenSet[SearchFlags]) -> int:
+        self.refresh()
+        key = (target, flags)
+        if key not in self.counts:
+            rx = _compile_search_rx(target, flags)
+            self.counts[key] = sum(1 for _ in _iter_matches(rx, self._text))
+        return self.counts[key]
+
+    def find(self, rx: Pattern[str], pos: int, backwards: bool = False
+             ) -> Optional[Match[str]]:
+        """
+        Return the first match starting at or after pos, or if searching
+        backwards, the last match starting before pos.
+        """
+        text = self.text
+        if not backwards:
+            return next(_iter_matches(rx, text, pos), None)
+        if _may_span_lines(rx):
+            # The windows below would cut off matches at their ends
+            last_match = None
+            for match in _iter_matches(rx, text):
+                if match.start() >= pos:
+                    break
+                last_match = match
+            return last_match
+        # Search backwards in windows of whole blocks that double in size
+        # every time nothing is found, so only the end of a large document
+        # is scanned when the match is close to pos
+        block_starts = self.block_starts
+        block = bisect.bisect_right(block_starts, pos) - 1
+        endpos = block_starts[block + 1] if block + 1 < len(block_starts) else len(text)
+        size = 1
+        while True:
+            first_block = max(0, block - size + 1)
+            last_match = None
+            for match in _iter_matches(rx, text, block_starts[first_block], endpos):
+                if match.start() >= pos:
+                    break
+                last_match = match
+            if last_match is not None or first_block == 0:
+                return last_match
+            endpos = block_starts[first_block]
+            block = first_block - 1
+            size *= 2
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _fold_counts(counts: CounterType[str]) -> CounterType[str]:
+    folded: CounterType[str] = Counter()
+    for word, count in counts.items():
+        folded[word.lower()] += count
+    return folded
+
+
+class _WordCounter:
+    """
+    Counts the words in snapshots of a document. Words never span lines,
+    so after an edit only the lines between the unchanged start and end of
+    the text are counted again.
+    """
+    def __init__(self) -> None:
+        self._text = ''
+        self._counts: CounterType[str] = Counter()
+
+    def counts(self, text: str) -> CounterType[str]:
+        """Return how many times each word is used in text. Don't modify it."""
+        old_text = self._text
+        if text is old_text:
+            return self._counts
+        prefix = _common_prefix_length(old_text, text)
+        suffix = _common_prefix_length(old_text[prefix:][::-1], text[prefix:][::-1])
+        start = old_text.rfind('\n', 0, prefix) + 1
+        old_end = old_text.find('\n', len(old_text) - suffix)
+        old_end = len(old_text) if old_end == -1 else old_end
+        new_end = len(text) - (len(old_text) - old_end)
+        counts = self._counts
+        removed = Counter(_word_rx.findall(old_text[start:old_end]))
+        counts.subtract(removed)
+        counts.update(_word_rx.findall(text[start:new_end]))
+        for word in removed:
+            if counts[word] <= 0:
+                del counts[word]
+        self._text = text
+        return counts
+
+
+@dataclass(eq=False)
+class _IndexedBlock:
+    # The block's handle stays valid while other blocks are added and removed,
+    # so unlike a block number it doesn't have to be updated after edits
+    text_block: QTextBlock
+    # How many times each word is used in the block
+    words: Dict[str, int]
+    # Lowercase character trigrams in the block
+    trigrams: FrozenSet[str]
+
+
+class DocumentIndex(QtCore.QObject):
+    """
+    An index of the words (and optionally the character trigrams) in a
+    document.
+
+    The index is kept up to date through QTextDocument.contentsChange by
+    re-tokenising only the edited blocks.
+    """
+    def __init__(self, document: QTextDocument, trigrams: bool = False) -> None:
+        super().__init__(document)
+        self.document = document
+        self.trigrams = trigrams
+        self._blocks: List[_IndexedBlock] = []
+        self._counts: CounterType[str] = Counter()
+        self._word_blocks: Dict[str, Set[_IndexedBlock]] = {}
+        # Lowercase word -> the words that lowercase to it
+        self._folded_words: Dict[str, Set[str]] = {}
+        self._trigram_blocks: Dict[str, Set[_IndexedBlock]] = {}
+        # contentsChange is only emitted by documents that have a layout
+        document.documentLayout()
+        cast(Signal3[int, int, int], document.contentsChange).connect(self._on_contents_change)
+        self._rebuild()
+
+    def close(self) -> None:
+        """Stop following the document's changes."""
+        self.document.contentsChange.disconnect(self._on_contents_change)
+
+    def _index_block(self, text_block: QTextBlock, text: str) -> _IndexedBlock:
+        words: Dict[str, int] = {}
+        for word in _word_rx.findall(text):
+            words[word] = words.get(word, 0) + 1
+        if self.trigrams:
+            lower_text = text.lower()
+            trigrams = frozenset(map(''.join, zip(lower_text, lower_text[1:],
+                                                  lower_text[2:])))
+        else:
+            trigrams = frozenset()
+        block = _IndexedBlock(text_block, words, trigrams)
+        counts = self._counts
+        word_blocks = self._word_blocks
+        for word, count in words.items():
+            if word in counts:
+                counts[word] += count
+                word_blocks[word].add(block)
+            else:
+                counts[word] = count
+                word_blocks[word] = {block}
+                self._folded_words.setdefault(word.lower(), set()).add(word)
+        trigram_blocks = self._trigram_blocks
+        for trigram in trigrams:
+            if trigram in trigram_blocks:
+                trigram_blocks[trigram].add(block)
+            else:
+                trigram_blocks[trigram] = {block}
+        return block
+
+    def _forget_block(self, block: _IndexedBlock) -> None:
+        for word, count in block.words.items():
+            self._counts[word] -= count
+            self._word_blocks[word].discard(block)
+            if not self._counts[word]:
+                del self._counts[word]
+                del self._word_blocks[word]
+                folded = word.lower()
+                self._folded_words[folded].discard(word)
+                if not self._folded_words[folded]:
+                    del self._folded_words[folded]
+        for trigram in block.trigrams:
+            self._trigram_blocks[trigram].discard(block)
+            if not self._trigram_blocks[trigram]:
+                del self._trigram_blocks[trigram]
+
+    def _rebuild(self) -> None:
+        self._blocks.clear()
+        self._counts.clear()
+        self._word_blocks.clear()
+        self._folded_words.clear()
+        self._trigram_blocks.clear()
+        text_blocks = list(_iter_blocks(self.document.begin()))
+        lines = self.document.toPlainText().split('\n')
+        if len(lines) != len(text_blocks):
+            # Line separators inside blocks (in rich text) also become
+            # newlines in the plain text, so go through the blocks instead
+            lines = [block.text() for block in text_blocks]
+        # The index is a lot of small objects, so keep the garbage collector
+        # from repeatedly scanning them while they're being created
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._blocks = [self._index_block(block, text)
+                            for block, text in zip(text_blocks, lines)]
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _on_contents_change(self, position: int, chars_removed: int,
+                            chars_added: int) -> None:
+        first = self.document.findBlock(position).blockNumber()
+        last = self.document.findBlock(position + chars_added).blockNumber()
+        new_count = last - first + 1
+        old_count = new_count - (self.document.blockCount() - len(self._blocks))
+        if first < 0 or last < 0 or old_count < 1 or first + old_count > len(self._blocks):
+            self._rebuild()
+            return
+        for block in self._blocks[first:first + old_count]:
+            self._forget_block(block)
+        self._blocks[first:first + old_count] = [
+            self._index_block(block, block.text())
+            for block in _iter_blocks(self.document.findBlockByNumber(first), new_count)
+        ]
+
+    def word_counts(self, case_insensitive: bool = True) -> CounterType[str]:
+        """Return how many times each word is used in the document."""
+        if not case_insensitive:
+            return Counter(self._counts)
+        return Counter({folded: sum(self._counts[word] for word in words)
+                        for folded, words in self._folded_words.items()})
+
+    def _matching_words(self, word: str, case_insensitive: bool) -> Set[str]:
+        if case_insensitive:
+            return self._folded_words.get(word.lower(), set())
+        return {word} if word in self._counts else set()
+
+    def count(self, text: str, flags: FrozenSet[SearchFlags]) -> Optional[int]:
+        """
+        Return how many times text is found with the specified flags, or
+        None if the index can't answer that.
+        """
+        if SearchFlags.whole_words in flags and SearchFlags.regex not in flags \
+                and _word_rx.fullmatch(text):
+            words = self._matching_words(text, SearchFlags.case_insensitive in flags)
+            return sum(self._counts[word] for word in words)
+        ranges = self.find_all(text, flags)
+        return None if ranges is None else len(ranges)
+
+    def can_answer(self, text: str, flags: FrozenSet[SearchFlags]) -> bool:
+        """
+        Return whether find_all and find_next can look up text with the
+        specified flags.
+
+        Whole word searches for a single word only look at the blocks that
+        contain the word. Other searches for three or more characters only
+        look at the blocks that contain all of the text's trigrams, if
+        trigrams are enabled. Regex searches are never answered.
+        """
+        if SearchFlags.regex in flags or '\n' in text:
+            return False
+        if SearchFlags.whole_words in flags and _word_rx.fullmatch(text):
+            return True
+        return self.trigrams and len(text) >= 3
+
+    def _candidate_blocks(self, text: str, flags: FrozenSet[SearchFlags]
+                          ) -> Set[_IndexedBlock]:
+        if SearchFlags.whole_words in flags and _word_rx.fullmatch(text):
+            words = self._matching_words(text, SearchFlags.case_insensitive in flags)
+            if len(words) == 1:
+                # No need to copy the set, it's only read
+                return self._word_blocks[next(iter(words))]
+            return {block for word in words for block in self._word_blocks[word]}
+        lower_text = text.lower()
+        candidates: Optional[Set[_IndexedBlock]] = None
+        for i in range(len(lower_text) - 2):
+            trigram_blocks = self._trigram_blocks.get(lower_text[i:i+3], set())
+            candidates = trigram_blocks if candidates is None else candidates & trigram_blocks
+            if not candidates:
+                break
+        return candidates or set()
+
+    def _block_matches(self, rx: Pattern[str], block: _IndexedBlock
+                       ) -> List[Tuple[int, int]]:
+        text_block = block.text_block
+        block_pos = text_block.position()
+        # Treat non-breaking spaces like find does
+        block_text = text_block.text().replace('\xa0', ' ')
+        return [(block_pos + m.start(), block_pos + m.end())
+                for m in _iter_matches(rx, block_text)]
+
+    def find_all(self, text: str, flags: FrozenSet[SearchFlags]
+                 ) -> Optional[List[Tuple[int, int]]]:
+        """
+        Return the sorted (start, end) positions of every match of text, or
+        None if the index can't answer that.
+        """
+        if not self.can_answer(text, flags):
+            return None
+        rx = _compile_search_rx(text, flags)
+        ranges = []
+        for block in sorted(self._candidate_blocks(text, flags),
+                            key=lambda b: b.text_block.position()):
+            ranges.extend(self._block_matches(rx, block))
+        return ranges
+
+    def find_next(self, text: str, flags: FrozenSet[SearchFlags], pos: int,
+                  backwards: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Return the first match starting at or after pos (or when going
+        backwards, the last one starting before pos), wrapping around the
+        document if needed.
+
+        Only use this if can_answer returns True.
+        """
+        candidates = self._candidate_blocks(text, flags)
+        if not candidates:
+            return None
+        rx = _compile_search_rx(text, flags)
+        start_block = max(0, self.document.findBlock(pos).blockNumber())
+        if backwards:
+            passes = [(range(start_block, -1, -1), pos),
+                      (range(len(self._blocks) - 1, start_block - 1, -1), None)]
+        else:
+            passes = [(range(start_block, len(self._blocks)), pos),
+                      (range(0, start_block + 1), None)]
+        for block_numbers, limit in passes:
+            for n in block_numbers:
+                block = self._blocks[n]
+                if block not in candidates:
+                    continue
+                matches = self._block_matches(rx, block)
+                if limit is not None:
+                    matches = [m for m in matches
+                               if (m[0] < limit if backwards else m[0] >= limit)]
+                if matches:
+                    return matches[-1] if backwards else matches[0]
+        return None
+
+
+def _iter_blocks(block: QTextBlock, count: Optional[int] = None) -> Iterable[QTextBlock]:
+    """Yield block and the ones after it, up to count blocks in total."""
+    while block.isValid() and (count is None or count > 0):
+        yield block
+        block = block.next()
+        if count is not None:
+            count -= 1
+
+
+def _select_span(editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
+                 start: int, end: int) -> None:
+    cursor = editor.textCursor()
+    cursor.setPosition(start)
+    cursor.setPosition(end, QTextCursor.KeepAnchor)
+    editor.setTextCursor(cursor)
+
+
+class _MatchHighlighter(QtCore.QObject):
+    """
+    Highlights all matches of a search in the visible part of an editor.
+
+    Only the blocks in the viewport (plus a margin around it) are searched,
+    and only when the editor is scrolled, resized or edited, so the cost
+    doesn't depend on the size of the document. Matches can't span several
+    blocks.
+    """
+    def __init__(self, editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
+                 margin: int = 50) -> None:
+        super().__init__(editor)
+        self._editor = editor
+        self._state: Optional[SearchState] = None
+        self._enabled = False
+        self.margin = margin
+        self.format = QTextCharFormat()
+        self.format.setBackground(QColor('#ffe27a'))
+        self.format.setProperty(_HIGHLIGHT_PROPERTY, True)
+        # Block text -> match spans in that block
+        self._block_cache: 'OrderedDict[str, List[Tuple[int, int]]]' = OrderedDict()
+        self._block_cache_size = 4 * margin
+        # The blocks and document revision that are highlighted right now
+        self._last_range: Optional[Tuple[int, int, int]] = None
+        self._needs_reset = False
+        self._update_timer = QtCore.QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        cast(Signal0, self._update_timer.timeout).connect(self._update)
+        cast(Signal0, editor.verticalScrollBar().valueChanged).connect(self._schedule_update)
+        cast(Signal0, editor.textChanged).connect(self._schedule_update)
+        editor.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.Resize:
+            self._schedule_update()
+        return False
+
+    def set_enabled(self, enabled: bool) -> None:
+        self._enabled = enabled
+        self._reset()
+
+    def set_state(self, state: Optional[SearchState]) -> None:
+        self._state = state
+        self._reset()
+
+    def _reset(self) -> None:
+        self._block_cache.clear()
+        self._needs_reset = True
+        self._update_timer.start()
+
+    def _schedule_update(self) -> None:
+        if self._enabled:
+            self._update_timer.start()
+
+    def _visible_blocks(self) -> Iterator[QTextBlock]:
+        viewport = self._editor.viewport()
+        block = self._editor.cursorForPosition(QtCore.QPoint(0, 0)).block()
+        last = self._editor.cursorForPosition(
+            QtCore.QPoint(viewport.width() - 1, viewport.height() - 1)).block()
+        for _ in range(self.margin):
+            if not block.previous().isValid():
+                break
+            block = block.previous()
+        for _ in range(self.margin):
+            if not last.next().isValid():
+                break
+            last = last.next()
+        end = last.blockNumber()
+        while block.isValid() and block.blockNumber() <= end:
+            yield block
+            block = block.next()
+
+    def _block_matches(self, rx: Pattern[str], text: str) -> List[Tuple[int, int]]:
+        if text in self._block_cache:
+            self._block_cache.move_to_end(text)
+            return self._block_cache[text]
+        # Treat non-breaking spaces like find does
+        spans = [m.span() for m in _iter_matches(rx, text.replace('\xa0', ' '))]
+        self._block_cache[text] = spans
+        if len(self._block_cache) > self._block_cache_size:
+            self._block_cache.popitem(last=False)
+        return spans
+
+    def _update(self) -> None:
+        selections = [sel for sel in self._editor.extraSelections()
+                      if not sel.format.hasProperty(_HIGHLIGHT_PROPERTY)]
+        rx: Optional[Pattern[str]] = None
+        if self._enabled and self._state is not None:
+            try:
+                rx = _compile_search_rx(self._state.text,
+                                        frozenset(self._state.flags - {SearchFlags.backwards}))
+            except re.error:
+                pass
+        if rx is None:
+            if self._last_range is not None:
+                self._last_range = None
+                self._editor.setExtraSelections(selections)
+            return
+        blocks = list(self._visible_blocks())
+        if not blocks:
+            return
+        document = self._editor.document()
+        visible_range = (blocks[0].blockNumber(), blocks[-1].blockNumber(),
+                         document.revision())
+        if visible_range == self._last_range and not self._needs_reset:
+            return
+        self._last_range = visible_range
+        self._needs_reset = False
+        for block in blocks:
+            block_pos = block.position()
+            for start, end in self._block_matches(rx, block.text()):
+                selection = QtWidgets.QTextEdit.ExtraSelection()
+                cursor = QTextCursor(document)
+                cursor.setPosition(block_pos + start)
+                cursor.setPosition(block_pos + end, QTextCursor.KeepAnchor)
+                selection.cursor = cursor
+                selection.format = self.format
+                selections.append(selection)
+        self._editor.setExtraSelections(selections)
+
+
+def _forward_chunks(text: str, start: int, end: int, size: int
+                    ) -> Iterator[Tuple[int, int]]:
+    """Split text[start:end] into chunks of about size characters of whole lines."""
+    while start < end:
+        line_end = text.find('\n', start + size, end) if start + size < end else -1
+        chunk_end = end if line_end == -1 else line_end + 1
+        yield start, chunk_end
+        start = chunk_end
+
+
+def _backward_chunks(text: str, start: int, end: int, size: int
+                     ) -> Iterator[Tuple[int, int]]:
+    """Like _forward_chunks, but from the end of the text to the start."""
+    while start < end:
+        line_end = text.rfind('\n', start, end - size) if end - size > start else -1
+        chunk_start = start if line_end == -1 else line_end + 1
+        yield chunk_start, end
+        end = chunk_start
+
+
+class BackgroundSearch(QtCore.QObject):
+    """
+    Searches a plain text snapshot of a document in a worker thread.
+
+    The snapshot is scanned in chunks of whole lines (so matches can't span
+    chunks) and the matches in each chunk are sent to the GUI thread through
+    hits_found as soon as they're found. finished is emitted with the total
+    number of matches at the end. Starting a new search cancels the running
+    one, and nothing from a cancelled search is ever emitted.
+
+    Since re doesn't release the GIL, the worker yields it between chunks to
+    keep the GUI responsive.
+    """
+    hits_found = mk_signal1(list)
+    finished = mk_signal1(int)
+    # Sent from the worker thread, tagged with the search's id
+    _chunk_done = mk_signal2(int, list)
+    _search_done = mk_signal2(int, int)
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None,
+                 chunk_size: int = 256 * 1024) -> None:
+        super().__init__(parent)
+        self.chunk_size = chunk_size
+        self.revision = -1
+        self._search_id = 0
+        self._cancelled = threading.Event()
+        self._chunk_done.connect(self._on_chunk_done)
+        self._search_done.connect(self._on_search_done)
+
+    @property
+    def is_running(self) -> bool:
+        return not self._cancelled.is_set()
+
+    def start(self, text: str, revision: int, rx: Pattern[str], pos: int = 0,
+              backwards: bool = False, first_only: bool = False) -> None:
+        """
+        Start searching text (a snapshot of the document at revision).
+
+        If first_only is True, stop at the first match after pos (or before
+        it if going backwards), wrapping around if needed. Otherwise find
+        every match in the text, from the start to the end.
+        """
+        self.cancel()
+        self._search_id += 1
+        self._cancelled = threading.Event()
+        self.revision = revision
+        threading.Thread(target=self._run, daemon=True,
+                         args=(self._search_id, self._cancelled, text, rx, pos,
+                               backwards, first_only)).start()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def _run(self, search_id: int, cancelled: threading.Event, text: str,
+             rx: Pattern[str], pos: int, backwards: bool, first_only: bool) -> None:
+        if not first_only:
+            chunks = _forward_chunks(text, 0, len(text), self.chunk_size)
+        elif backwards:
+            chunks = itertools.chain(_backward_chunks(text, 0, pos, self.chunk_size),
+                                     _backward_chunks(text, pos, len(text), self.chunk_size))
+        else:
+            chunks = itertools.chain(_forward_chunks(text, pos, len(text), self.chunk_size),
+                                     _forward_chunks(text, 0, pos, self.chunk_size))
+        total = 0
+        for start, end in chunks:
+            if cancelled.is_set():
+                return
+            spans = [m.span() for m in _iter_matches(rx, text, start, end)]
+            if spans and first_only:
+                self._chunk_done.emit(search_id, [spans[-1] if backwards else spans[0]])
+                total = 1
+                break
+            if spans:
+                self._chunk_done.emit(search_id, spans)
+                total += len(spans)
+            # Give the GUI thread a chance to run
+            time.sleep(0)
+        if not cancelled.is_set():
+            self._search_done.emit(search_id, total)
+
+    def _on_chunk_done(self, search_id: int, spans: List[Tuple[int, int]]) -> None:
+        if search_id == self._search_id and self.is_running:
+            self.hits_found.emit(spans)
+
+    def _on_search_done(self, search_id: int, total: int) -> None:
+        if search_id == self._search_id and self.is_running:
+            self._cancelled.set()
+            self.finished.emit(total)
+
+
+class DocumentLoader(QtCore.QObject):
+    """
+    Loads a UTF-8 file into an editor one chunk per event loop turn.
+
+    The file is memory-mapped and decoded incrementally, so the whole file
+    is never held in memory as one string, and the UI stays responsive
+    while loading. Line endings are turned into \\n like Path.read_text
+    does.
+
+    The editor is read-only and isn't repainted while loading, and the
+    document's undo stack is turned off. progress is emitted with the
+    number of bytes read and the file size after every chunk and finished
+    is emitted at the end. If the file can't be read or decoded, loading
+    stops and failed is emitted with an error message.
+    """
+    progress = mk_signal2(int, int)
+    finished = mk_signal0()
+    failed = mk_signal1(str)
+
+    def __init__(self, editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
+                 parent: Optional[QtCore.QObject] = None,
+                 chunk_size: int = 256 * 1024) -> None:
+        super().__init__(parent)
+        self.chunk_size = chunk_size
+        self._editor = editor
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._load_chunk)
+        self._file: Optional[BinaryIO] = None
+        self._data: Optional[mmap.mmap] = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._cursor: Optional[QTextCursor] = None
+        self._pos = 0
+        self._size = 0
+        # A \r at the end of a chunk might be the first half of a \r\n
+        self._pending_cr = False
+        self._undo_enabled = True
+        self._read_only = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._timer.isActive()
+
+    def load(self, path: Union[Path, str]) -> None:
+        """Start replacing the editor's text with the contents of path."""
+        self.cancel()
+        try:
+            self._file = open(path, 'rb')
+            self._size = os.fstat(self._file.fileno()).st_size
+            if self._size:
+                self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            self._close_file()
+            self.failed.emit(f'Could not read {path}: {e.strerror or e}')
+            return
+        self._decoder.reset()
+        self._pos = 0
+        self._pending_cr = False
+        document = self._editor.document()
+        self._undo_enabled = document.isUndoRedoEnabled()
+        self._read_only = self._editor.isReadOnly()
+        document.setUndoRedoEnabled(False)
+        self._editor.setReadOnly(True)
+        self._editor.setUpdatesEnabled(False)
+        self._editor.clear()
+        self._cursor = QTextCursor(document)
+        self._timer.start()
+
+    def cancel(self) -> None:
+        """Stop loading, leaving what has been loaded so far in the editor."""
+        if self.is_running:
+            self._stop()
+
+    def _load_chunk(self) -> None:
+        end = min(self._pos + self.chunk_size, self._size)
+        data = self._data[self._pos:end] if self._data is not None else b''
+        try:
+            text = self._decoder.decode(data, final=end == self._size)
+        except UnicodeDecodeError as e:
+            self._stop()
+            self.failed.emit(f'Not a UTF-8 file: {e}')
+            return
+        self._pos = end
+        if self._pending_cr:
+            text = '\r' + text
+        self._pending_cr = end < self._size and text.endswith('\r')
+        if self._pending_cr:
+            text = text[:-1]
+        if self._cursor is not None:
+            self._cursor.movePosition(QTextCursor.End)
+            self._cursor.insertText(text.replace('\r\n', '\n').replace('\r', '\n'))
+        self.progress.emit(self._pos, self._size)
+        if self._pos == self._size:
+            self._stop()
+            self.finished.emit()
+
+    def _stop(self) -> None:
+        self._timer.stop()
+        self._close_file()
+        self._cursor = None
+        self._editor.document().setUndoRedoEnabled(self._undo_enabled)
+        self._editor.setReadOnly(self._read_only)
+        self._editor.setUpdatesEnabled(True)
+        self._editor.moveCursor(QTextCursor.Start)
+
+    def _close_file(self) -> None:
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _BackgroundTask(NamedTuple):
+    is_count: bool
+    text: str
+    flags: FrozenSet[SearchFlags]
+
+
+def _map_position(pos: int, replacements: List[Tuple[int, int, str]]) -> int:
+    """
+    Return where pos ends up once the replacements have been applied.
+
+    A position inside a replaced range is moved to the start of the
+    replacement.
+    """
+    shift = 0
+    for start, end, new_text in replacements:
+        if end <= pos:
+            shift += len(new_text) - (end - start)
+        elif start < pos:
+            return start + shift
+        else:
+            break
+    return pos + shift
+
+
+def _apply_replacements(editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
+                        replacements: List[Tuple[int, int, str]]) -> None:
+    """
+    Replace the (start, end) ranges in the editor with new text, as a
+    single undo step, and keep the editor's cursor where it was.
+
+    The ranges have to be sorted and non-overlapping.
+    """
+    cursor = editor.textCursor()
+    anchor = _map_position(cursor.anchor(), replacements)
+    position = _map_position(cursor.position(), replacements)
+    first, last = replacements[0][0], replacements[-1][1]
+    edit_cursor = QTextCursor(editor.document())
+    edit_cursor.beginEditBlock()
+    # Rebuilding the text drops character formatting, so only do it when
+    # there isn't any (in QPlainTextEdit, any highlighting lives outside
+    # the document anyway)
+    if isinstance(editor, QtWidgets.QPlainTextEdit) \
+            and (last - first) <= len(replacements) * _REBUILD_MAX_CHARS_PER_HIT:
+        # Unlike toPlainText, the raw text keeps non-breaking spaces, which
+        # would otherwise all turn into spaces between the first and last
+        # match. Its paragraph separators are at the same positions as the
+        # newlines in the plain text
+        text = editor.document().toRawText()
+        chunks = []
+        prev_end = first
+        for start, end, new_text in replacements:
+            chunks.append(text[prev_end:start].replace('\u2029', '\n'))
+            chunks.append(new_text)
+            prev_end = end
+        edit_cursor.setPosition(first)
+        edit_cursor.setPosition(last, QTextCursor.KeepAnchor)
+        edit_cursor.insertText(''.join(chunks))
+    else:
+        # Go backwards so the earlier positions stay valid
+        for start, end, new_text in reversed(replacements):
+            edit_cursor.setPosition(start)
+            edit_cursor.setPosition(end, QTextCursor.KeepAnchor)
+            edit_cursor.insertText(new_text)
+    edit_cursor.endEditBlock()
+    cursor.setPosition(anchor)
+    cursor.setPosition(position, QTextCursor.KeepAnchor)
+    editor.setTextCursor(cursor)
 
 
 def _encode_flags(flags: Set[SearchFlags]) -> QTextDocument.FindFlags:
@@ -89,16 +969,169 @@ def _encode_flags(flags: Set[SearchFlags]) -> QTextDocument.FindFlags:
 class Searcher:
     def __init__(self, editor: Union[QtWidgets.QPlainTextEdit, QtWidgets.QTextEdit],
                  error: Callable[[str], None],
-                 log: Callable[[str], None]) -> None:
+                 log: Callable[[str], None],
+                 highlight_all: bool = False,
+                 background: bool = False) -> None:
         self._editor = editor
-        self._search_state: Optional[SearchState] = None
+        self._highlighter = _MatchHighlighter(editor)
+        self._highlighter.set_enabled(highlight_all)
+        self._state: Optional[SearchState] = None
+        self._snapshot = _DocumentSnapshot(editor)
+        self.index: Optional[DocumentIndex] = None
+        # The last word_frequencies result and what it was based on
+        self._frequencies: Optional[Tuple[Tuple[object, ...],
+                                          List[Tuple[str, int]]]] = None
+        self._word_counter = _WordCounter()
         self.error = error
         self.log = log
+        # Searching and counting in a worker thread
+        self._background: Optional[BackgroundSearch] = None
+        self._background_task: Optional[_BackgroundTask] = None
+        if background:
+            self._background = BackgroundSearch(editor)
+            self._background.hits_found.connect(self._on_background_hits)
+            self._background.finished.connect(self._on_background_finished)
+        cast(Signal3[int, int, int], editor.document().contentsChange).connect(
+            self._on_contents_change)
+
+    def _on_contents_change(self, position: int, chars_removed: int,
+                            chars_added: int) -> None:
+        if self._search_state is not None:
+            self._search_state.patch_matches(self._editor.document(), position,
+                                             chars_removed, chars_added)
+
+    def _start_background_task(self, task: _BackgroundTask) -> None:
+        if self._background is None:
+            return
+        self._background_task = task
+        rx = _compile_search_rx(task.text, frozenset(task.flags - {SearchFlags.backwards}))
+        cursor = self._editor.textCursor()
+        backwards = SearchFlags.backwards in task.flags
+        self._background.start(self._snapshot.text, self._snapshot.revision, rx,
+                               pos=cursor.selectionStart() if backwards
+                               else cursor.selectionEnd(),
+                               backwards=backwards, first_only=not task.is_count)
+
+    def _on_background_hits(self, spans: List[Tuple[int, int]]) -> None:
+        task = self._background_task
+        if task is None or task.is_count or self._background is None:
+            return
+        if self._editor.document().revision() != self._background.revision:
+            # The document has changed since the search started, so the
+            # match might not be there anymore
+            self._start_background_task(task)
+            return
+        _select_span(self._editor, *spans[0])
+
+    def _on_background_finished(self, total: int) -> None:
+        task = self._background_task
+        self._background_task = None
+        if task is None:
+            return
+        if task.is_count:
+            if self._background is not None \
+                    and self._background.revision == self._snapshot.revision:
+                self._snapshot.counts[(task.text, task.flags)] = total
+            self._log_count(task.text, total)
+        elif not total:
+            self.error('Text not found')
+
+    def attach_index(self, trigrams: bool = False) -> DocumentIndex:
+        """
+        Index the words (and optionally trigrams) of the editor's document,
+        so counting and searching doesn't have to scan the whole document.
+
+        The index follows the document's edits until detach_index is called.
+        """
+        self.detach_index()
+        self.index = DocumentIndex(self._editor.document(), trigrams=trigrams)
+        return self.index
+
+    def detach_index(self) -> None:
+        if self.index is not None:
+            self.index.close()
+            self.index.deleteLater()
+            self.index = None
+
+    def _usable_index(self, text: str, flags: FrozenSet[SearchFlags]
+                      ) -> Optional[DocumentIndex]:
+        """Return the index if it belongs to the editor and can look up text."""
+        if self.index is not None and self.index.document is self._editor.document() \
+                and self.index.can_answer(text, flags):
+            return self.index
+        return None
+
+    def word_frequencies(self, top: int = 20, stopwords: Iterable[str] = (),
+                         case_insensitive: bool = True) -> List[Tuple[str, int]]:
+        """
+        Return the top most used words in the document and how many times
+        they are used, leaving out stopwords (regardless of case).
+
+        The words are counted in a snapshot of the document (or looked up in
+        the index, if one is attached). After an edit only the changed lines
+        are counted again. The result is cached until the document changes.
+        """
+        document = self._editor.document()
+        index = self.index if self.index is not None and self.index.document is document \
+            else None
+        ignored = frozenset(word.lower() for word in stopwords)
+        # Not the snapshot's revision, since that would copy the document
+        # even when the index has the answer
+        key = (index, document, document.revision(), top, ignored, case_insensitive)
+        if self._frequencies is None or self._frequencies[0] != key:
+            if index is not None:
+                counts = index.word_counts(case_insensitive)
+            else:
+                counts = self._word_counter.counts(self._snapshot.text)
+                counts = _fold_counts(counts) if case_insensitive else Counter(counts)
+            if ignored:
+                for word in [w for w in counts if w.lower() in ignored]:
+                    del counts[word]
+            self._frequencies = (key, counts.most_common(top))
+        return self._frequencies[1]
+
+    def report_word_frequencies(self, top: int = 20, stopwords: Iterable[str] = (),
+                                case_insensitive: bool = True) -> None:
+        """Log the top most used words in the document."""
+        frequencies = self.word_frequencies(top, stopwords, case_insensitive)
+        if frequencies:
+            self.log('Most used words: '
+                     + ', '.join(f'{word} ({times})' for word, times in frequencies))
+        else:
+            self.error('No words found')
+
+    @property
+    def _search_state(self) -> Optional[SearchState]:
+        return self._state
+
+    @_search_state.setter
+    def _search_state(self, state: Optional[SearchState]) -> None:
+        self._state = state
+        self._highlighter.set_state(state)
+
+    def set_highlight_all(self, enabled: bool,
+                          text_format: Optional[QTextCharFormat] = None) -> None:
+        """
+        Turn highlighting of all (visible) matches of the last search on or off.
+        """
+        if text_format is not None:
+            self._highlighter.format = QTextCharFormat(text_format)
+            self._highlighter.format.setProperty(_HIGHLIGHT_PROPERTY, True)
+        self._highlighter.set_enabled(enabled)
 
     def search_or_replace(self, cmd: str) -> None:
         """
         Search or replace, depending on how the cmd looks.
         """
+        if self._background is not None:
+            self._background.cancel()
+            self._background_task = None
+        try:
+            self._search_or_replace(cmd)
+        except re.error as e:
+            self.error(f'Invalid regex: {e}')
+
+    def _search_or_replace(self, cmd: str) -> None:
         if (match := _search_rx.fullmatch(cmd)):
             self._search_state = SearchState(match[0])
             self.search_next()
@@ -122,6 +1155,28 @@ class Searcher:
     def _is_searching_backwards(self) -> bool:
         return bool(self._search_state and SearchFlags.backwards in self._search_state.flags)
 
+    def _find_regex(self, flags: Set[SearchFlags]) -> Optional[Match[str]]:
+        """
+        Select the next regex match, wrapping around if needed.
+
+        This searches the plain text snapshot instead of using
+        QTextDocument.find.
+        """
+        if self._search_state is None:
+            return None
+        backwards = SearchFlags.backwards in flags
+        rx = _compile_search_rx(self._search_state.text,
+                                frozenset(flags - {SearchFlags.backwards}))
+        cursor = self._editor.textCursor()
+        match = self._snapshot.find(rx, cursor.selectionStart() if backwards
+                                    else cursor.selectionEnd(), backwards)
+        if match is None:
+            match = self._snapshot.find(rx, len(self._snapshot.text) if backwards else 0,
+                                        backwards)
+        if match is not None:
+            _select_span(self._editor, match.start(), match.end())
+        return match
+
     def _replace_next(self, replace_buffer: str) -> None:
         """
         Go to the next string found and replace it with replace_buffer.
@@ -129,17 +1184,23 @@ class Searcher:
         if self._search_state is None:
             self.error('No previous searches')
             return
-        temp_cursor = self._editor.textCursor()
-        found = self._search_state.find(self._editor)
-        searching_backwards = self._is_searching_backwards
-        if not found and \
-                (not self._editor.textCursor().atStart()
-                 or (searching_backwards and not self._editor.textCursor().atEnd())):
-            self._editor.moveCursor(QTextCursor.End if searching_backwards
-                                    else QTextCursor.Start)
+        if SearchFlags.regex in self._search_state.flags:
+            match = self._find_regex(self._search_state.flags)
+            found = match is not None
+            if match is not None:
+                replace_buffer = _expand_replacement(match, replace_buffer)
+        else:
+            temp_cursor = self._editor.textCursor()
             found = self._search_state.find(self._editor)
-            if not found:
-                self._editor.setTextCursor(temp_cursor)
+            searching_backwards = self._is_searching_backwards
+            if not found and \
+                    (not self._editor.textCursor().atStart()
+                     or (searching_backwards and not self._editor.textCursor().atEnd())):
+                self._editor.moveCursor(QTextCursor.End if searching_backwards
+                                        else QTextCursor.Start)
+                found = self._search_state.find(self._editor)
+                if not found:
+                    self._editor.setTextCursor(temp_cursor)
         if found:
             t = self._editor.textCursor()
             t.insertText(replace_buffer)
@@ -165,32 +1226,52 @@ class Searcher:
         else:
             searching_backwards = False
             search_flags.discard(SearchFlags.backwards)
-        temp_cursor = self._editor.textCursor()
-        found = self._search_state.find(self._editor, search_flags)
-        if not found and \
-                (not self._editor.textCursor().atStart()
-                 or (searching_backwards and not self._editor.textCursor().atEnd())):
-            self._editor.moveCursor(QTextCursor.End if searching_backwards
-                                    else QTextCursor.Start)
-            found = self._search_state.find(self._editor, search_flags)
-        if not found:
-            self._editor.setTextCursor(temp_cursor)
+        cursor = self._editor.textCursor()
+        pos = cursor.selectionStart() if searching_backwards else cursor.selectionEnd()
+        document = self._editor.document()
+        if not self._search_state.has_matches(document):
+            # Use the index or the background search if there is one rather
+            # than finding every match up front
+            index_flags = frozenset(search_flags - {SearchFlags.backwards})
+            index = self._usable_index(self._search_state.text, index_flags)
+            if index is not None:
+                span = index.find_next(self._search_state.text, index_flags,
+                                       pos, searching_backwards)
+                if span is None:
+                    self.error('Text not found')
+                else:
+                    _select_span(self._editor, *span)
+                return
+            if self._background is not None:
+                self._start_background_task(
+                    _BackgroundTask(False, self._search_state.text, frozenset(search_flags)))
+                return
+            self._search_state.update_matches(document, self._snapshot.text)
+        span = self._search_state.next_match(pos, searching_backwards)
+        if span is None:
             self.error('Text not found')
+        else:
+            _select_span(self._editor, *span)
 
     def _count_hits(self, target: str, flags: Set[SearchFlags]) -> None:
         """
         Count how many times a term (word/sentence, etc.) has been used.
         """
-        times = 0
-        cursor = QTextCursor(self._editor.document())
         # Don't use the backwards flag
-        flags = flags - {SearchFlags.backwards}
-        while True:
-            cursor = self._editor.document().find(target, cursor, _encode_flags(flags))
-            if not cursor.isNull():
-                times += 1
-            else:
-                break
+        frozen_flags = frozenset(flags - {SearchFlags.backwards})
+        index = self._usable_index(target, frozen_flags)
+        times = None if index is None else index.count(target, frozen_flags)
+        if times is None:
+            # Only refreshed here since that copies the whole document
+            self._snapshot.refresh()
+            if self._background is not None \
+                    and (target, frozen_flags) not in self._snapshot.counts:
+                self._start_background_task(_BackgroundTask(True, target, frozen_flags))
+                return
+            times = self._snapshot.count(target, frozen_flags)
+        self._log_count(target, times)
+
+    def _log_count(self, target: str, times: int) -> None:
         if times:
             self.log(f'The word "{target}" is used {times} times')
         else:
@@ -200,22 +1281,30 @@ class Searcher:
         """
         Replace all strings found with the replace_buffer.
 
+        All matches are found first and then replaced in one edit block, so
+        the whole thing is a single undo step.
+
         As with replace_next, you probably don't want to call this manually.
         """
         if self._search_state is None:
             return
-        temp_cursor = self._editor.textCursor()
-        times = 0
-        self._editor.moveCursor(QTextCursor.Start)
-        while True:
-            found = self._search_state.find(self._editor)
-            if found:
-                self._editor.textCursor().insertText(replace_buffer)
-                times += 1
-            else:
-                break
+        # Don't use the backwards flag
+        flags = frozenset(self._search_state.flags - {SearchFlags.backwards})
+        rx = _compile_search_rx(self._search_state.text, flags)
+        text = self._snapshot.text
+        index = self._usable_index(self._search_state.text, flags)
+        if SearchFlags.regex in flags:
+            replacements = [(m.start(), m.end(), _expand_replacement(m, replace_buffer))
+                            for m in _iter_matches(rx, text)]
+        elif index is not None:
+            replacements = [(start, end, replace_buffer) for start, end
+                            in index.find_all(self._search_state.text, flags) or []]
+        else:
+            replacements = [(m.start(), m.end(), replace_buffer)
+                            for m in _iter_matches(rx, text)]
+        times = len(replacements)
         if times:
+            _apply_replacements(self._editor, replacements)
             self.log(f'{times} instance{"" if times == 1 else "s"} replaced')
         else:
             self.error('Text not found')
-        self._editor.setTextCursor(temp_cursor)
@@ -1,5 +1,7 @@
-from typing import (Any, Callable, List, Optional, Protocol, Type, TypeVar,
-                    Union, cast)
+import enum
+from contextlib import contextmanager
+from typing import (Any, Callable, Iterator, List, Optional, overload, Protocol, Tuple,
+                    Type, TypeVar, Union, cast)
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QBoxLayout, QLayout, QWidget
@@ -72,6 +74,206 @@ def mk_signal3(t1: Type[_T1], t2: Type[_T2], t3: Type[_T3]
     return cast(Signal3[_T1, _T2, _T3], QtCore.pyqtSignal(t1, t2, t3))
 
 
+# Rate limited signals
+#
+# These wrap a signal made by mk_signalN and are declared the same way, as
+# class attributes of a QObject:
+#
+#     class Editor(QtWidgets.QPlainTextEdit):
+#         cursor_moved = debounced(mk_signal1(int), 100)
+#
+# Emitting them is cheap and the slots are called later, at most once per
+# interval, with the last emitted arguments. The batched variants instead
+# call the slots with a list of every emit since the last call. Slots are
+# always called in the owner's thread, even if emit is called from another.
+
+class BatchSignal1(Protocol[_T1]):
+    def emit(self, arg: _T1) -> None: ...
+
+    def connect(self, slot: Callable[[List[_T1]], None]) -> None: ...
+
+
+class BatchSignal2(Protocol[_T1, _T2]):
+    def emit(self, arg1: _T1, arg2: _T2) -> None: ...
+
+    def connect(self, slot: Callable[[List[Tuple[_T1, _T2]]], None]) -> None: ...
+
+
+class BatchSignal3(Protocol[_T1, _T2, _T3]):
+    def emit(self, arg1: _T1, arg2: _T2, arg3: _T3) -> None: ...
+
+    def connect(self, slot: Callable[[List[Tuple[_T1, _T2, _T3]]], None]) -> None: ...
+
+
+_AnySignal = TypeVar('_AnySignal', bound=Union[Signal0, Signal1[Any], Signal2[Any, Any],
+                                               Signal3[Any, Any, Any]])
+
+
+class DelayMode(enum.Enum):
+    # Call the slots right away, then at most once per interval
+    THROTTLE = enum.auto()
+    # Call the slots when there hasn't been an emit for a whole interval
+    DEBOUNCE = enum.auto()
+    # Call the slots once the interval after the first emit is over
+    COALESCE = enum.auto()
+
+
+class BoundDelayedSignal(QtCore.QObject):
+    """The per-object part of a delayed signal. Don't create these yourself."""
+    _emitted = QtCore.pyqtSignal(tuple)
+
+    def __init__(self, owner: Optional[QtCore.QObject], mode: DelayMode, interval: int,
+                 batch: bool) -> None:
+        super().__init__(owner)
+        self._mode = mode
+        self._batch = batch
+        self._pending: List[Tuple[Any, ...]] = []
+        self._slots: List[Callable[..., Any]] = []
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self._timeout)
+        # Queued across threads, so the timer is only touched in its own thread
+        self._emitted.connect(self._add)
+
+    @property
+    def interval(self) -> int:
+        return self._timer.interval()
+
+    @interval.setter
+    def interval(self, interval: int) -> None:
+        self._timer.setInterval(interval)
+
+    @property
+    def pending(self) -> int:
+        """How many emits haven't been delivered yet."""
+        return len(self._pending)
+
+    def emit(self, *args: Any) -> None:
+        self._emitted.emit(args)
+
+    def connect(self, slot: Callable[..., Any]) -> None:
+        self._slots.append(slot)
+
+    def disconnect(self, slot: Optional[Callable[..., Any]] = None) -> None:
+        if slot is None:
+            self._slots.clear()
+        else:
+            self._slots.remove(slot)
+
+    def flush(self) -> None:
+        """Call the slots with whatever is pending right now."""
+        self._timer.stop()
+        self._deliver()
+
+    def _add(self, args: Tuple[Any, ...]) -> None:
+        if self._batch:
+            self._pending.append(args)
+        else:
+            self._pending[:] = [args]
+        if self._mode == DelayMode.DEBOUNCE:
+            self._timer.start()
+        elif not self._timer.isActive():
+            if self._mode == DelayMode.THROTTLE:
+                self._deliver()
+            self._timer.start()
+
+    def _timeout(self) -> None:
+        if self._pending:
+            self._deliver()
+            # Keep the rate down if the emits keep coming
+            if self._mode == DelayMode.THROTTLE:
+                self._timer.start()
+
+    def _deliver(self) -> None:
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        if self._batch:
+            batch = [args[0] if len(args) == 1 else args for args in pending]
+            for slot in list(self._slots):
+                slot(batch)
+        else:
+            for slot in list(self._slots):
+                slot(*pending[-1])
+
+
+class DelayedSignal:
+    """A class attribute that creates a BoundDelayedSignal per object."""
+    def __init__(self, mode: DelayMode, interval: int, batch: bool) -> None:
+        self.mode = mode
+        self.interval = interval
+        self.batch = batch
+        self._name = ''
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._name = name
+
+    def __get__(self, obj: Optional[QtCore.QObject], owner: type) -> Any:
+        if obj is None:
+            return self
+        bound = BoundDelayedSignal(None, self.mode, self.interval, self.batch)
+        # The first access might be an emit from another thread
+        bound.moveToThread(obj.thread())
+        bound.setParent(obj)
+        # Shadows this descriptor, so it's only created once per object
+        setattr(obj, self._name, bound)
+        return bound
+
+
+def _check_interval(interval: int) -> None:
+    if interval < 0:
+        raise ValueError(f'Negative signal interval: {interval}')
+
+
+def throttled(signal: _AnySignal, interval: int) -> _AnySignal:
+    """Call the slots at most once every interval milliseconds."""
+    _check_interval(interval)
+    return cast(_AnySignal, DelayedSignal(DelayMode.THROTTLE, interval, False))
+
+
+def debounced(signal: _AnySignal, interval: int) -> _AnySignal:
+    """Call the slots when nothing has been emitted for interval milliseconds."""
+    _check_interval(interval)
+    return cast(_AnySignal, DelayedSignal(DelayMode.DEBOUNCE, interval, False))
+
+
+def coalesced(signal: _AnySignal, interval: int = 0) -> _AnySignal:
+    """
+    Call the slots once interval milliseconds after the first emit. The
+    default of 0 merges every emit made before returning to the event loop.
+    """
+    _check_interval(interval)
+    return cast(_AnySignal, DelayedSignal(DelayMode.COALESCE, interval, False))
+
+
+@overload
+def batched(signal: Signal1[_T1], interval: int = ...,
+            mode: DelayMode = ...) -> BatchSignal1[_T1]: ...
+
+
+@overload
+def batched(signal: Signal2[_T1, _T2], interval: int = ...,
+            mode: DelayMode = ...) -> BatchSignal2[_T1, _T2]: ...
+
+
+@overload
+def batched(signal: Signal3[_T1, _T2, _T3], interval: int = ...,
+            mode: DelayMode = ...) -> BatchSignal3[_T1, _T2, _T3]: ...
+
+
+def batched(signal: Any, interval: int = 0,
+            mode: DelayMode = DelayMode.COALESCE) -> Any:
+    """
+    Like throttled, debounced or coalesced (depending on mode), but call the
+    slots with a list of everything emitted since they were last called.
+    Signals with more than one argument give a list of tuples.
+    """
+    _check_interval(interval)
+    return DelayedSignal(mode, interval, True)
+
+
 # Actual widgets
 
 class Stretch:
@@ -126,3 +328,63 @@ def BoxLayout(direction: QBoxLayout.Direction, *args: Any) -> QBoxLayout:
         elif isinstance(item, QLayout):
             box.addLayout(item, stretch=stretch)
     return box
+
+
+# Building big layouts
+
+def repeat_rows(count: int, row: Callable[[int], List[Union[QLayout, QWidget, Stretch]]],
+                spacing: int = 0, row_spacing: int = 0,
+                group_size: int = 100) -> List[QWidget]:
+    """
+    Make count rows (HBoxLayouts) with the items returned by row, which is
+    called with the row's index. Use the result as the items of a
+    VBoxLayout with row_spacing as its spacing.
+
+    Painting a widget with thousands of direct children takes time that
+    grows with the square of the number of children, so the rows are put
+    in widgets with group_size rows each.
+    """
+    groups = []
+    for first in range(0, count, group_size):
+        group = QWidget()
+        VBoxLayout(group, [HBoxLayout(row(n), spacing)
+                           for n in range(first, min(first + group_size, count))],
+                   row_spacing)
+        groups.append(group)
+    return groups
+
+
+@contextmanager
+def bulk_build(parent: QWidget) -> Iterator[QWidget]:
+    """
+    Build a big widget tree in a new container widget and add it to the
+    end of parent's layout (or a new VBoxLayout if there is none) when done.
+    If parent is a QScrollArea, the container becomes its widget instead.
+
+    Adding widgets to a visible parent makes Qt show every widget on its
+    own later, and each one lays out the whole tree again, which gets
+    very slow with thousands of widgets. The container is neither shown,
+    painted nor laid out while it's being built. Its layout is activated
+    once at the end, and then it's shown along with everything in it.
+
+        with bulk_build(scroll_area) as container:
+            VBoxLayout(container, repeat_rows(10000, make_row))
+    """
+    container = QWidget()
+    container.setUpdatesEnabled(False)
+    try:
+        yield container
+    except BaseException:
+        container.deleteLater()
+        raise
+    layout = container.layout()
+    if layout is not None:
+        layout.activate()
+    if isinstance(parent, QtWidgets.QScrollArea):
+        parent.setWidget(container)
+    else:
+        parent_layout = parent.layout()
+        if parent_layout is None:
+            parent_layout = VBoxLayout(parent)
+        parent_layout.addWidget(container)
+    container.setUpdatesEnabled(True)
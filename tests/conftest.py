@@ -0,0 +1,12 @@
+import os
+from typing import Iterator
+
+import pytest
+from PyQt5 import QtWidgets
+
+
+@pytest.fixture(scope='session')  # type: ignore
+def qapp() -> Iterator[QtWidgets.QApplication]:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield app
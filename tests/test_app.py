@@ -0,0 +1,179 @@
+import os
+import time
+from pathlib import Path
+from typing import List
+from unittest.mock import Mock
+
+import pytest
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from libsyntyche.app import (_widget_overrides, compile_stylesheet, preprocess_stylesheet,
+                             StallReport, StallWatchdog, StyleSheetReloader)
+from libsyntyche.cli import _run_command, ArgumentRules, Command
+
+
+def test_stylesheet_reloader(qapp: QtWidgets.QApplication, tmp_path: Path) -> None:
+    css_path = tmp_path / 'qt.css'
+    css_path.write_text('QLabel { color: red; }')
+    reloader = StyleSheetReloader(qapp, css_path)
+    activated = Mock()
+    reloader.activation_event.connect(activated)
+    qapp.installEventFilter(reloader)
+    try:
+        assert reloader.reload()
+        assert qapp.styleSheet() == 'QLabel{color:red}'
+        assert not reloader.reload()
+        # Touched but not changed
+        os.utime(css_path, ns=(0, 0))
+        assert not reloader.reload()
+        css_path.write_text('QLabel { color: blue; }')
+        os.utime(css_path, ns=(1, 1))
+        qapp.sendEvent(qapp, QtCore.QEvent(QtCore.QEvent.ApplicationActivate))
+        assert activated.call_count == 1
+        assert qapp.styleSheet() == 'QLabel{color:blue}'
+        assert reloader.reload(force=True)
+    finally:
+        qapp.removeEventFilter(reloader)
+        qapp.setStyleSheet('')
+
+
+def test_preprocess_stylesheet(tmp_path: Path) -> None:
+    (tmp_path / 'vars.css').write_text('/* colours */\n$fg: #333;\n$border: 1px solid $fg;\n')
+    (tmp_path / 'main.css').write_text(
+        '@import "vars.css";\n@import url(vars.css);\n/* @import "missing.css"; */\n'
+        'QLabel#title:hover ,\nQPushButton > QLabel {\n'
+        '  color: $fg;  /* comment */\n  border:$border;\n  font-family: "A  /* b */";\n}\n')
+    compiled = preprocess_stylesheet(tmp_path / 'main.css')
+    assert compiled.css == ('QLabel#title:hover,QPushButton>QLabel{color:#333;'
+                            'border:1px solid #333;font-family:"A  /* b */"}')
+    assert set(compiled.inputs) == {str((tmp_path / name).resolve())
+                                    for name in ['main.css', 'vars.css']}
+    (tmp_path / 'vars.css').write_text('@import "main.css";')
+    with pytest.raises(ValueError):
+        preprocess_stylesheet(tmp_path / 'main.css')
+    (tmp_path / 'vars.css').write_text('')
+    with pytest.raises(ValueError):
+        preprocess_stylesheet(tmp_path / 'main.css')
+
+
+def test_compile_stylesheet_cache(tmp_path: Path) -> None:
+    css_path = tmp_path / 'main.css'
+    css_path.write_text('QLabel { color: red; }')
+    cache_dir = tmp_path / 'cache'
+    assert compile_stylesheet(css_path, cache_dir).css == 'QLabel{color:red}'
+    cache_file, = cache_dir.iterdir()
+    # A valid cache entry is used as is
+    cache_file.write_text(cache_file.read_text().replace('color:red', 'color:cached'))
+    assert compile_stylesheet(css_path, cache_dir).css == 'QLabel{color:cached}'
+    css_path.write_text('QLabel { color: blue; }')
+    assert compile_stylesheet(css_path, cache_dir).css == 'QLabel{color:blue}'
+
+
+def test_widget_overrides() -> None:
+    assert _widget_overrides('#a{color:red}QLabel{x:y}',
+                             '#a{color:blue}QLabel{x:y}#b,QLabel#c{z:1}') == {
+        'a': '#a{color:blue}', 'b': '#b,QLabel#c{z:1}', 'c': '#b,QLabel#c{z:1}'}
+    # Removed properties, removed rules and rules for all widgets of a type
+    assert _widget_overrides('#a{color:red;padding:1}', '#a{color:blue}') is None
+    assert _widget_overrides('#a{color:red}QLabel{x:y}', '#a{color:red}') is None
+    assert _widget_overrides('QLabel{x:y}', 'QLabel{x:z}') is None
+    # Unchanged rules for the same widget would lose to the widget's stylesheet
+    assert _widget_overrides('#a{color:red}#a:hover{color:green}',
+                             '#a{color:blue}#a:hover{color:green}') is None
+    assert _widget_overrides('#a{color:red}QLabel#a[x="y"]{color:green}',
+                             '#a{color:blue}QLabel#a[x="y"]{color:green}') is None
+
+
+def test_stylesheet_reloader_widget_update(qapp: QtWidgets.QApplication,
+                                           tmp_path: Path) -> None:
+    css_path = tmp_path / 'qt.css'
+    css_path.write_text('QLabel { color: red; }\n#title { color: red; }')
+    label = QtWidgets.QLabel()
+    label.setObjectName('title')
+    reloader = StyleSheetReloader(qapp, css_path)
+    try:
+        assert reloader.reload()
+        css_path.write_text('QLabel { color: red; }\n#title { color: blue; }')
+        os.utime(css_path, ns=(1, 1))
+        assert reloader.reload()
+        assert qapp.styleSheet() == 'QLabel{color:red}#title{color:red}'
+        assert label.styleSheet() == '#title{color:blue}'
+        css_path.write_text('QLabel { color: blue; }')
+        os.utime(css_path, ns=(2, 2))
+        assert reloader.reload()
+        assert qapp.styleSheet() == 'QLabel{color:blue}'
+        assert label.styleSheet() == ''
+    finally:
+        qapp.setStyleSheet('')
+
+
+def text_color(label: QtWidgets.QLabel) -> str:
+    label.ensurePolished()
+    return str(label.palette().color(QtGui.QPalette.WindowText).name())
+
+
+def test_stylesheet_reloader_precedence(qapp: QtWidgets.QApplication,
+                                        tmp_path: Path) -> None:
+    css_path = tmp_path / 'qt.css'
+    css_path.write_text('#title { color: red; }\n#title[warn="true"] { color: green; }')
+    label = QtWidgets.QLabel()
+    label.setObjectName('title')
+    label.setProperty('warn', True)
+    reloader = StyleSheetReloader(qapp, css_path)
+    try:
+        assert reloader.reload()
+        assert text_color(label) == '#008000'
+        css_path.write_text('#title { color: blue; }\n#title[warn="true"] { color: green; }')
+        os.utime(css_path, ns=(1, 1))
+        # The same as a full restyle, since the label should still be green
+        assert reloader.reload()
+        assert label.styleSheet() == ''
+        assert text_color(label) == '#008000'
+        # Widgets with their own stylesheet get the new rules too
+        other = QtWidgets.QLabel()
+        other.setObjectName('other')
+        other.setStyleSheet('QLabel { padding: 1px; }')
+        css_path.write_text('#title { color: blue; }\n#other { color: blue; }')
+        os.utime(css_path, ns=(2, 2))
+        assert reloader.reload()
+        css_path.write_text('#title { color: blue; }\n#other { color: red; }')
+        os.utime(css_path, ns=(3, 3))
+        assert reloader.reload()
+        assert qapp.styleSheet() == '#title{color:blue}#other{color:red}'
+        assert other.styleSheet() == 'QLabel { padding: 1px; }'
+        assert text_color(other) == '#ff0000'
+    finally:
+        qapp.setStyleSheet('')
+
+
+def test_stall_watchdog(qapp: QtWidgets.QApplication, tmp_path: Path) -> None:
+    log_path = tmp_path / 'logs' / 'stalls.log'
+    watchdog = StallWatchdog(threshold=50, interval=10, log_path=log_path)
+    reports: List[StallReport] = []
+    watchdog.stalled.connect(reports.append)
+
+    def freeze() -> None:
+        time.sleep(0.2)
+
+    def run_events(seconds: float) -> None:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            qapp.processEvents(QtCore.QEventLoop.AllEvents, 5)
+
+    watchdog.start()
+    try:
+        run_events(0.1)
+        assert reports == []
+        _run_command('s', {'s': Command('slow-command', '', freeze, ArgumentRules.NONE,
+                                        short_name='s')}, False)
+        run_events(0.1)
+    finally:
+        watchdog.stop()
+    assert not watchdog.is_running
+    assert len(reports) == 1
+    report = reports[0]
+    assert report.activity == "command 'slow-command' (s)"
+    assert 0.1 < report.duration < 0.3
+    assert 'in freeze' in report.stack
+    assert report.summary().startswith('The UI was frozen for ')
+    assert report.summary() in log_path.read_text(encoding='utf-8')
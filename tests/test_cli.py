@@ -1,10 +1,13 @@
+import sys
+from pathlib import Path
+
 import pytest
 from unittest.mock import Mock
 from typing import Dict, List
 
 from libsyntyche.cli import (_generate_suggestions, _run_command,
                              ArgumentRules, AutocompletionPattern,
-                             Command)
+                             CachePolicy, Command, CommandLineInterface, SuggestionCache)
 
 
 def test_generate_suggestions() -> None:
@@ -107,3 +110,114 @@ def test_run_command_req_arg_error(default_commands: Dict[str, Command]
     # new_input, (error, new_output), append_to_history
     assert result == ('b ', (True, "This command requires an argument"), False)
     default_commands['b'].callback.assert_not_called()
+
+
+# Suggestion cache
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def counting_getter(words: List[str]) -> Mock:
+    return Mock(side_effect=lambda name, text: [x for x in words
+                                                if x.startswith(text)])
+
+
+def test_suggestion_cache_exact() -> None:
+    getter = counting_getter(['abc', 'abd', 'bcd'])
+    ac = AutocompletionPattern('foo', getter, cache=CachePolicy.EXACT)
+    cache = SuggestionCache()
+    assert cache.get_suggestions(ac, 'a') == ['abc', 'abd']
+    assert cache.get_suggestions(ac, 'a') == ['abc', 'abd']
+    assert getter.call_count == 1
+    # EXACT doesn't filter from shorter prefixes
+    assert cache.get_suggestions(ac, 'ab') == ['abc', 'abd']
+    assert getter.call_count == 2
+
+
+def test_suggestion_cache_prefix() -> None:
+    getter = counting_getter(['abc', 'abd', 'bcd'])
+    ac = AutocompletionPattern('foo', getter, cache=CachePolicy.PREFIX)
+    cache = SuggestionCache()
+    assert cache.get_suggestions(ac, 'a') == ['abc', 'abd']
+    assert cache.get_suggestions(ac, 'abd') == ['abd']
+    assert cache.get_suggestions(ac, 'abx') == []
+    getter.assert_called_once_with('foo', 'a')
+
+
+def test_suggestion_cache_none() -> None:
+    getter = counting_getter(['abc'])
+    ac = AutocompletionPattern('foo', getter)
+    cache = SuggestionCache()
+    cache.get_suggestions(ac, 'a')
+    cache.get_suggestions(ac, 'a')
+    assert getter.call_count == 2
+    assert len(cache) == 0
+
+
+def test_suggestion_cache_eviction() -> None:
+    clock = FakeClock()
+    getter = counting_getter(['abc', 'bcd', 'cde'])
+    ac = AutocompletionPattern('foo', getter, cache=CachePolicy.EXACT)
+    cache = SuggestionCache(max_size=2, ttl=10, clock=clock)
+    for text in ['a', 'b', 'c']:
+        cache.get_suggestions(ac, text)
+    assert len(cache) == 2
+    cache.get_suggestions(ac, 'a')
+    assert getter.call_count == 4
+    clock.now = 11
+    cache.get_suggestions(ac, 'a')
+    assert getter.call_count == 5
+
+
+def test_suggestion_cache_invalidate() -> None:
+    words = ['abc']
+    getter = counting_getter(words)
+    ac = AutocompletionPattern('foo', getter, cache=CachePolicy.PREFIX)
+    cache = SuggestionCache()
+    assert cache.get_suggestions(ac, 'a') == ['abc']
+    words.append('aaa')
+    assert cache.get_suggestions(ac, 'a') == ['abc']
+    cache.invalidate('bar')
+    assert cache.get_suggestions(ac, 'a') == ['abc']
+    cache.invalidate('foo')
+    assert cache.get_suggestions(ac, 'a') == ['abc', 'aaa']
+
+
+def test_generate_suggestions_cached() -> None:
+    getter = counting_getter(['abc', 'aaa'])
+    ac = AutocompletionPattern('foo', getter, cache=CachePolicy.PREFIX)
+    cache = SuggestionCache()
+    assert _generate_suggestions([ac], 'a', 1, cache) == (['a', 'abc', 'aaa'], 0, 1)
+    assert _generate_suggestions([ac], 'ab', 2, cache) == (['ab', 'abc'], 0, 2)
+    assert getter.call_count == 1
+
+
+def test_lazy_command(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / 'lazy_commands.py').write_text(
+        'calls = []\n'
+        'class Commands:\n'
+        '    @staticmethod\n'
+        '    def greet(arg):\n'
+        '        calls.append(arg)\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    output: List[str] = []
+    cli = CommandLineInterface(get_input=lambda: '', set_input=lambda _: None,
+                               set_output=output.append, get_cursor_pos=lambda: 0,
+                               set_cursor_pos=lambda _: None)
+    cli.add_command(Command('greet', 'Say hi', 'lazy_commands:Commands.greet',
+                            short_name='g'))
+    cli.add_command(Command('broken', '', 'lazy_commands:missing', short_name='x'))
+    with pytest.raises(ValueError):
+        cli.add_command(Command('bad', '', 'lazy_commands.greet', short_name='y'))
+    cli.run_command('?')
+    assert _generate_suggestions(cli.autocompletion_patterns, '?g', 2)[0] == ['g', 'g ']
+    assert 'lazy_commands' not in sys.modules
+    cli.run_command('g hello')
+    assert sys.modules['lazy_commands'].calls == ['hello']  # type: ignore
+    cli.run_command('x')
+    assert output[-1].startswith('Error: Could not load the command: ')
@@ -0,0 +1,50 @@
+import io
+import subprocess
+import sys
+from typing import List
+
+from libsyntyche.cli import ArgumentRules, AutocompletionPattern, Command
+from libsyntyche.console import Console
+
+
+def make_console() -> Console:
+    console = Console(stdout=io.StringIO(), stderr=io.StringIO())
+    console.cli.add_command(Command('echo', '', console.cli.print_, short_name='e'))
+    console.cli.add_command(Command('fail', '', lambda: 1 / 0, ArgumentRules.NONE,
+                                    short_name='f'))
+    return console
+
+
+def test_run_batch() -> None:
+    console = make_console()
+    errors = console.run_batch(['e one\n', '\n', '# comment\n', 'f\n', 'x\n', 'e two\r\n'])
+    assert errors == 2
+    assert console.stdout.getvalue() == 'one\ntwo\n'  # type: ignore
+    assert console.stderr.getvalue().count('Error: ') == 2  # type: ignore
+    # Batches don't end up in the history
+    assert console.cli.history == ['']
+
+
+def test_run_batch_stop_on_error() -> None:
+    console = make_console()
+    assert console.run(io.StringIO('e one\nf\ne two\n'), stop_on_error=True) == 1
+    assert console.stdout.getvalue() == 'one\n'  # type: ignore
+
+
+def test_complete() -> None:
+    console = make_console()
+    words = ['apple', 'apricot', 'banana']
+    console.cli.add_autocompletion_pattern(AutocompletionPattern(
+        'words', lambda name, text: [w for w in words if w.startswith(text)],
+        prefix=r'e\s*'))
+    completions: List[str] = []
+    while (completion := console.complete('e ap', len(completions))) is not None:
+        completions.append(completion)
+    assert completions == ['e apple', 'e apricot']
+    assert console.complete('?e', 0) == '?e '
+
+
+def test_console_does_not_import_qt() -> None:
+    code = ('import sys, libsyntyche.console; '
+            'assert not [m for m in sys.modules if m.startswith("PyQt5")]')
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+
+from libsyntyche.fileindex import FileIndex
+
+
+def make_tree(root: Path) -> None:
+    for path in ['README.md', 'src/main.py', 'src/util/Helpers.py', 'docs/index.md',
+                 '.git/config', 'src/__pycache__/main.pyc']:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text('')
+
+
+def bump_mtime(path: Path) -> None:
+    # Directory mtimes can be too coarse to notice quick changes
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_find(tmp_path: Path) -> None:
+    make_tree(tmp_path)
+    index = FileIndex(str(tmp_path))
+    assert index.refresh()
+    assert len(index) == 4
+    assert index.find('') == ['README.md', 'docs/index.md', 'src/main.py',
+                              'src/util/Helpers.py']
+    assert index.find('.py') == ['src/main.py', 'src/util/Helpers.py']
+    assert index.find('.py', limit=1) == ['src/main.py']
+    assert index.find('util/h') == ['src/util/Helpers.py']
+    # Case is only matched if the fragment has upper case letters
+    assert index.find('readme') == ['README.md']
+    assert index.find('Readme') == []
+    assert index.find('config') == []
+    assert index.get_suggestions('open', 'main') == [str(tmp_path / 'src/main.py')]
+    assert index.get_suggestions('open', '') == []
+
+
+def test_refresh(tmp_path: Path) -> None:
+    make_tree(tmp_path)
+    index = FileIndex(str(tmp_path))
+    index.refresh()
+    assert not index.refresh()
+    (tmp_path / 'src/new.py').write_text('')
+    (tmp_path / 'lib/deep').mkdir(parents=True)
+    (tmp_path / 'lib/deep/lib.py').write_text('')
+    (tmp_path / 'docs/index.md').unlink()
+    for path in ['src', 'docs', '.']:
+        bump_mtime(tmp_path / path)
+    assert index.refresh()
+    assert index.find('') == ['README.md', 'lib/deep/lib.py', 'src/main.py', 'src/new.py',
+                              'src/util/Helpers.py']
+    (tmp_path / 'src/util/Helpers.py').unlink()
+    (tmp_path / 'src/util').rmdir()
+    bump_mtime(tmp_path / 'src')
+    assert index.refresh()
+    assert index.find('.py') == ['lib/deep/lib.py', 'src/main.py', 'src/new.py']
+
+
+def test_background_thread(tmp_path: Path) -> None:
+    make_tree(tmp_path)
+    index = FileIndex(str(tmp_path), refresh_interval=0.01)
+    assert not index.is_ready
+    index.start()
+    try:
+        assert index.wait_until_ready(5)
+        assert index.find('main') == ['src/main.py']
+    finally:
+        index.stop()
+
+
+def test_find_narrowing(tmp_path: Path) -> None:
+    make_tree(tmp_path)
+    index = FileIndex(str(tmp_path))
+    index.refresh()
+    # The first search stops early, so the longer fragments have to look
+    # through the rest of the paths too
+    assert index.find('m', limit=1) == ['README.md']
+    assert index.find('ma') == ['src/main.py']
+    assert index.find('mai') == ['src/main.py']
+    assert index.find('md') == ['README.md', 'docs/index.md']
+    # A changed index isn't narrowed down from old results
+    assert index.find('ma') == ['src/main.py']
+    (tmp_path / 'src/main.py').unlink()
+    (tmp_path / 'src/mango.py').write_text('')
+    bump_mtime(tmp_path / 'src')
+    index.refresh()
+    assert index.find('man') == ['src/mango.py']
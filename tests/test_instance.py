@@ -0,0 +1,69 @@
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+from PyQt5 import QtWidgets
+
+from libsyntyche.app import InstanceServer
+from libsyntyche.instance import (decode_commands, encode_commands,
+                                  forward_to_running_instance, socket_path)
+
+
+@pytest.fixture  # type: ignore
+def app_name(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setenv('TMPDIR', str(tmp_path))
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    return 'libsyntyche-test'
+
+
+def test_socket_path(qapp: QtWidgets.QApplication, app_name: str, tmp_path: Path,
+                     monkeypatch: pytest.MonkeyPatch) -> None:
+    path = Path(socket_path(app_name))
+    assert path.parent.parent == tmp_path
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+    # Someone else could have put things in a directory others can access
+    path.parent.chmod(0o777)
+    with pytest.raises(OSError):
+        socket_path(app_name)
+    assert not forward_to_running_instance(app_name, ['x'])
+    assert not InstanceServer(app_name).listen()
+    runtime_dir = tmp_path / 'runtime'
+    runtime_dir.mkdir(mode=0o700)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(runtime_dir))
+    assert socket_path(app_name) == str(runtime_dir / app_name)
+
+
+def test_encode_commands() -> None:
+    assert decode_commands(encode_commands(['o foo', ' s'])) == ['o foo', ' s']
+    with pytest.raises(ValueError):
+        decode_commands(b'{"o": 1}')
+    with pytest.raises(ValueError):
+        decode_commands(b'[')
+
+
+def test_no_running_instance(app_name: str) -> None:
+    assert not forward_to_running_instance(app_name, ['x'])
+    # A socket left behind by an instance that crashed
+    Path(socket_path(app_name)).touch()
+    assert not forward_to_running_instance(app_name, ['x'])
+
+
+def test_forward_to_running_instance(qapp: QtWidgets.QApplication, app_name: str) -> None:
+    Path(socket_path(app_name)).touch()
+    server = InstanceServer(app_name)
+    assert server.listen()
+    received: List[List[str]] = []
+    server.commands_received.connect(received.append)
+    results: List[bool] = []
+    try:
+        thread = threading.Thread(target=lambda: results.append(
+            forward_to_running_instance(app_name, ['o file.txt', ' s'])))
+        thread.start()
+        while thread.is_alive() or not received:
+            qapp.processEvents()
+            thread.join(0.001)
+    finally:
+        server.close()
+    assert results == [True]
+    assert received == [['o file.txt', ' s']]
@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+from typing import List
+
+from PyQt5 import QtWidgets
+
+from libsyntyche.loghandler import TerminalLogHandler
+from libsyntyche.terminal import MessageType, Terminal
+
+
+def log_rows(terminal: Terminal) -> List[str]:
+    log = terminal.log_history
+    return [log.item(n).text().split(' - ', 1)[1] for n in range(log.count())]
+
+
+def process_events(qapp: QtWidgets.QApplication) -> None:
+    # The queued wake up starts a timer which then has to fire
+    end = time.monotonic() + 0.05
+    while time.monotonic() < end:
+        qapp.processEvents()
+
+
+def test_terminal_log_handler(qapp: QtWidgets.QApplication) -> None:
+    window = QtWidgets.QWidget()
+    terminal = Terminal(window)
+    handler = TerminalLogHandler(terminal, interval=0)
+    messages: List[MessageType] = []
+    terminal.show_message.connect(lambda timestamp, type_, text: messages.append(type_))
+    logger = logging.getLogger('test_loghandler')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        thread = threading.Thread(target=lambda: [logger.warning('warning %d', n)
+                                                  for n in range(3)])
+        thread.start()
+        thread.join()
+        logger.info('not shown')
+        logger.error('broken')
+        # Nothing is added until the GUI thread gets to it
+        assert terminal.log_history.count() == 0
+        process_events(qapp)
+        assert log_rows(terminal) == [
+            '< WARNING: test_loghandler: warning 0',
+            '< WARNING: test_loghandler: warning 1',
+            '< WARNING: test_loghandler: warning 2',
+            '< [ERROR] ERROR: test_loghandler: broken',
+        ]
+        assert messages == [MessageType.PRINT] * 3 + [MessageType.ERROR]
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    logger.warning('after closing')
+    process_events(qapp)
+    assert terminal.log_history.count() == 4
+
+
+def test_terminal_log_handler_drops_oldest(qapp: QtWidgets.QApplication) -> None:
+    window = QtWidgets.QWidget()
+    terminal = Terminal(window)
+    handler = TerminalLogHandler(terminal, max_queue=3, interval=0)
+    logger = logging.getLogger('test_loghandler.drop')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for n in range(5):
+            logger.warning('%d', n)
+        process_events(qapp)
+        assert log_rows(terminal) == [
+            '< [ERROR] 2 log messages were dropped',
+            '< WARNING: test_loghandler.drop: 2',
+            '< WARNING: test_loghandler.drop: 3',
+            '< WARNING: test_loghandler.drop: 4',
+        ]
+        assert handler.dropped == 0
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
@@ -0,0 +1,100 @@
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from PyQt5 import QtWidgets
+
+from libsyntyche.cli import ArgumentRules, Command
+from libsyntyche.profiling import (MemoryTracker, SamplingProfiler, TerminalMemoryInspector,
+                                   TerminalProfiler, terminal_sizes, widget_counts)
+from libsyntyche.terminal import Terminal
+
+
+def busy_loop(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampling_profiler() -> None:
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    assert profiler.is_running
+    busy_loop(0.1)
+    profiler.stop()
+    assert not profiler.is_running
+    assert profiler.samples
+    hottest = profiler.hot_functions(1)[0]
+    assert hottest.name.startswith('busy_loop (test_profiling.py:')
+    assert 0 < hottest.self_time <= hottest.total_time
+    assert all(line.split(';')[-1].startswith('busy_loop')
+               for line in profiler.collapsed() if 'busy_loop' in line)
+    profiler.clear()
+    assert not profiler.samples and profiler.hot_functions() == []
+
+
+def test_terminal_profiler(qapp: QtWidgets.QApplication, tmp_path: Path) -> None:
+    window = QtWidgets.QWidget()
+    terminal = Terminal(window)
+    TerminalProfiler(terminal, output_dir=tmp_path)
+    terminal.add_command(Command('busy', '', lambda: busy_loop(0.05), ArgumentRules.NONE,
+                                 short_name='b'))
+    terminal.cli.run_command('p')
+    assert terminal.output_field.text() == 'Error: Not profiling'
+    terminal.cli.run_command('pc')
+    terminal.cli.run_command('b')
+    terminal.cli.run_command('p')
+    output = terminal.output_field.text()
+    assert output.startswith('Saved profile to ') and 'Hottest: ' in output
+    assert terminal.cli.command_profile is None
+    assert len(list(tmp_path.glob('*.pstats'))) == 1
+    terminal.cli.run_command('ps')
+    terminal.cli.run_command('pc')
+    assert terminal.output_field.text() == 'Error: Already profiling'
+    busy_loop(0.05)
+    terminal.cli.run_command('p')
+    assert 'busy_loop' in terminal.output_field.text()
+    assert 'busy_loop' in next(tmp_path.glob('*.collapsed')).read_text(encoding='utf-8')
+
+
+def test_memory_tracker() -> None:
+    tracker = MemoryTracker()
+    with pytest.raises(ValueError):
+        tracker.diff()
+    tracker.snapshot()
+    try:
+        leak: List[bytes] = [bytes(1000) for _ in range(1000)]
+        diffs = tracker.diff(5)
+        assert diffs[0].location.startswith('test_profiling.py:')
+        assert diffs[0].size_diff >= 1000 * 1000
+        assert diffs[0].count_diff >= 1000
+        # The next diff is against the new snapshot
+        assert all(d.size_diff < 1000 * 1000 for d in tracker.diff(5))
+        del leak
+    finally:
+        tracker.stop()
+    assert not tracker.has_snapshot
+
+
+def test_memory_commands(qapp: QtWidgets.QApplication) -> None:
+    window = QtWidgets.QWidget()
+    terminal = Terminal(window)
+    TerminalMemoryInspector(terminal)
+    terminal.cli.run_command('m')
+    assert terminal.output_field.text().startswith('history entries: 1, ')
+    sizes = terminal_sizes(terminal)
+    assert sizes['history entries'] == 2
+    assert sizes['log rows'] == terminal.log_history.count() == 1
+    assert sizes['help pages'] == len(terminal.help_view.help_html)
+    assert dict(widget_counts())['Terminal'] >= 1
+    terminal.cli.run_command('mw')
+    assert terminal.output_field.text().startswith('Live widgets: ')
+    terminal.cli.run_command('md')
+    assert terminal.output_field.text() == 'Error: No memory snapshot taken'
+    try:
+        terminal.cli.run_command('ms')
+        terminal.cli.run_command('md')
+        assert terminal.output_field.text().startswith('Growth since the last snapshot: ')
+    finally:
+        terminal.cli.run_command('mx')
@@ -0,0 +1,83 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from libsyntyche.projectsearch import (_parse_command, Preview, replace_project,
+                                       search_project)
+
+
+@pytest.fixture  # type: ignore
+def project(tmp_path: Path) -> Path:
+    (tmp_path / 'ch1.txt').write_text('Foo bar\nfoo baz foo\n', encoding='utf-8')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'ch2.txt').write_text('nothing here\n', encoding='utf-8')
+    (tmp_path / 'sub' / 'ch3.txt').write_text('food\r\nfoo\r\n', encoding='utf-8')
+    (tmp_path / 'empty.txt').write_text('', encoding='utf-8')
+    (tmp_path / 'binary.txt').write_bytes(b'foo\xff\xfe')
+    (tmp_path / '.git').mkdir()
+    (tmp_path / '.git' / 'HEAD').write_text('foo\n', encoding='utf-8')
+    return tmp_path
+
+
+def test_parse_command() -> None:
+    assert _parse_command('foo').replace is None
+    assert _parse_command('foo/iw').search == 'foo'
+    cmd = _parse_command('a\\/b/c/a')
+    assert (cmd.search, cmd.replace) == ('a\\/b', 'c')
+    with pytest.raises(ValueError):
+        _parse_command('/')
+    with pytest.raises(ValueError, match='Invalid regex'):
+        _parse_command('fo(/r')
+
+
+@pytest.mark.parametrize('workers', [1, 2])  # type: ignore
+def test_search_project(project: Path, workers: int) -> None:
+    results = {r.path.relative_to(project).as_posix(): r
+               for r in search_project(project, 'foo/w', max_workers=workers)}
+    assert set(results) == {'ch1.txt', 'sub/ch3.txt', 'binary.txt'}
+    assert results['ch1.txt'].hits == 2
+    assert results['ch1.txt'].previews == [Preview(2, 0, 'foo baz foo'),
+                                           Preview(2, 8, 'foo baz foo')]
+    assert results['sub/ch3.txt'].previews == [Preview(2, 0, 'foo')]
+    assert results['binary.txt'].error is not None
+
+
+def test_search_project_pattern(project: Path) -> None:
+    results = search_project(project, 'foo/i', pattern='*.txt', max_workers=1)
+    assert [(r.path.name, r.hits) for r in results if not r.error] == [('ch1.txt', 3)]
+
+
+def test_replace_project(project: Path) -> None:
+    os.chmod(project / 'ch1.txt', 0o640)
+    results = replace_project(project, r'(\w+) (ba\w)/\2 \1/r', max_workers=2)
+    assert sorted(r.path.name for r in results) == ['binary.txt', 'ch1.txt']
+    assert (project / 'ch1.txt').read_text(encoding='utf-8') == 'bar Foo\nbaz foo foo\n'
+    assert (project / 'ch1.txt').stat().st_mode & 0o777 == 0o640
+    # Line endings are kept and no temporary files are left behind
+    replace_project(project, 'foo/x/w', pattern='sub/*')
+    assert (project / 'sub' / 'ch3.txt').read_bytes() == b'food\r\nx\r\n'
+    assert not list(project.rglob('*.tmp'))
+    # Nothing in version control directories is touched
+    replace_project(project, 'foo/x/w')
+    assert (project / '.git' / 'HEAD').read_text(encoding='utf-8') == 'foo\n'
+
+
+def test_search_project_ignore(project: Path) -> None:
+    results = search_project(project, 'foo/w', max_workers=1, ignore=['sub'])
+    assert sorted(r.path.relative_to(project).as_posix() for r in results) == [
+        '.git/HEAD', 'binary.txt', 'ch1.txt']
+
+
+def test_replace_project_crlf(tmp_path: Path) -> None:
+    (tmp_path / 'crlf.txt').write_bytes(b'a foo\r\nfoo b\nfoo\r\n')
+    results = search_project(tmp_path, 'foo$/r')
+    assert results[0].previews == [Preview(1, 2, 'a foo'), Preview(3, 0, 'foo')]
+    # Only the matches change, every line keeps its own line ending
+    replace_project(tmp_path, 'o$/x\\ny/r')
+    assert (tmp_path / 'crlf.txt').read_bytes() == b'a fox\ny\r\nfoo b\nfox\ny\r\n'
+
+
+def test_replace_project_requires_replacement(project: Path) -> None:
+    with pytest.raises(ValueError):
+        replace_project(project, 'foo/i')
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+from libsyntyche.lazy import LazyPattern
+from libsyntyche.startup import StartupProfiler
+
+
+def test_lazy_pattern() -> None:
+    rx = LazyPattern(r'a(b+)', 0)
+    assert rx._compiled is None
+    assert rx.pattern == 'a(b+)'
+    match = rx.fullmatch('abb')
+    assert match is not None and match[1] == 'bb'
+    assert rx.sub('x', 'ab ab') == 'x x'
+    assert [m.span() for m in rx.finditer('ab abb')] == [(0, 2), (3, 6)]
+
+
+def test_lazy_submodules() -> None:
+    code = ('import sys, libsyntyche; '
+            'assert "libsyntyche.cli" not in sys.modules; '
+            'libsyntyche.cli.CommandLineInterface; '
+            'assert not any(m.startswith("PyQt5") for m in sys.modules)')
+    subprocess.run([sys.executable, '-c', code], check=True)
+    import libsyntyche
+    assert 'texteditor' in dir(libsyntyche)
+    with pytest.raises(AttributeError):
+        libsyntyche.nonexistent
+
+
+def test_startup_profiler() -> None:
+    sys.modules.pop('colorsys', None)
+    profiler = StartupProfiler()
+    profiler.install()
+    try:
+        import colorsys  # noqa: F401
+    finally:
+        profiler.uninstall()
+    profiler.mark('done')
+    names = [timing.name for timing in profiler.imports]
+    assert names == ['colorsys']
+    assert profiler.imports[0].cumulative >= profiler.imports[0].self_time >= 0
+    report = profiler.report()
+    assert 'colorsys' in report and 'done' in report
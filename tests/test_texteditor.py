@@ -0,0 +1,510 @@
+import random
+import re
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+from unittest.mock import Mock
+
+import pytest
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtGui import QFont, QTextCursor, QTextDocument
+
+from libsyntyche import texteditor
+from libsyntyche.search import (_compile_search_rx, _expand_replacement,
+                                _iter_matches, _search_flags_rx, SearchFlags)
+from libsyntyche.texteditor import (_backward_chunks, _DocumentSnapshot,
+                                    _forward_chunks, _HIGHLIGHT_PROPERTY, _map_position,
+                                    _select_span, BackgroundSearch, DocumentIndex,
+                                    DocumentLoader, Searcher, SearchState)
+
+
+def mock_editor(text: str) -> Mock:
+    document = Mock()
+    document.revision.return_value = 1
+    document.toPlainText.return_value = text
+    editor = Mock()
+    editor.document.return_value = document
+    return editor
+
+
+TEXT = 'Foo foo_bar foo2 éfoo foo\nFOO'
+
+
+@pytest.mark.parametrize('flags,expected', [
+    (set(), [4, 12, 18, 22]),
+    ({SearchFlags.case_insensitive}, [0, 4, 12, 18, 22, 26]),
+    ({SearchFlags.whole_words}, [4, 22]),
+    ({SearchFlags.whole_words, SearchFlags.case_insensitive}, [0, 4, 22, 26]),
+])
+def test_compile_search_rx(flags: set, expected: List[int]) -> None:
+    rx = _compile_search_rx('foo', frozenset(flags))
+    assert [m.start() for m in rx.finditer(TEXT)] == expected
+
+
+def test_compile_search_rx_escapes() -> None:
+    rx = _compile_search_rx('a.b', frozenset())
+    assert [m.start() for m in rx.finditer('axb a.b')] == [4]
+
+
+def test_search_flags_rx() -> None:
+    match = _search_flags_rx.fullmatch('foo bar/#i')
+    assert match is not None
+    assert (match['search'], match['flags']) == ('foo bar', '#i')
+
+
+@pytest.mark.parametrize('pos,expected', [
+    (0, 0),
+    (2, 2),
+    # Inside the first replaced range
+    (4, 3),
+    (6, 5),
+    (8, 7),
+    # Inside the second replaced range
+    (11, 9),
+    (14, 11),
+])
+def test_map_position(pos: int, expected: int) -> None:
+    # 'abcXYZdefghijk' -> 'abc12defg3k'
+    replacements = [(3, 6, '12'), (10, 13, '3')]
+    assert _map_position(pos, replacements) == expected
+
+
+@pytest.mark.parametrize('rebuild_limit', [0, 10_000])  # type: ignore
+def test_searcher_replace_all(qapp: QtWidgets.QApplication, monkeypatch: pytest.MonkeyPatch,
+                              rebuild_limit: int) -> None:
+    # Both rebuilding the replaced text and replacing each match separately
+    monkeypatch.setattr(texteditor, '_REBUILD_MAX_CHARS_PER_HIT', rebuild_limit)
+    editor = QtWidgets.QPlainTextEdit()
+    original = 'a foo b\nfoo c foofoo\n' + 'x' * 200 + ' foo'
+    editor.setPlainText(original)
+    editor.document().clearUndoRedoStacks()
+    _select_span(editor, 8, 11)
+    log = Mock()
+    searcher = Searcher(editor, Mock(), log)
+    searcher.search_or_replace('(f)oo/<\\1>/ra')
+    assert editor.toPlainText() == original.replace('foo', '<f>')
+    log.assert_called_with('5 instances replaced')
+    # The cursor stays on the same text
+    assert editor.textCursor().selectedText() == '<f>'
+    # One undo step
+    editor.undo()
+    assert editor.toPlainText() == original
+    assert not editor.document().isUndoAvailable()
+
+
+@pytest.mark.parametrize('rebuild_limit', [0, 10_000])  # type: ignore
+def test_searcher_replace_all_keeps_nbsp(qapp: QtWidgets.QApplication,
+                                         monkeypatch: pytest.MonkeyPatch,
+                                         rebuild_limit: int) -> None:
+    monkeypatch.setattr(texteditor, '_REBUILD_MAX_CHARS_PER_HIT', rebuild_limit)
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('foo\xa0bar foo\xa010\xa0kg\nfoo')
+    searcher = Searcher(editor, Mock(), Mock())
+    searcher.search_or_replace('foo/x/a')
+    assert editor.document().toRawText() == 'x\xa0bar x\xa010\xa0kg\u2029x'
+
+
+def test_searcher_replace_all_keeps_formatting(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QTextEdit()
+    editor.setHtml('<b>bold foo</b> plain foo')
+    editor.document().clearUndoRedoStacks()
+    searcher = Searcher(editor, Mock(), Mock())
+    searcher.search_or_replace('foo/x/a')
+    assert editor.toPlainText() == 'bold x plain x'
+    cursor = QTextCursor(editor.document())
+    cursor.setPosition(6)
+    assert cursor.charFormat().fontWeight() == QFont.Bold
+    cursor.setPosition(8)
+    assert cursor.charFormat().fontWeight() == QFont.Normal
+    editor.undo()
+    assert editor.toPlainText() == 'bold foo plain foo'
+    assert not editor.document().isUndoAvailable()
+
+
+def test_compile_search_rx_regex() -> None:
+    flags = frozenset({SearchFlags.regex, SearchFlags.whole_words})
+    rx = _compile_search_rx(r'fo+|ba', flags)
+    assert [m[0] for m in rx.finditer('foo fooo bar ba')] == ['foo', 'fooo', 'ba']
+    # The compiled patterns are cached
+    assert _compile_search_rx(r'fo+|ba', flags) is rx
+    with pytest.raises(re.error):
+        _compile_search_rx(r'(foo', frozenset({SearchFlags.regex}))
+    # Errors point at the right place in the pattern
+    with pytest.raises(re.error) as e:
+        _compile_search_rx(r'bad(', flags)
+    assert e.value.pos == 3
+
+
+def test_expand_replacement() -> None:
+    match = re.search(r'(?P<a>\w+)-(\w+)', 'foo-bar')
+    assert match is not None
+    assert _expand_replacement(match, r'\2\/\g<a>') == 'bar/foo'
+
+
+@pytest.mark.parametrize('pos,backwards,expected', [
+    (0, False, 0),
+    (1, False, 8),
+    (14, False, None),
+    (0, True, None),
+    (9, True, 8),
+    (20, True, 12),
+])
+def test_snapshot_find(pos: int, backwards: bool, expected: Optional[int]) -> None:
+    snapshot = _DocumentSnapshot(mock_editor('foo\nbar\nfoo\nfoo\n\nbaz'))
+    rx = _compile_search_rx(r'^f\w+$', frozenset({SearchFlags.regex}))
+    match = snapshot.find(rx, pos, backwards)
+    assert (match.start() if match else None) == expected
+
+
+@pytest.mark.parametrize('pattern,flags,expected', [
+    (r'a\nb', {SearchFlags.regex}, 2),
+    (r'a\sb', {SearchFlags.regex}, 2),
+    (r'a[^x]b', {SearchFlags.regex}, 2),
+    (r'(?s)a.b', {SearchFlags.regex}, 2),
+    ('a\nb', set(), 2),
+    ('a\nb', {SearchFlags.whole_words}, 2),
+])
+def test_snapshot_find_backwards_across_lines(pattern: str, flags: set,
+                                              expected: int) -> None:
+    snapshot = _DocumentSnapshot(mock_editor('x\na\nb\n' + 'y\n' * 100))
+    rx = _compile_search_rx(pattern, frozenset(flags))
+    match = snapshot.find(rx, len(snapshot.text), backwards=True)
+    assert match is not None and match.start() == expected
+
+
+def test_searcher_replace_next_backwards_across_lines(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('x\na\nb')
+    editor.moveCursor(QTextCursor.End)
+    error = Mock()
+    searcher = Searcher(editor, error, Mock())
+    searcher.search_or_replace('a\\nb/Z/rb')
+    assert not error.called
+    assert editor.toPlainText() == 'x\nZ'
+
+
+# Document index
+
+def expected_ranges(document: QTextDocument, text: str, flags: frozenset) -> List[tuple]:
+    rx = _compile_search_rx(text, flags)
+    return [m.span() for m in _iter_matches(rx, document.toPlainText())]
+
+
+@pytest.mark.parametrize('text,flags', [
+    ('foo', {SearchFlags.whole_words}),
+    ('FOO', {SearchFlags.whole_words, SearchFlags.case_insensitive}),
+    ('oo b', set()),
+    ('Foo', {SearchFlags.case_insensitive}),
+])
+def test_document_index_follows_edits(qapp: QtWidgets.QApplication, text: str,
+                                      flags: set) -> None:
+    rng = random.Random(1)
+    words = ['foo', 'Foo', 'bar', 'foobar', 'foo_bar', '\n', ' ', '\n\n']
+    document = QTextDocument()
+    document.setPlainText(''.join(rng.choice(words) for _ in range(200)))
+    index = DocumentIndex(document, trigrams=True)
+    frozen_flags = frozenset(flags)
+    for _ in range(100):
+        cursor = QTextCursor(document)
+        start = rng.randrange(document.characterCount())
+        end = min(document.characterCount() - 1, start + rng.randrange(20))
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        cursor.insertText(''.join(rng.choice(words) for _ in range(rng.randrange(4))))
+        expected = expected_ranges(document, text, frozen_flags)
+        assert index.find_all(text, frozen_flags) == expected
+        assert index.count(text, frozen_flags) == len(expected)
+    document.setPlainText('foo\nfoo foo')
+    assert index.count('foo', frozenset({SearchFlags.whole_words})) == 3
+
+
+def test_document_index_unanswerable(qapp: QtWidgets.QApplication) -> None:
+    document = QTextDocument()
+    document.setPlainText('foo bar')
+    index = DocumentIndex(document)
+    assert index.count('foo', frozenset({SearchFlags.regex})) is None
+    assert index.count('fo', frozenset()) is None
+    # Needs trigrams
+    assert index.count('foo', frozenset()) is None
+
+
+@pytest.mark.parametrize('pos,backwards,expected', [
+    (0, False, (4, 7)),
+    (5, False, (15, 18)),
+    (16, False, (4, 7)),
+    (16, True, (15, 18)),
+    (12, True, (4, 7)),
+    (4, True, (15, 18)),
+])
+def test_document_index_find_next(qapp: QtWidgets.QApplication, pos: int,
+                                  backwards: bool, expected: tuple) -> None:
+    document = QTextDocument()
+    document.setPlainText('bar foo\nfoobar\nFoo')
+    index = DocumentIndex(document)
+    flags = frozenset({SearchFlags.whole_words, SearchFlags.case_insensitive})
+    assert index.can_answer('foo', flags)
+    assert index.find_next('foo', flags, pos, backwards) == expected
+
+
+# Background search
+
+def test_chunks() -> None:
+    text = 'aaaa\nbb\ncccccc\nd'
+    assert list(_forward_chunks(text, 0, len(text), 3)) == [(0, 5), (5, 15), (15, 16)]
+    assert list(_forward_chunks(text, 2, 9, 3)) == [(2, 8), (8, 9)]
+    assert list(_backward_chunks(text, 0, len(text), 3)) == [(8, 16), (5, 8), (0, 5)]
+    assert list(_backward_chunks(text, 2, 9, 3)) == [(5, 9), (2, 5)]
+
+
+@pytest.mark.parametrize('pos,backwards,first_only,expected', [
+    (0, False, False, [(0, 3), (8, 11), (16, 19)]),
+    (1, False, True, [(8, 11)]),
+    (17, False, True, [(0, 3)]),
+    (16, True, True, [(8, 11)]),
+    (0, True, True, [(16, 19)]),
+])
+def test_background_search(qapp: QtWidgets.QApplication, pos: int, backwards: bool,
+                           first_only: bool, expected: List[tuple]) -> None:
+    search = BackgroundSearch(chunk_size=2)
+    hits: List[tuple] = []
+    totals: List[int] = []
+    search.hits_found.connect(hits.extend)
+    search.finished.connect(totals.append)
+    rx = _compile_search_rx('foo', frozenset())
+    search.start('foo bar\nfoo baz\nfoo', 1, rx, pos, backwards, first_only)
+    while not totals:
+        qapp.processEvents()
+    assert hits == expected
+    assert totals == [len(expected)]
+
+
+def wait_for_background(qapp: QtWidgets.QApplication, searcher: Searcher) -> None:
+    deadline = time.monotonic() + 5
+    while searcher._background_task is not None and time.monotonic() < deadline:
+        qapp.processEvents()
+    assert searcher._background_task is None
+
+
+def test_searcher_background_search(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('a foo b foo')
+    error = Mock()
+    searcher = Searcher(editor, error, Mock(), background=True)
+    searcher.search_or_replace('foo')
+    # Nothing happens until the worker thread's results are delivered
+    assert editor.textCursor().selectionStart() == 0
+    wait_for_background(qapp, searcher)
+    assert (editor.textCursor().selectionStart(), editor.textCursor().selectionEnd()) == (2, 5)
+    searcher.search_next()
+    wait_for_background(qapp, searcher)
+    assert (editor.textCursor().selectionStart(), editor.textCursor().selectionEnd()) == (8, 11)
+    searcher.search_or_replace('nope')
+    wait_for_background(qapp, searcher)
+    error.assert_called_once_with('Text not found')
+
+
+def test_searcher_background_search_stale(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('a foo b foo')
+    searcher = Searcher(editor, Mock(), Mock(), background=True)
+    searcher.search_or_replace('foo')
+    # The match found in the old snapshot isn't selected, the search is
+    # started again instead
+    QTextCursor(editor.document()).insertText('xx')
+    wait_for_background(qapp, searcher)
+    assert (editor.textCursor().selectionStart(), editor.textCursor().selectionEnd()) == (4, 7)
+
+
+def test_searcher_background_count(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('a foo b foo')
+    log = Mock()
+    searcher = Searcher(editor, Mock(), log, background=True)
+    searcher.search_or_replace('foo/#')
+    assert not log.called
+    wait_for_background(qapp, searcher)
+    log.assert_called_once_with('The word "foo" is used 2 times')
+    assert searcher._snapshot.counts[('foo', frozenset())] == 2
+    # The second time the count is taken from the cache right away
+    searcher.search_or_replace('foo/#')
+    assert searcher._background_task is None
+    assert log.call_count == 2
+
+
+# Highlighting all matches
+
+def highlighted_blocks(editor: QtWidgets.QPlainTextEdit) -> List[int]:
+    return sorted({sel.cursor.block().blockNumber() for sel in editor.extraSelections()
+                   if sel.format.hasProperty(_HIGHLIGHT_PROPERTY)})
+
+
+def make_highlighting_editor(qapp: QtWidgets.QApplication
+                             ) -> Tuple[QtWidgets.QPlainTextEdit, Searcher]:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('\n'.join(f'line {n} foo' for n in range(1000)))
+    editor.resize(300, 200)
+    editor.show()
+    searcher = Searcher(editor, Mock(), Mock(), highlight_all=True)
+    searcher._highlighter.margin = 5
+    searcher.search_or_replace('foo')
+    qapp.processEvents()
+    return editor, searcher
+
+
+def test_highlight_only_visible_blocks(qapp: QtWidgets.QApplication) -> None:
+    editor, searcher = make_highlighting_editor(qapp)
+    last_visible = editor.cursorForPosition(
+        QtCore.QPoint(0, editor.viewport().height() - 1)).blockNumber()
+    assert highlighted_blocks(editor) == list(range(last_visible + 6))
+    # Scrolling
+    editor.verticalScrollBar().setValue(500)
+    qapp.processEvents()
+    blocks = highlighted_blocks(editor)
+    assert blocks[0] == 495
+    assert 500 + last_visible < blocks[-1] < 520
+    # Editing
+    cursor = QTextCursor(editor.document().findBlockByNumber(502))
+    cursor.insertText('foo ')
+    qapp.processEvents()
+    assert [sel.cursor.selectionStart() - editor.document().findBlockByNumber(502).position()
+            for sel in editor.extraSelections()
+            if sel.cursor.block().blockNumber() == 502] == [0, 13]
+    editor.close()
+
+
+def test_highlight_keeps_other_selections(qapp: QtWidgets.QApplication) -> None:
+    editor, searcher = make_highlighting_editor(qapp)
+    own = QtWidgets.QTextEdit.ExtraSelection()
+    own.cursor = QTextCursor(editor.document().findBlockByNumber(1))
+    own.cursor.select(QTextCursor.LineUnderCursor)
+    editor.setExtraSelections(editor.extraSelections() + [own])
+    searcher.search_or_replace('line')
+    qapp.processEvents()
+    selections = editor.extraSelections()
+    assert len([sel for sel in selections
+                if not sel.format.hasProperty(_HIGHLIGHT_PROPERTY)]) == 1
+    assert highlighted_blocks(editor)
+    searcher.set_highlight_all(False)
+    qapp.processEvents()
+    selections = editor.extraSelections()
+    assert len(selections) == 1
+    assert selections[0].cursor.selectedText() == 'line 1 foo'
+    editor.close()
+
+
+# Cached match positions
+
+@pytest.mark.parametrize('flags', [set(), {SearchFlags.whole_words}])
+def test_search_state_patch_matches(qapp: QtWidgets.QApplication, flags: set) -> None:
+    rng = random.Random(2)
+    document = QTextDocument()
+    document.documentLayout()
+    document.setPlainText('foo bar foofoo\nxfoo foo\n' * 20)
+    state = SearchState('foo', flags)
+    state.update_matches(document, document.toPlainText())
+    document.contentsChange.connect(
+        lambda *args: state.patch_matches(document, *args))
+    for _ in range(100):
+        cursor = QTextCursor(document)
+        start = rng.randrange(document.characterCount())
+        end = min(document.characterCount() - 1, start + rng.randrange(8))
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        cursor.insertText(rng.choice(['foo', ' ', '\n', 'o', 'f', '', 'foo\nfoo']))
+        assert state.has_matches(document)
+        expected = expected_ranges(document, 'foo', frozenset(flags))
+        assert list(zip(state._starts, state._ends)) == expected
+
+
+def test_search_state_next_match(qapp: QtWidgets.QApplication) -> None:
+    document = QTextDocument()
+    document.setPlainText('foo bar foo')
+    state = SearchState('foo')
+    state.update_matches(document, document.toPlainText())
+    assert state.next_match(0) == (0, 3)
+    assert state.next_match(3) == (8, 11)
+    assert state.next_match(9) == (0, 3)
+    assert state.next_match(8, backwards=True) == (0, 3)
+    assert state.next_match(0, backwards=True) == (8, 11)
+
+
+def test_searcher_word_frequencies(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('The cat and the dog.\nA cat, the end')
+    log = Mock()
+    searcher = Searcher(editor, Mock(), log)
+    assert searcher.word_frequencies(2) == [('the', 3), ('cat', 2)]
+    assert searcher.word_frequencies(2, stopwords=['THE']) == [('cat', 2), ('and', 1)]
+    assert searcher.word_frequencies(1, case_insensitive=False) == [('cat', 2)]
+    # Edits are picked up
+    cursor = QTextCursor(editor.document())
+    cursor.insertText('dog dog dog ')
+    assert searcher.word_frequencies(1) == [('dog', 4)]
+    searcher.report_word_frequencies(2, stopwords=['the'])
+    log.assert_called_with('Most used words: dog (4), cat (2)')
+    # Counting doesn't attach an index, but uses one if it's there
+    assert searcher.index is None
+    cursor.insertText('cat\ncat cat cat ')
+    assert searcher.word_frequencies(1) == [('cat', 6)]
+    searcher.attach_index()
+    revision = searcher._snapshot._revision
+    cursor.insertText('the ')
+    assert searcher.word_frequencies(3, case_insensitive=False) == [
+        ('cat', 6), ('dog', 4), ('the', 3)]
+    # The index answered, so the document wasn't copied
+    assert searcher._snapshot._revision == revision
+
+
+def test_searcher_count_with_index(qapp: QtWidgets.QApplication) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('foo bar foo')
+    log = Mock()
+    searcher = Searcher(editor, Mock(), log)
+    searcher.attach_index()
+    QTextCursor(editor.document()).insertText('foo ')
+    searcher.search_or_replace('foo/w#')
+    log.assert_called_with('The word "foo" is used 3 times')
+    # The index answered, so the document wasn't copied
+    assert searcher._snapshot._revision == -1
+    searcher.search_or_replace('o b/#')
+    log.assert_called_with('The word "o b" is used 1 times')
+    assert searcher._snapshot._revision == editor.document().revision()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])  # type: ignore
+def test_document_loader(qapp: QtWidgets.QApplication, tmp_path: Path,
+                         chunk_size: int) -> None:
+    path = tmp_path / 'doc.txt'
+    path.write_bytes('åäö\r\nline two\rthree\n€nd'.encode('utf-8'))
+    editor = QtWidgets.QPlainTextEdit()
+    editor.setPlainText('old text')
+    loader = DocumentLoader(editor, chunk_size=chunk_size)
+    progress: List[Tuple[int, int]] = []
+    loader.progress.connect(lambda done, total: progress.append((done, total)))
+    finished = Mock()
+    loader.finished.connect(finished)
+    loader.load(path)
+    assert editor.isReadOnly()
+    while loader.is_running:
+        qapp.processEvents()
+    finished.assert_called_once_with()
+    assert editor.toPlainText() == path.read_text(encoding='utf-8')
+    assert progress[-1] == (path.stat().st_size, path.stat().st_size)
+    assert not editor.isReadOnly()
+    assert editor.document().isUndoRedoEnabled()
+    assert not editor.document().isUndoAvailable()
+
+
+def test_document_loader_errors(qapp: QtWidgets.QApplication, tmp_path: Path) -> None:
+    editor = QtWidgets.QPlainTextEdit()
+    loader = DocumentLoader(editor)
+    failed = Mock()
+    loader.failed.connect(failed)
+    loader.load(tmp_path / 'missing.txt')
+    assert failed.call_count == 1
+    (tmp_path / 'bad.txt').write_bytes(b'abc\xff')
+    loader.load(tmp_path / 'bad.txt')
+    while loader.is_running:
+        qapp.processEvents()
+    assert failed.call_count == 2
+    assert failed.call_args[0][0].startswith('Not a UTF-8 file')
@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Any, List
+
+import pytest
+from PyQt5 import QtCore, QtWidgets
+
+from libsyntyche.widgets import (batched, bulk_build, coalesced, debounced, DelayMode,
+                                 mk_signal1, mk_signal2, repeat_rows, throttled,
+                                 VBoxLayout)
+
+
+class Emitter(QtCore.QObject):
+    scrolled = throttled(mk_signal1(int), 50)
+    typed = debounced(mk_signal1(int), 50)
+    changed = coalesced(mk_signal2(int, str))
+    logged = batched(mk_signal2(int, str))
+    typed_batch = batched(mk_signal1(int), 50, DelayMode.DEBOUNCE)
+
+
+def wait(qapp: QtWidgets.QApplication, ms: int) -> None:
+    end = time.monotonic() + ms / 1000
+    while time.monotonic() < end:
+        qapp.processEvents(QtCore.QEventLoop.AllEvents, 5)
+
+
+def test_repeat_rows(qapp: QtWidgets.QApplication) -> None:
+    groups = repeat_rows(5, lambda n: [QtWidgets.QLabel(str(n))], group_size=2)
+    assert len(groups) == 3
+    labels = [label.text() for group in groups
+              for label in group.findChildren(QtWidgets.QLabel)]
+    assert labels == ['0', '1', '2', '3', '4']
+
+
+def test_bulk_build(qapp: QtWidgets.QApplication) -> None:
+    window = QtWidgets.QWidget()
+    VBoxLayout(window, [QtWidgets.QLabel('header')])
+    window.show()
+    with bulk_build(window) as container:
+        assert not container.updatesEnabled()
+        VBoxLayout(container, repeat_rows(3, lambda n: [QtWidgets.QLineEdit()]))
+    assert container.updatesEnabled()
+    assert container.parent() is window
+    assert window.layout().indexOf(container) == 1
+    assert len(container.findChildren(QtWidgets.QLineEdit)) == 3
+    scroll_area = QtWidgets.QScrollArea()
+    with bulk_build(scroll_area) as container:
+        pass
+    assert scroll_area.widget() is container
+    with pytest.raises(ValueError):
+        with bulk_build(window):
+            raise ValueError
+    assert window.layout().count() == 2
+
+
+def test_coalesced_signals(qapp: QtWidgets.QApplication) -> None:
+    emitter = Emitter()
+    assert emitter.changed is emitter.changed
+    assert emitter.changed is not Emitter().changed
+    calls: List[Any] = []
+    emitter.changed.connect(lambda n, s: calls.append((n, s)))
+    emitter.logged.connect(calls.append)
+    for n in range(3):
+        emitter.changed.emit(n, 'x')
+        emitter.logged.emit(n, 'y')
+    assert calls == []
+    qapp.processEvents()
+    assert calls == [(2, 'x'), [(0, 'y'), (1, 'y'), (2, 'y')]]
+
+
+def test_throttled_signal(qapp: QtWidgets.QApplication) -> None:
+    emitter = Emitter()
+    calls: List[int] = []
+    emitter.scrolled.connect(calls.append)
+    for n in range(5):
+        emitter.scrolled.emit(n)
+    # The first emit is delivered right away, the rest when the interval is over
+    assert calls == [0]
+    wait(qapp, 120)
+    assert calls == [0, 4]
+    emitter.scrolled.disconnect(calls.append)
+    emitter.scrolled.emit(5)
+    wait(qapp, 10)
+    assert calls == [0, 4]
+
+
+def test_debounced_signal(qapp: QtWidgets.QApplication) -> None:
+    emitter = Emitter()
+    calls: List[Any] = []
+    emitter.typed.connect(calls.append)
+    emitter.typed_batch.connect(calls.append)
+    for n in range(4):
+        emitter.typed.emit(n)
+        emitter.typed_batch.emit(n)
+        wait(qapp, 20)
+    assert calls == []
+    assert emitter.typed.pending == 1
+    wait(qapp, 100)
+    assert calls == [3, [0, 1, 2, 3]]
+    emitter.typed.emit(4)
+    emitter.typed.flush()
+    assert calls[-1] == 4
+
+
+def test_delayed_signal_from_thread(qapp: QtWidgets.QApplication) -> None:
+    emitter = Emitter()
+    threads: List[Any] = []
+    emitter.logged.connect(lambda batch: threads.append(threading.current_thread()))
+    thread = threading.Thread(target=lambda: emitter.logged.emit(1, 'a'))
+    thread.start()
+    thread.join()
+    wait(qapp, 10)
+    assert threads == [threading.main_thread()]
+
+
+def test_delayed_signal_interval() -> None:
+    with pytest.raises(ValueError):
+        throttled(mk_signal1(int), -1)
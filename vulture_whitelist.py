@@ -30,3 +30,33 @@ slot  # unused variable (libsyntyche/widgets.py:60)
 mk_signal1  # unused function (libsyntyche/widgets.py:67)
 mk_signal2  # unused function (libsyntyche/widgets.py:71)
 mk_signal3  # unused function (libsyntyche/widgets.py:75)
+_.EXACT  # unused variable (libsyntyche/cli.py:48)
+_.set_highlight_all  # unused method (libsyntyche/texteditor.py:431)
+chars_removed  # unused variable (libsyntyche/texteditor.py:325)
+_.word_counts  # unused method (libsyntyche/texteditor.py:345)
+_.attach_index  # unused method (libsyntyche/texteditor.py:682)
+column  # unused variable (libsyntyche/projectsearch.py:24)
+search_project  # unused function (libsyntyche/projectsearch.py:160)
+replace_project  # unused function (libsyntyche/projectsearch.py:174)
+_.report_word_frequencies  # unused method (libsyntyche/texteditor.py:890)
+DocumentLoader  # unused class (libsyntyche/texteditor.py:700)
+_.load  # unused method (libsyntyche/texteditor.py:743)
+__getattr__  # unused function (libsyntyche/__init__.py:18)
+__dir__  # unused function (libsyntyche/__init__.py:24)
+repeat_rows  # unused function (libsyntyche/widgets.py:134)
+bulk_build  # unused function (libsyntyche/widgets.py:156)
+throttled  # unused function (libsyntyche/widgets.py:230)
+debounced  # unused function (libsyntyche/widgets.py:236)
+coalesced  # unused function (libsyntyche/widgets.py:242)
+batched  # unused function (libsyntyche/widgets.py:266)
+_.latency  # unused attribute (libsyntyche/app.py:354)
+total_time  # unused variable (libsyntyche/profiling.py:31)
+TerminalProfiler  # unused class (libsyntyche/profiling.py:134)
+_.has_snapshot  # unused property (libsyntyche/profiling.py:226)
+TerminalMemoryInspector  # unused class (libsyntyche/profiling.py:300)
+install_log_handler  # unused function (libsyntyche/loghandler.py:98)
+Console  # unused class (libsyntyche/console.py:19)
+FileIndex  # unused class (libsyntyche/fileindex.py:49)
+_.is_ready  # unused property (libsyntyche/fileindex.py:68)
+_.wait_until_ready  # unused method (libsyntyche/fileindex.py:72)
+_.get_suggestions  # unused method (libsyntyche/fileindex.py:230)